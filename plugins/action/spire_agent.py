@@ -21,8 +21,7 @@
 # Make coding more python3-ish, this is required for contributions to Ansible
 from datetime import datetime, timezone
 import os
-import time
-from typing import Any, Callable, Dict, List, Union, cast
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, cast
 
 from ansible.parsing import dataloader
 from ansible.playbook.play_context import PlayContext
@@ -34,14 +33,21 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils import join_
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.agent_templates.resources import (
     AgentTemplates,
 )
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.change_plan import (
+    ChangeKind,
+    ChangePlan,
+    Disruption,
+    PlannedChange,
+)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.diffs import (
     DigestDiff,
     StrResourceDiff,
-    VersionDiff,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.digests import (
+    digest_env_file,
     digest_hcl_file,
     digest_ini_file,
+    digest_pem_bundle_file,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_stat import (
     ExpectedStatsByMode,
@@ -49,15 +55,19 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_stat im
     FileStats,
     FileStatsDiff,
 )
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.host_semaphore import (
+    FileLockSemaphore,
+)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.module_outcome import (
     assert_shell_or_cmd_task_successful,
     assert_task_did_not_failed,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_action_base import (
     DiffSpireCmptActualExpected,
-    SpireActionBase,
+    SpireCmptActionBase,
     SpireCmptInfoResultAdapter,
     SpireTemplateRes,
+    make_executable_diffs,
     make_local_temp_work_dir,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_agent_info_cmd import (
@@ -74,9 +84,6 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing
     SubStateServiceStatus,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.systemd import Scope
-from ansible_collections.io_patricecongo.spire.plugins.module_utils.tar_utils import (
-    extract_tar_member,
-)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.users import User
 
 
@@ -120,6 +127,7 @@ class AgentInfoResultAdapter(SpireCmptInfoResultAdapter):
             version=result.get("spire_agent_version"),
             version_issue=result.get("spire_agent_version_issue"),
             executable_path=result.get("spire_agent_executable_path"),
+            executable_sha256=result.get("spire_agent_executable_sha256"),
             trust_domain_id=result.get("spire_agent_trust_domain_id"),
             trust_domain_id_issue=result.get("spire_agent_trust_domain_id_issue"),
             is_healthy=result.get("spire_agent_is_healthy", False),
@@ -136,12 +144,21 @@ class AgentInfoResultAdapter(SpireCmptInfoResultAdapter):
             hexdigest_service_file_issue=result.get("spire_agent_hexdigest_service_file_issue"),
             hexdigest_config_file=result.get("spire_agent_hexdigest_config_file"),
             hexdigest_config_file_issue=result.get("spire_agent_hexdigest_config_file_issue"),
+            hexdigest_env_file=result.get("spire_agent_hexdigest_env_file"),
+            hexdigest_env_file_issue=result.get("spire_agent_hexdigest_env_file_issue"),
             file_stats=FileStats.from_ansible_result(result, "spire_agent_file_stats")
         )
         self.spiffe_id=result.get("spire_agent_spiffe_id")
         self.serial_number: str = result.get("spire_agent_serial_number")
         self.spiffe_id_issue: str = result.get("spire_agent_spiffe_id_issue")
+        self.hexdigest_trust_bundle_file: str = result.get("spire_agent_hexdigest_trust_bundle_file")
+        self.hexdigest_trust_bundle_file_issue: str = result.get("spire_agent_hexdigest_trust_bundle_file_issue")
         self.is_registered: bool = False
+        # how is_registered got verified: local (agent svid) or server (registration entries)
+        self.registration_verified_by: str = None
+        self.svid_verified: bool = result.get("spire_agent_svid_verified", False)
+        self.svid_verified_issue: str = result.get("spire_agent_svid_verified_issue")
+        self.svid_validity_remaining_seconds: float = result.get("spire_agent_svid_validity_remaining_seconds")
 
     def spire_agent_serial_number_as_int(self) -> int:
         '''Return the serial number as interger  or -1 if no value is avalaible yet'''
@@ -149,6 +166,30 @@ class AgentInfoResultAdapter(SpireCmptInfoResultAdapter):
             return int(self.serial_number)
         return None
 
+    def has_local_registration_evidence(self, min_validity_seconds: float) -> Tuple[bool, Optional[str]]:
+        """True if the agent svid verified on the agent host and remains valid for at least min_validity_seconds."""
+        if not self.svid_verified:
+            return False, self.svid_verified_issue or "agent svid not verified"
+        remaining = self.svid_validity_remaining_seconds
+        if remaining is None or remaining < min_validity_seconds:
+            return False, f"agent svid expires in {remaining}s (< {min_validity_seconds}s)"
+        return True, None
+
+    def needs_attestation(self) -> Tuple[bool, Optional[str]]:
+        """True if the agent is really unattested: its svid is missing or expired, or it is not registered
+        (checked by the server unless the local evidence was conclusive).
+        A svid just failing the local verification (e.g. missing bundle.der, unsupported chain)
+        does not require a new attestation on its own.
+        """
+        if not self.spiffe_id:
+            return True, self.spiffe_id_issue or "agent svid missing"
+        remaining = self.svid_validity_remaining_seconds
+        if remaining is not None and remaining <= 0:
+            return True, f"agent svid expired {-remaining}s ago"
+        if not self.is_registered:
+            return True, "agent not registered"
+        return False, None
+
     def __get_state_registered(self) -> SubStateAgentRegistered:
         if self.is_registered:
             return SubStateAgentRegistered.yes
@@ -170,6 +211,7 @@ class AgentInfoResultAdapter(SpireCmptInfoResultAdapter):
                 "actual_spire_agent_serial_number": self.serial_number,
                 "actual_spire_agent_spiffe_id": self.spiffe_id,
                 "actual_spire_agent_trust_domain_id": self.trust_domain_id,
+                "actual_spire_agent_registration_verified_by": self.registration_verified_by,
                 "actual_spire_agent_executable_path": self.executable_path,
                 "actual_spire_agent_get_info_issue": self._get_issues_issues(),
                 "actual_spire_agent_get_info_result": self.result
@@ -194,6 +236,9 @@ class AgentActionData:
         self.expected_stats_by_mode: ExpectedStatsByMode = None
         self.expected_file_stats: FileStats = None
         self.expected_user: User = None
+        self.expected_executable_sha256: str = None
+        # seconds waited for a spire server command slot, one entry per server sub task
+        self.spire_server_cmd_queue_waits: List[float] = []
 
     def need_change(self) -> bool:
         actual_state = self.spire_agent_info.to_detected_state()
@@ -203,6 +248,30 @@ class AgentActionData:
         actual_state_result_data = self.spire_agent_info.to_ansible_return_data()
         return {**actual_state_result_data}
 
+    def to_ansible_return_data_attestation(self, changed: bool) -> Dict[str, bool]:
+        if self.expected_config is None or State.present != self.expected_state.state:
+            return {}
+        return {
+            "spire_agent_join_token_minted": self.join_token is not None,
+            "spire_agent_reattestation_avoided": changed and not self.expected_config.join_token_required,
+        }
+
+    def to_ansible_return_data_server_cmd_queue(self) -> Dict[str, Any]:
+        waits = self.spire_server_cmd_queue_waits
+        return {
+            "spire_server_cmd_queue_wait_seconds": {
+                "count": len(waits),
+                "total": round(sum(waits), 3),
+                "max": round(max(waits, default=0.0), 3),
+            }
+        }
+
+    def need_env_file_install(self) -> bool:
+        """True if the env file must be installed regardless of its digest,
+        the masked join token of an attesting agent does not show up in the diff.
+        """
+        return self.expected_config is not None and self.expected_config.join_token_required
+
     def to_ansible_retun_data_failed_entry(self) -> Dict[str, bool]:
         if not self.need_change():
             return {}
@@ -228,35 +297,27 @@ class AgentActionData:
             )
         )
         # file_stats_diff.
-        exe_versions = [
-            VersionDiff(
-                resource_id=dirs.path_executable,
-                version_actual=actual.version,
-                version_expected=expected.spire_version
-            )
-        ]
+        exe_versions, exe_digests = make_executable_diffs(
+            path_executable=dirs.path_executable,
+            version_actual=actual.version,
+            version_expected=expected.spire_version,
+            sha256_actual=actual.executable_sha256,
+            sha256_expected=self.expected_executable_sha256,
+        )
         state_diff = StateOfAgentDiff(
             actual=actual.to_detected_state(),
             expected=self.expected_state
         )
-        # "Faking" env-file digest
-        # Using existence to make sure it will be created.
-        # ==>Update not covered
-        # TODO: do real diff
-        #       env is bash file or really just  ini?
-        env_file = dirs.path_env_file
+        # the join token is masked in the env file digests, see need_env_file_install
         env_file_digest_diff = DigestDiff(
-            file=env_file,
-            digest_actual=f"exists={actual.file_stats.exists(env_file)}",
-            digest_expected=f"exists={self.expected_file_stats.exists(env_file)}"
+            file=dirs.path_env_file,
+            digest_actual=actual.hexdigest_env_file,
+            digest_expected=expected.env_file_digest
         )
-
-        # TODO do real bundle content diff
-        bundle_file = dirs.path_trust_bundle_pem
         bundle_file_digest_diff = DigestDiff(
-            file=bundle_file,
-            digest_actual=f"exists={actual.file_stats.exists(bundle_file)}",
-            digest_expected=f"exists={self.expected_file_stats.exists(bundle_file)}"
+            file=dirs.path_trust_bundle_pem,
+            digest_actual=actual.hexdigest_trust_bundle_file,
+            digest_expected=expected.trust_bundle_file_digest
         )
 
         file_contents: List[DigestDiff] = [
@@ -271,7 +332,8 @@ class AgentActionData:
                 digest_expected=expected.service_file_disgest
             ),
             env_file_digest_diff,
-            bundle_file_digest_diff
+            bundle_file_digest_diff,
+            *exe_digests
         ]
         scope_diff = StrResourceDiff(
             resource_id="spire-server-service-scope",
@@ -298,31 +360,27 @@ class ExpectedConfig:
         expected_spire_version: str,
         expected_service_scope: Scope,
         spire_server_bundle: str,
-        join_token: str,
         task_args: Dict[str, Any]
     ):
+        self.exe_template_on_localhost = exe_template_on_localhost
+        self.templates = templates
         self.env_file: str = None
         self.service_file: str = None
         self.conf_file: str = None
         self.trust_bundle_file: str = None
         self.service_file_disgest: str = None
         self.config_file_digest: str = None
+        self.env_file_digest: str = None
+        self.trust_bundle_file_digest: str = None
         self.spire_version: str = None
         self.service_scope: Scope = None
+        # set if the agent has to attest, the env file must then be installed with a fresh join token
+        self.join_token_required: bool = False
 
         if expected_state == State.present:
             self.service_scope = expected_service_scope
             self.spire_version = expected_spire_version
-            #server_templates: ServerTemplates = action_data.server_templates
-            #extra_vars_service_env: Dict[str, str] = {}
-            extra_vars_service_env: Dict[str, str] = {"spire_agent_join_token": join_token}
-            # TODO join-toen is just for creating if agent is running we want
-            # to ignore hashes of file containing it, we do want to avoid creating it when not necesarry
-            # is test present enough?
             template_resources = [
-                SpireTemplateRes(
-                    label="service.env", src=templates.tmpl_service_env,
-                    extra_vars=extra_vars_service_env),
                 SpireTemplateRes(
                     label="service", src=templates.tmpl_service,
                     extra_vars={**task_args}),
@@ -335,13 +393,27 @@ class ExpectedConfig:
                 extra_vars={**task_args, "spire_server_bundle": spire_server_bundle}
             )
             ]
-            self.env_file, self.service_file, self.conf_file, self.trust_bundle_file = [
+            self.service_file, self.conf_file, self.trust_bundle_file = [
                 exe_template_on_localhost(tres) for tres in template_resources]
+            # the join token is only minted if the agent has to attest, see render_env_file
+            self.render_env_file(join_token=None)
             self.service_file_disgest = digest_ini_file(self.service_file)
             self.config_file_digest = digest_hcl_file(self.conf_file)
+            self.trust_bundle_file_digest = digest_pem_bundle_file(self.trust_bundle_file)
 
+    def render_env_file(self, join_token: Optional[str]) -> None:
+        """Renders the env file, without join token as long as the agent keeps its svid.
+        The join token is masked in the env file digest (see digest_env_file),
+        join_token_required makes sure a newly minted one still gets installed
+        (see AgentActionData.need_env_file_install).
+        """
+        self.env_file = self.exe_template_on_localhost(SpireTemplateRes(
+            label="service.env", src=self.templates.tmpl_service_env,
+            extra_vars={"spire_agent_join_token": join_token or ""}))
+        self.env_file_digest = digest_env_file(self.env_file)
 
-class ActionModule(SpireActionBase):
+
+class ActionModule(SpireCmptActionBase):
 
     def __init__(
         self, task: Task, connection: ConnectionBase,
@@ -363,32 +435,35 @@ class ActionModule(SpireActionBase):
             self, task_vars: Dict[str, Any] = None
     ) -> None:
         file_modes = self.action_data.expected_file_modes_effective
-        downloaded_spire_dist_path = self.action_data.downloaded_dist_path
         dirs: AgentDirs = self.action_data.dirs
         expected_dirs = dirs.expected_dirs()
-        dirs_needing_change: List[str] = self.diff_actual_expected.dirs_needing_change(expected_dirs)
+        dirs_needing_change: List[str] = self._install_dirs_to_create(
+            self.diff_actual_expected.dirs_needing_change(expected_dirs))
         self._create_remote_dirs(
             task_vars=task_vars,
             expected_dirs=dirs_needing_change,
-            mode=file_modes.mode_dir
+            mode=file_modes.mode_dir,
+            owner=self.get_install_file_owner()
         )
 
         if  not self.need_spire_binary_change():
             return
 
-        spire_server_binary_extracted_path = extract_tar_member(
-            downloaded_spire_dist_path,
-            "/bin/spire-agent")
+        spire_server_binary_extracted_path, self.action_data.expected_executable_sha256 = \
+            self._extract_spire_binary("/bin/spire-agent")
 
-        self._copy_from_controller_to_target(
-            copy_task_label=f"spire-agent({spire_server_binary_extracted_path})",
-            src=spire_server_binary_extracted_path,
-            dest=dirs.install_dir_bin,
+        binary_dest = self._spire_binary_dest(
+            task_vars=task_vars, sha256=self.action_data.expected_executable_sha256)
+        if binary_dest is None:
+            return
+        self._install_spire_binary(
+            task_vars=task_vars,
+            extracted_path=spire_server_binary_extracted_path,
+            dest=binary_dest,
             sec_attributes={
                 "owner": self.get_install_file_owner(),
                 "mode": file_modes.mode_file_exe
             },
-            task_vars=task_vars,
         )
         return
 
@@ -436,7 +511,6 @@ class ActionModule(SpireActionBase):
                 expected_service_scope=self._get_expected_service_scope(),
                 task_args=self._task.args,
                 spire_server_bundle=self._get_spire_server_bundle(), # action_data.spire_server_bundle,
-                join_token=self._get_join_token() # TODO onyl if we are going to need it
             )
 
             if state == State.present:
@@ -473,7 +547,6 @@ class ActionModule(SpireActionBase):
     def _ensure_service_files_installed(
             self, task_vars: Dict[str, Any] = None,
     ) -> None:
-        diff: DiffSpireCmptActualExpected = self.diff_actual_expected
         action_data = self.action_data
         config: ExpectedConfig = action_data.expected_config
 
@@ -491,35 +564,11 @@ class ActionModule(SpireActionBase):
             ("agent_server.service", config.service_file, dirs.path_service_file),
             ("trust-bundle.pem", config.trust_bundle_file, dirs.path_trust_bundle_pem)
         ]
-        for label, src, dest in copy_task_specs:
-            if diff.need_content_change(dest):
-                self._copy_from_controller_to_target(
-                    task_vars=task_vars, copy_task_label=label,
-                    src=src, dest=dest,
-                    sec_attributes=sec_attributes.copy())
-            elif diff.need_attrs_change(dest):
-                self.create_remote_file(
-                    file_path=dest,
-                    mode=None,
-                    state="file",
-                    task_vars=task_vars,
-                    module_args_overrides=sec_attributes.copy(),
-                )
-
-    def _wait_for_spire_agent_healthy(self, task_vars: Dict[str, Any] = None) -> None:
-        def found_that_agent_is_healthy() -> bool:
-            info = self.action_data.spire_agent_info
-            is_healthy: bool = info.is_healthy
-            return is_healthy
-
-        self._get_spire_agent_info(task_vars=task_vars, with_registration_check=False)
-        timeout = self._get_float_from_original_task_args("spire_agent_healthiness_probe_timeout_seconds")
-        if timeout is None:
-            return
-        start = time.time()
-        while not found_that_agent_is_healthy() and (time.time() - start) < timeout:
-            time.sleep(1)
-            self._get_spire_agent_info(task_vars=task_vars)
+        self._install_files_on_target(
+            task_vars=task_vars,
+            copy_task_specs=copy_task_specs,
+            sec_attributes=sec_attributes,
+            force_copy=[dirs.path_env_file] if action_data.need_env_file_install() else [])
 
     def get_registration_uds_path_server_cmd_args_contribution(self) -> List[str]:
         uds_path = self._get_str_from_original_task_args("spire_server_registration_uds_path")
@@ -557,10 +606,31 @@ class ActionModule(SpireActionBase):
             "command": module_args,
         }
 
-        version_ret: Dict[str, Any] = self._run_sub_task(task_data=data, hostname=spire_server_host)
+        version_ret: Dict[str, Any] = self._run_spire_server_sub_task(
+            task_data=data, spire_server_host=spire_server_host)
 
         return version_ret
 
+    def _run_spire_server_sub_task(self, task_data: Dict[str, Any], spire_server_host: str) -> Dict[str, Any]:
+        """Runs the sub task on the spire server host while holding one of the slots of that host,
+        the slots being shared by all forks of the controller; so the agents of a large fleet
+        do not all hit the server (and its sshd) at once.
+        """
+        concurrency = self._get_int_from_original_task_args("spire_server_cmd_concurrency")
+        if concurrency is None:
+            concurrency = 4
+        if concurrency == 0:
+            return self._run_sub_task(task_data=task_data, hostname=spire_server_host)
+        queue_timeout = self._get_float_from_original_task_args("spire_server_cmd_queue_timeout_seconds")
+        semaphore = FileLockSemaphore(
+            lock_dir=self._get_controller_cache_dir("locks"),
+            name=f"spire-server-cmd-{spire_server_host}",
+            slots=concurrency)
+        with semaphore.slot(timeout=300.0 if queue_timeout is None else queue_timeout) as waited:
+            self.action_data.spire_server_cmd_queue_waits.append(waited)
+            self._display.vvv(f"waited {waited:.3f}s for a spire server command slot on {spire_server_host}")
+            return self._run_sub_task(task_data=task_data, hostname=spire_server_host)
+
     def _get_spire_server_version(self, task_vars: Dict[str, Any] = None) -> None:
         version_ret = self._run_spire_server_cmd_sub_task(
             task_vars=task_vars,
@@ -588,6 +658,24 @@ class ActionModule(SpireActionBase):
             self.action_data.spire_server_bundle = stdout
         return self.action_data.spire_server_bundle
 
+    def _ensure_join_token_if_attestation_needed(self, task_vars: Dict[str, Any] = None) -> None:
+        """Mints a join token only if the agent has to attest, see AgentInfoResultAdapter.needs_attestation.
+        The data dir (svid, bundle, keys) is kept through binary and config changes,
+        so the restarted agent just goes on with its svid.
+        """
+        action_data = self.action_data
+        if State.present != action_data.expected_state.state:
+            return
+        needs_attestation, reason = action_data.spire_agent_info.needs_attestation()
+        if not needs_attestation:
+            return
+        self._display.vvv(f"agent attestation needed: {reason}")
+        config: ExpectedConfig = action_data.expected_config
+        config.join_token_required = True
+        if self.get_check_mode():
+            return
+        config.render_env_file(join_token=self._get_join_token(task_vars=task_vars))
+
     def _get_join_token(self, task_vars: Dict[str, Any] = None) -> str:
 
         def args_contrib_ttl() -> List[str]:
@@ -663,6 +751,16 @@ class ActionModule(SpireActionBase):
         agent_info = AgentInfoResultAdapter(module_ret)
         self.action_data.spire_agent_info = agent_info
         if with_registration_check:
+            if "local" == self._get_registration_verification_mode():
+                min_validity = self._get_int_from_original_task_args(
+                    "spire_agent_registration_local_min_validity_seconds")
+                verified, issue = agent_info.has_local_registration_evidence(
+                    min_validity_seconds=600 if min_validity is None else min_validity)
+                if verified:
+                    agent_info.is_registered = True
+                    agent_info.registration_verified_by = "local"
+                    return
+                self._display.vvv(f"local registration evidence not conclusive, asking the server: {issue}")
             registration_info = self._get_spire_agent_registration_info(agent_info)
             matching_registration: List[AgentRegistrationEntry] = \
                 registration_info.select_matching_registration(
@@ -676,8 +774,13 @@ class ActionModule(SpireActionBase):
                 return bool(cast(AgentRegistrationEntry, e).expiration_time > now)
 
             agent_info.is_registered = any(filter(has_not_expired, matching_registration))
+            agent_info.registration_verified_by = "server"
         return
 
+    def _get_registration_verification_mode(self) -> str:
+        mode = self._get_str_from_original_task_args("spire_agent_registration_verification")
+        return mode or "server"
+
     def _get_spire_agent_registration_info(
             self, agent_info: AgentInfoResultAdapter
     ) -> AgentRegistrationInfoResultAdapter:
@@ -707,7 +810,7 @@ class ActionModule(SpireActionBase):
             "io_patricecongo.spire.spire_agent_registration_info": module_args,
         }
 
-        registration_ret = self._run_sub_task(task_data=data, hostname=spire_server_host)
+        registration_ret = self._run_spire_server_sub_task(task_data=data, spire_server_host=spire_server_host)
 
         return AgentRegistrationInfoResultAdapter(registration_ret)
 
@@ -722,6 +825,24 @@ class ActionModule(SpireActionBase):
     def get_info(self) -> SpireCmptInfoResultAdapter:
         return self.action_data.spire_agent_info
 
+    def _need_change(self) -> bool:
+        return self.diff_actual_expected.need_change() or self.action_data.need_env_file_install()
+
+    def _plan_changes(self) -> ChangePlan:
+        plan = super()._plan_changes()
+        path_env_file = self.action_data.dirs.path_env_file
+        if not self.action_data.need_env_file_install() \
+                or any(change.resource_id == path_env_file for change in plan.changes):
+            return plan
+        # the agent only picks up the join token at start
+        return ChangePlan([
+            *plan.changes,
+            PlannedChange(path_env_file, ChangeKind.file_content, Disruption.restart)
+        ])
+
+    def _run_return_data(self) -> Dict[str, Any]:
+        return {**super()._run_return_data(), **self.action_data.to_ansible_return_data_server_cmd_queue()}
+
     def need_spire_binary_change(self) -> bool:
         need_change: bool = self.diff_actual_expected.need_binary_change(
             bin_file=self.action_data.dirs.path_executable
@@ -740,22 +861,34 @@ class ActionModule(SpireActionBase):
             self.action_data.templates = AgentTemplates()
             self.action_data.local_temp_work_dir = make_local_temp_work_dir("spire-agent-work-dir")
             self.action_data.dirs = AgentDirs.from_ansible_src(self._get_str_from_original_task_args)
+            fast_path_ret = self._state_fingerprint_fast_path(
+                task_vars=tv, template_files=[*vars(self.action_data.templates).values()])
+            if fast_path_ret is not None:
+                return fast_path_ret
             self.__ensure_expected_config_available_locally(task_vars=tv)
 
             self._get_spire_agent_info(task_vars=tv)
+            self._ensure_join_token_if_attestation_needed(task_vars=tv)
             self.diff_actual_expected = self.action_data.diff()
+            if State.present == self.action_data.expected_state.state:
+                self._use_executable_digest_for_binary_diff("/bin/spire-agent")
 
             if self.get_check_mode():
-                cm_ret: Dict[str, Any] = self.check_mode_ansible_return()
+                cm_ret: Dict[str, Any] = {
+                    **self.check_mode_ansible_return(),
+                    'changed': self._need_change()
+                }
                 return cm_ret
 
-            if self.diff_actual_expected.need_change():
+            if self._need_change():
                 changed = True
                 if State.present == self.action_data.expected_state.state:
-                    self.stop_spire_cmpt_service_if_running(
-                        task_args_mapper=self.__service_state_to_stopped,
-                        task_vars=tv)
-                    self._get_join_token(task_vars=tv)
+                    change_plan = self._plan_changes()
+                    staged_upgrade = self._is_staged_upgrade()
+                    if change_plan.need_stop_before_change() and not staged_upgrade:
+                        self.stop_spire_cmpt_service_if_running(
+                            task_args_mapper=self.__service_state_to_stopped,
+                            task_vars=tv)
                     self._get_spire_server_bundle()
                     self._get_spire_server_version(task_vars=tv)
                     self.action_data.downloaded_dist_path = self._download_spire_release(
@@ -763,6 +896,16 @@ class ActionModule(SpireActionBase):
                     )
                     self._ensure_dir_structure_and_binary_available(task_vars=tv)
                     self._ensure_service_files_installed(task_vars=tv)
+                    if change_plan.need_stop_before_change() and staged_upgrade:
+                        self.stop_spire_cmpt_service_if_running(
+                            task_args_mapper=self.__service_state_to_stopped,
+                            task_vars=tv)
+                    self._commit_staged_files(task_vars=tv)
+                    self._activate_installed_version(task_vars=tv)
+                    if change_plan.need_restart_after_change():
+                        self.stop_spire_cmpt_service_if_running(
+                            task_args_mapper=self._service_state_to_stopped_after_change,
+                            task_vars=tv)
                 self._execute_actual_spire_ansible_module(task_vars=tv)
                 self._get_spire_agent_info(task_vars=tv)
                 diff_after_change: DiffSpireCmptActualExpected = self.action_data.diff()
@@ -783,6 +926,10 @@ class ActionModule(SpireActionBase):
                 **self.diff_actual_expected.ansible_diff_outcome_part(
                         diff_activated=self.get_diff_mode()
                 ),
-                **self.action_data.to_ansible_return_data()
+                **self.action_data.to_ansible_return_data(),
+                **self.action_data.to_ansible_return_data_attestation(changed),
+                **self._run_return_data(),
             }
+            self._record_state_fingerprint(
+                task_vars=tv, template_files=[*vars(self.action_data.templates).values()], ret=ret)
             return ret
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+import os
+from typing import Any, Dict, cast
+
+from ansible.parsing import dataloader
+from ansible.playbook.play_context import PlayContext
+from ansible.playbook.task import Task
+from ansible.plugins import loader as plugins_loader
+from ansible.plugins.connection.__init__ import ConnectionBase
+from ansible.template import Templar
+from ansible_collections.io_patricecongo.spire.plugins.module_utils import logging
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.install_versions import (
+    versioned_bin_dir,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_action_base import (
+    SpireActionBase,
+)
+
+
+class ActionModule(SpireActionBase):
+    """Pushes the spire binary of a release into the versioned install directory of the target
+    (<install_dir>/versions/<version>/bin) without activating it.
+    The release is downloaded, verified and extracted once on the controller (cached across hosts
+    and runs); hosts are served in parallel as usual with ansible forks.
+    A later spire_agent or spire_server run using the versioned install layout finds the binary
+    in place and only switches the current symlink and restarts the service.
+    """
+
+    def __init__(
+        self, task: Task, connection: ConnectionBase,
+        play_context: PlayContext, loader: dataloader.DataLoader,
+        templar: Templar, shared_loader_obj: plugins_loader
+    ) -> None:
+        super().__init__(
+            task=task, connection=connection, play_context=play_context,
+            loader=loader, templar=templar,
+            shared_loader_obj=shared_loader_obj,
+            module_fq_name="io_patricecongo.spire.spire_prestage")
+
+    def get_expected_version(self) -> str:
+        return self._get_str_from_original_task_args("spire_prestage_version")
+
+    def _get_exec_file_name(self) -> str:
+        component = self._get_str_from_original_task_args("spire_prestage_component")
+        if component not in ("agent", "server"):
+            raise ValueError(f"spire_prestage_component must be agent or server but was: {component}")
+        return f"spire-{component}"
+
+    def _is_already_staged(self, task_vars: Dict[str, Any], path: str, sha256: str) -> bool:
+        stat_ret = self.remote_stat(task_vars=task_vars, file_path=path, checksum_algorithm="sha256")
+        stat = stat_ret.get("stat") or {}
+        return bool(stat.get("exists")) and sha256 == stat.get("checksum")
+
+    def run(
+        self, tmp: Any = None, task_vars: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        super(ActionModule, self).run(tmp, task_vars)
+
+        tv = dict(task_vars)
+        try:
+            exec_file_name = self._get_exec_file_name()
+            bin_dir = versioned_bin_dir(
+                self._get_str_from_original_task_args("spire_prestage_install_dir"),
+                self.get_expected_version())
+            dest = os.path.join(bin_dir, exec_file_name)
+            downloaded_dist_path = self._download_spire_release(download_decider=lambda: True)
+            extracted_path, sha256 = self._extract_spire_binary(
+                f"/bin/{exec_file_name}", downloaded_dist_path=downloaded_dist_path)
+            changed = not self._is_already_staged(task_vars=tv, path=dest, sha256=sha256)
+            if changed and not self.get_check_mode():
+                owner = self._get_str_from_original_task_args("spire_prestage_file_owner")
+                self._create_remote_dirs(
+                    task_vars=tv,
+                    expected_dirs=[bin_dir],
+                    mode=self._get_str_from_original_task_args("spire_prestage_dir_mode") or "u=rwx,g=rx,o=rx",
+                    owner=owner)
+                self._install_spire_binary(
+                    task_vars=tv,
+                    extracted_path=extracted_path,
+                    dest=dest,
+                    sec_attributes={
+                        "owner": owner,
+                        "mode": (self._get_str_from_original_task_args("spire_prestage_file_mode_exe")
+                                 or "u=rwx,g=rx,o=rx"),
+                    })
+        except Exception as e:
+            msg = f"""Error while running spire_prestage action:
+                    message:{str(e)}
+                    stacktrace: {logging.get_exception_stacktrace(e)}
+                    """
+            self._display.v(msg)
+            raise e
+        else:
+            return cast(Dict[str, Any], {
+                "changed": changed,
+                "spire_prestage_path": dest,
+                "spire_prestage_sha256": sha256,
+            })
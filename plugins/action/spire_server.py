@@ -20,7 +20,7 @@
 
 # Make coding more python3-ish, this is required for contributions to Ansible
 import shutil
-from typing import Any, Callable, Dict, List, Union, cast
+from typing import Any, Callable, Dict, List, Optional, Union, cast
 
 from ansible.parsing import dataloader
 from ansible.playbook.play_context import PlayContext
@@ -32,9 +32,9 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils import loggi
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.diffs import (
     DigestDiff,
     StrResourceDiff,
-    VersionDiff,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.digests import (
+    digest_env_file,
     digest_hcl_file,
     digest_ini_file,
 )
@@ -52,8 +52,9 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils.server_templ
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_action_base import (
     DiffSpireCmptActualExpected,
-    SpireActionBase, SpireCmptInfoResultAdapter,
+    SpireCmptActionBase, SpireCmptInfoResultAdapter,
     SpireTemplateRes,
+    make_executable_diffs,
     make_local_temp_work_dir,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_server_info_cmd import (
@@ -66,9 +67,6 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing
     SubStateServiceStatus,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.systemd import Scope
-from ansible_collections.io_patricecongo.spire.plugins.module_utils.tar_utils import (
-    extract_tar_member,
-)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.users import User
 
 
@@ -83,6 +81,7 @@ class ServerInfoResultAdapter(SpireCmptInfoResultAdapter[StateOfServer]):
             version=result.get("spire_server_version"),
             version_issue=result.get("spire_server_version_issue"),
             executable_path=result.get("spire_server_executable_path"),
+            executable_sha256=result.get("spire_server_executable_sha256"),
             trust_domain_id=result.get("spire_server_trust_domain_id"),
             trust_domain_id_issue=result.get("spire_server_trust_domain_id_issue"),
             is_healthy=result.get("spire_server_is_healthy", False),
@@ -99,6 +98,8 @@ class ServerInfoResultAdapter(SpireCmptInfoResultAdapter[StateOfServer]):
             hexdigest_service_file_issue=result.get("spire_server_hexdigest_service_file_issue"),
             hexdigest_config_file=result.get("spire_server_hexdigest_config_file"),
             hexdigest_config_file_issue=result.get("spire_server_hexdigest_config_file_issue"),
+            hexdigest_env_file=result.get("spire_server_hexdigest_env_file"),
+            hexdigest_env_file_issue=result.get("spire_server_hexdigest_env_file_issue"),
             file_stats=FileStats.from_ansible_result(result, "spire_server_file_stats"),
         )
 
@@ -137,6 +138,7 @@ class ServerActionData:
         self.expected_stats_by_mode: ExpectedStatsByMode = None
         self.expected_file_stats: FileStats = None
         self.expected_user: User = None
+        self.expected_executable_sha256: str = None
 
     def to_ansible_return_data(self) -> Dict[str, Any]:
         actual_state_result_data = self.spire_server_info.to_ansible_return_data()
@@ -161,27 +163,21 @@ class ServerActionData:
             )
         )
         # file_stats_diff.
-        exe_versions = [
-            VersionDiff(
-                resource_id=dirs.path_executable,
-                version_actual=actual.version,
-                version_expected=expected.spire_version
-            )
-        ]
+        exe_versions, exe_digests = make_executable_diffs(
+            path_executable=dirs.path_executable,
+            version_actual=actual.version,
+            version_expected=expected.spire_version,
+            sha256_actual=actual.executable_sha256,
+            sha256_expected=self.expected_executable_sha256,
+        )
         state_diff = StateOfServerDiff(
             actual=actual.to_detected_state(),
             expected=self.expected_state
         )
-        # "Faking" env-file digest
-        # Using existence to make sure it will be created.
-        # ==>Update not covered
-        # TODO: do real diff
-        #       env is bash file or really just  ini?
-        env_file = dirs.path_env_file
         env_file_digest_diff = DigestDiff(
-            file=env_file,
-            digest_actual=f"exists={actual.file_stats.exists(env_file)}",
-            digest_expected=f"exists={self.expected_file_stats.exists(env_file)}"
+            file=dirs.path_env_file,
+            digest_actual=actual.hexdigest_env_file,
+            digest_expected=expected.env_file_digest
         )
 
         file_contents: List[DigestDiff] = [
@@ -195,7 +191,8 @@ class ServerActionData:
                 digest_actual=actual.hexdigest_service_file,
                 digest_expected=expected.service_file_disgest
             ),
-            env_file_digest_diff
+            env_file_digest_diff,
+            *exe_digests
         ]
         scope_diff = StrResourceDiff(
             resource_id="spire-server-service-scope",
@@ -228,6 +225,7 @@ class ExpectedConfig:
         self.conf_file: str = None
         self.service_file_disgest: str = None
         self.config_file_digest: str = None
+        self.env_file_digest: str = None
         self.spire_version: str = None
         self.service_scope: Scope = None
 
@@ -252,9 +250,10 @@ class ExpectedConfig:
                 exe_template_on_localhost(tres) for tres in template_resources]
             self.service_file_disgest = digest_ini_file(self.service_file)
             self.config_file_digest = digest_hcl_file(self.conf_file)
+            self.env_file_digest = digest_env_file(self.env_file)
 
 
-class ActionModule(SpireActionBase):
+class ActionModule(SpireCmptActionBase):
 
     def __init__(
         self, task: Task, connection: ConnectionBase,
@@ -273,32 +272,35 @@ class ActionModule(SpireActionBase):
             self, task_vars: Dict[str, Any] = None
     ) -> None:
         file_modes = self.action_data.expected_file_modes_effective
-        downloaded_spire_dist_path = self.action_data.downloaded_dist_path
         dirs: ServerDirs = self.action_data.dirs
         expected_dirs = dirs.expected_dirs()
-        dirs_needing_change: List[str] = self.diff_actual_expected.dirs_needing_change(expected_dirs)
+        dirs_needing_change: List[str] = self._install_dirs_to_create(
+            self.diff_actual_expected.dirs_needing_change(expected_dirs))
         self._create_remote_dirs(
             task_vars=task_vars,
             expected_dirs=dirs_needing_change,
-            mode=file_modes.mode_dir
+            mode=file_modes.mode_dir,
+            owner=self.get_install_file_owner()
         )
 
         if  not self.need_spire_binary_change():
             return
 
-        spire_server_binary_extracted_path = extract_tar_member(
-            downloaded_spire_dist_path,
-            "/bin/spire-server")
+        spire_server_binary_extracted_path, self.action_data.expected_executable_sha256 = \
+            self._extract_spire_binary("/bin/spire-server")
 
-        self._copy_from_controller_to_target(
-            copy_task_label=f"spire-server({spire_server_binary_extracted_path})",
-            src=spire_server_binary_extracted_path,
-            dest=dirs.install_dir_bin,
+        binary_dest = self._spire_binary_dest(
+            task_vars=task_vars, sha256=self.action_data.expected_executable_sha256)
+        if binary_dest is None:
+            return
+        self._install_spire_binary(
+            task_vars=task_vars,
+            extracted_path=spire_server_binary_extracted_path,
+            dest=binary_dest,
             sec_attributes={
                 "owner": self.get_install_file_owner(),
                 "mode": file_modes.mode_file_exe
             },
-            task_vars=task_vars,
         )
         return
 
@@ -381,7 +383,6 @@ class ActionModule(SpireActionBase):
     def _ensure_service_files_installed(
             self, task_vars: Dict[str, Any] = None,
     ) -> None:
-        diff: DiffSpireCmptActualExpected = self.diff_actual_expected
         action_data = self.action_data
         config: ExpectedConfig = action_data.expected_config
 
@@ -398,36 +399,10 @@ class ActionModule(SpireActionBase):
             ("server.conf", config.conf_file, dirs.path_conf_file),
             ("spire_server.service", config.service_file, dirs.path_service_file)
         ]
-        for label, src, dest in copy_task_specs:
-            if diff.need_content_change(dest):
-                self._copy_from_controller_to_target(
-                    task_vars=task_vars, copy_task_label=label,
-                    src=src, dest=dest,
-                    sec_attributes=sec_attributes.copy())
-            elif diff.need_attrs_change(dest):
-                self.create_remote_file(
-                    file_path=dest,
-                    mode=None,
-                    state="file",
-                    task_vars=task_vars,
-                    module_args_overrides=sec_attributes.copy(),
-                )
-
-    def _wait_for_spire_server_healthy(self, task_vars: Dict[str, Any] = None) -> None:
-        def found_that_server_is_healthy() -> bool:
-            info = self.action_data.spire_server_info
-            is_healthy: bool = info.is_healthy
-            return is_healthy
-
-        import time
-        self._get_spire_server_info(task_vars=task_vars)
-        timeout = self._get_float_from_original_task_args("spire_server_healthiness_probe_timeout_seconds")
-        if timeout is None:
-            return
-        start = time.time()
-        while not found_that_server_is_healthy() and (time.time() - start) < timeout:
-            time.sleep(1)
-            self._get_spire_server_info(task_vars=task_vars)
+        self._install_files_on_target(
+            task_vars=task_vars,
+            copy_task_specs=copy_task_specs,
+            sec_attributes=sec_attributes)
 
     def _get_spire_server_info(
             self, task_vars: Dict[str, Any] = None
@@ -504,9 +479,15 @@ class ActionModule(SpireActionBase):
             self.action_data.local_temp_work_dir = make_local_temp_work_dir("spire-server-work-dir")
             self.action_data.dirs = ServerDirs.from_ansible_src(
                                                 self._get_str_from_original_task_args)
+            fast_path_ret = self._state_fingerprint_fast_path(
+                task_vars=tv, template_files=[*vars(self.action_data.server_templates).values()])
+            if fast_path_ret is not None:
+                return fast_path_ret
             self.__ensure_expected_config_available_locally(task_vars=tv)
             self._get_spire_server_info(task_vars=tv)
             self.diff_actual_expected = self.action_data.diff()
+            if State.present == self.action_data.expected_state.state:
+                self._use_executable_digest_for_binary_diff("/bin/spire-server")
             self._display.vvvv(f"---------check_mode={self.get_check_mode()}, diff={self.get_diff_mode()}")
             if self.get_check_mode():
                 cm_ret: Dict[str, Any] = self.check_mode_ansible_return()
@@ -515,16 +496,28 @@ class ActionModule(SpireActionBase):
             if self.diff_actual_expected.need_change():
                 changed = True
                 if State.present == self.action_data.expected_state.state:
-                    self.stop_spire_cmpt_service_if_running(
-                        task_args_mapper=self.__service_state_to_stopped,
-                        task_vars=tv
-                    )
+                    change_plan = self._plan_changes()
+                    staged_upgrade = self._is_staged_upgrade()
+                    if change_plan.need_stop_before_change() and not staged_upgrade:
+                        self.stop_spire_cmpt_service_if_running(
+                            task_args_mapper=self.__service_state_to_stopped,
+                            task_vars=tv)
                     # backup_old_spire_server() backup on target_node, need to specify backup dir
                     self.action_data.downloaded_dist_path = self._download_spire_release(
                         download_decider=self.need_spire_binary_change
                     )
                     self._ensure_dir_structure_and_binary_available(task_vars=tv)
                     self._ensure_service_files_installed(task_vars=tv)
+                    if change_plan.need_stop_before_change() and staged_upgrade:
+                        self.stop_spire_cmpt_service_if_running(
+                            task_args_mapper=self.__service_state_to_stopped,
+                            task_vars=tv)
+                    self._commit_staged_files(task_vars=tv)
+                    self._activate_installed_version(task_vars=tv)
+                    if change_plan.need_restart_after_change():
+                        self.stop_spire_cmpt_service_if_running(
+                            task_args_mapper=self._service_state_to_stopped_after_change,
+                            task_vars=tv)
                 self._execute_actual_spire_ansible_module(task_vars=tv)
                 self._get_spire_server_info(task_vars=tv)
                 diff_after_change: DiffSpireCmptActualExpected = self.action_data.diff()
@@ -545,5 +538,8 @@ class ActionModule(SpireActionBase):
                         diff_activated=self.get_diff_mode()
                 ),
                 **self.action_data.to_ansible_return_data(),
+                **self._run_return_data(),
             }
+            self._record_state_fingerprint(
+                task_vars=tv, template_files=[*vars(self.action_data.server_templates).values()], ret=ret)
             return ret
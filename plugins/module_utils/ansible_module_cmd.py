@@ -16,20 +16,68 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import Any
+import os
+import shlex
+import subprocess
+import threading
+from typing import Any, Dict, List
 
 from ansible.module_utils.basic import AnsibleModule
 
+from .probes import DEFAULT_PROBE_TIMEOUT
 from .spire_typing import CmdExecOutcome
 
+RC_TIMED_OUT = 124
+
 
 class RunCommand:
-    def __init__(self, ansible_module: AnsibleModule) -> None:
+    """Runs commands with AnsibleModule.run_command on the module main thread.
+    AnsibleModule.run_command temporarily changes os.environ (and the cwd/umask if asked to),
+    so the concurrent probes (see probes.run_probes), running in other threads, get their own
+    subprocess path which leaves the process-global state untouched and lets them run in parallel.
+    """
+    def __init__(self, ansible_module: AnsibleModule, probe_timeout: float = DEFAULT_PROBE_TIMEOUT) -> None:
         self.ansible_module = ansible_module
+        self.probe_timeout = probe_timeout
+        self.cwd = os.getcwd()
 
     def __call__(self, args: Any) -> CmdExecOutcome:
+        if threading.current_thread() is not threading.main_thread():
+            return self.__run_in_probe_thread(args)
         rc, stdout, stderr = self.ansible_module.run_command(args)
         return CmdExecOutcome(rc, stdout, stderr)
 
+    def __probe_env(self) -> Dict[str, str]:
+        """The environment AnsibleModule.run_command would set up, built as a copy."""
+        env = dict(os.environ)
+        env.update(getattr(self.ansible_module, "run_command_environ_update", None) or {})
+        if "PYTHONPATH" in env:
+            # like AnsibleModule.run_command: clean out python paths set by ansiballz
+            pypaths = [
+                path for path in env["PYTHONPATH"].split(":")
+                if not path.endswith("/ansible_modlib.zip") and not path.endswith("/debug_dir")]
+            env["PYTHONPATH"] = ":".join(pypaths)
+            if not env["PYTHONPATH"]:
+                del env["PYTHONPATH"]
+        return env
+
+    def __run_in_probe_thread(self, args: Any) -> CmdExecOutcome:
+        arg_list: List[str] = shlex.split(args) if isinstance(args, str) else [str(arg) for arg in args]
+        arg_list = [os.path.expanduser(os.path.expandvars(arg)) for arg in arg_list]
+        try:
+            completed = subprocess.run(
+                arg_list, env=self.__probe_env(), cwd=self.cwd, timeout=self.probe_timeout,
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except subprocess.TimeoutExpired as e:
+            return CmdExecOutcome(
+                RC_TIMED_OUT, self.__decode(e.stdout), f"timed out after {self.probe_timeout}s: {arg_list}")
+        except OSError as e:
+            return CmdExecOutcome(e.errno or 1, "", f"{e}: {arg_list}")
+        return CmdExecOutcome(completed.returncode, self.__decode(completed.stdout), self.__decode(completed.stderr))
+
+    @staticmethod
+    def __decode(output: Any) -> str:
+        return "" if output is None else output.decode("utf-8", errors="surrogateescape")
+
     def whoami(self) -> CmdExecOutcome:
         return self.__call__(["whoami"])
@@ -16,14 +16,19 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
+from datetime import datetime, timezone
 import os
 import pathlib
 from typing import List, Optional, Tuple, cast
 
 from cryptography import x509
+from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
 from cryptography.x509 import Certificate
 
+from .digests import FileDigestCache
+
 
 def get_cert_san(certpath: str) -> Tuple[Optional[str], Optional[int],Optional[str]]:
 
@@ -43,3 +48,110 @@ def get_cert_san(certpath: str) -> Tuple[Optional[str], Optional[int],Optional[s
     if not san_value:
         return None, 0, "Value of type[x509.GeneralName] not available in x509.SubjectAlternativeName"
     return san_value[0], cert.serial_number, None
+
+
+def get_cert_san_cached(
+        certpath: str, facts_cache: FileDigestCache
+) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+    """get_cert_san with the result kept in the facts cache as long as the certificate file is unchanged."""
+    facts = facts_cache.fact(certpath, "cert_san", lambda path: list(get_cert_san(path)))
+    if facts is None:
+        return get_cert_san(certpath)
+    san, serial_number, issue = facts
+    return san, serial_number, issue
+
+
+def split_der_certificates(data: bytes) -> List[bytes]:
+    """Splits concatenated DER certificates (e.g. spire bundle.der, agent_svid.der with intermediates)."""
+    ders: List[bytes] = []
+    offset = 0
+    while offset < len(data):
+        if data[offset] != 0x30 or offset + 2 > len(data):
+            raise ValueError(f"DER sequence expected at offset {offset}")
+        length = data[offset + 1]
+        header_length = 2
+        if length & 0x80:
+            length_bytes = length & 0x7f
+            header_length += length_bytes
+            length = int.from_bytes(data[offset + 2:offset + header_length], "big")
+        end = offset + header_length + length
+        if end > len(data):
+            raise ValueError(f"truncated DER certificate at offset {offset}")
+        ders.append(data[offset:end])
+        offset = end
+    return ders
+
+
+def load_der_certificates(certpath: str) -> List[Certificate]:
+    data = pathlib.Path(certpath).read_bytes()
+    return [x509.load_der_x509_certificate(der, default_backend()) for der in split_der_certificates(data)]
+
+
+def _validity_utc(cert: Certificate) -> Tuple[datetime, datetime]:
+    not_before = getattr(cert, "not_valid_before_utc", None)
+    not_after = getattr(cert, "not_valid_after_utc", None)
+    if not_before is None or not_after is None:
+        # cryptography < 42 only has naive utc datetimes
+        not_before = cert.not_valid_before.replace(tzinfo=timezone.utc)
+        not_after = cert.not_valid_after.replace(tzinfo=timezone.utc)
+    return not_before, not_after
+
+
+def _is_valid_at(cert: Certificate, now: datetime) -> bool:
+    not_before, not_after = _validity_utc(cert)
+    return not_before <= now <= not_after
+
+
+def is_signed_by(cert: Certificate, issuer: Certificate) -> bool:
+    if cert.issuer != issuer.subject:
+        return False
+    public_key = issuer.public_key()
+    try:
+        if isinstance(public_key, rsa.RSAPublicKey):
+            public_key.verify(
+                cert.signature, cert.tbs_certificate_bytes, padding.PKCS1v15(), cert.signature_hash_algorithm)
+        elif isinstance(public_key, ec.EllipticCurvePublicKey):
+            public_key.verify(
+                cert.signature, cert.tbs_certificate_bytes, ec.ECDSA(cert.signature_hash_algorithm))
+        elif isinstance(public_key, ed25519.Ed25519PublicKey):
+            public_key.verify(cert.signature, cert.tbs_certificate_bytes)
+        else:
+            return False
+    except InvalidSignature:
+        return False
+    return True
+
+
+def verify_svid(
+        svid_path: str, bundle_path: str, now: datetime
+) -> Tuple[Optional[datetime], Optional[str]]:
+    """Verifies locally the svid (leaf first, optionally followed by intermediates) against the roots of the bundle.
+    Returns the svid expiry and None if the svid is valid at now and chains up to a bundle root,
+    the svid expiry (if readable) and the issue otherwise.
+    """
+    for path, label in [(svid_path, "svid"), (bundle_path, "bundle")]:
+        if not os.path.exists(path):
+            return None, f"{label} der certificate path [{path}] does not exists"
+    try:
+        svid_chain = load_der_certificates(svid_path)
+        roots = load_der_certificates(bundle_path)
+    except ValueError as e:
+        return None, f"fail to load svid [{svid_path}] or bundle [{bundle_path}]: {str(e)}"
+    if not svid_chain:
+        return None, f"no certificate in svid [{svid_path}]"
+    leaf, intermediates = svid_chain[0], svid_chain[1:]
+    _, leaf_not_after = _validity_utc(leaf)
+
+    current = leaf
+    for _ in range(len(intermediates) + 1):
+        if not _is_valid_at(current, now):
+            not_before, not_after = _validity_utc(current)
+            return leaf_not_after, (f"certificate [{current.subject.rfc4514_string()}] of svid chain "
+                                    f"not valid at {now}: not_before={not_before}, not_after={not_after}")
+        if any(is_signed_by(current, root) and _is_valid_at(root, now) for root in roots):
+            return leaf_not_after, None
+        issuers = [c for c in intermediates if is_signed_by(current, c)]
+        if not issuers:
+            break
+        current = issuers[0]
+    return leaf_not_after, f"svid [{svid_path}] does not chain up to a root of the bundle [{bundle_path}]"
@@ -0,0 +1,81 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import enum
+from typing import Any, Dict, List, NamedTuple
+
+
+@enum.unique
+class Disruption(enum.Enum):
+    """Service interruption needed to apply a change, ordered from the least to the most disruptive."""
+    none = 0
+    restart = 1
+    stop = 2
+
+    def max(self, other: "Disruption") -> "Disruption":
+        return self if self.value >= other.value else other
+
+
+@enum.unique
+class ChangeKind(enum.Enum):
+    file_attrs = "file_attrs"
+    file_content = "file_content"
+    binary = "binary"
+    scope = "scope"
+    state = "state"
+
+
+class PlannedChange(NamedTuple):
+    resource_id: str
+    kind: ChangeKind
+    disruption: Disruption
+
+    def to_ansible_result_value(self) -> Dict[str, str]:
+        return {
+            "resource_id": self.resource_id,
+            "kind": self.kind.name,
+            "disruption": self.disruption.name
+        }
+
+
+class ChangePlan:
+    """The changes needed to reach the expected state and the service interruption they require:
+        - stop: the service must be stopped before the changes are applied
+        - restart: the changes are applied while the service runs, which is restarted afterwards
+        - none: the changes are applied without interrupting the service
+    """
+    def __init__(self, changes: List[PlannedChange]) -> None:
+        self.changes: List[PlannedChange] = changes
+        self.disruption: Disruption = Disruption.none
+        for change in changes:
+            self.disruption = self.disruption.max(change.disruption)
+
+    def need_stop_before_change(self) -> bool:
+        return Disruption.stop == self.disruption
+
+    def need_restart_after_change(self) -> bool:
+        return Disruption.restart == self.disruption
+
+    def to_ansible_result_value(self) -> Dict[str, Any]:
+        return {
+            "disruption": self.disruption.name,
+            "changes": [change.to_ansible_result_value() for change in self.changes]
+        }
+
+    def __str__(self) -> str:
+        return str(self.to_ansible_result_value())
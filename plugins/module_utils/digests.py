@@ -21,6 +21,11 @@ import io
 import hashlib
 import hcl # type: ignore
 import json
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 def __blake2_hexdigest(to_digest:str) -> str:
     #h = hashlib.blake2b(salt=b"fgt565682772", person=b"file-digester", key=b"kjhiuhjhuhj")
@@ -42,4 +47,164 @@ def digest_hcl_file(hcl_path: str) -> str:
       obj = hcl.load(fp)
     as_json_normalized = io.StringIO()
     json.dump(obj=obj, fp=as_json_normalized, sort_keys=True, separators=(',',':'))
-    return __blake2_hexdigest(as_json_normalized.getvalue())
\ No newline at end of file
+    return __blake2_hexdigest(as_json_normalized.getvalue())
+
+# one-time secrets rendered into env files, their values are not part of the env file digest
+ENV_FILE_MASKED_KEYS = ("spire_agent_join_token",)
+
+def digest_env_file(env_path: str, masked_keys: Sequence[str] = ENV_FILE_MASKED_KEYS) -> str:
+    """Digest of the env file normalized line by line: surrounding blanks, empty lines and comments are ignored
+    and the values of masked_keys (e.g. the join token minted anew on each run) are not digested.
+    """
+    with open(env_path, "r") as fp:
+        lines = [line.strip() for line in fp]
+    normalized = []
+    for line in lines:
+        if not line or line.startswith("#"):
+            continue
+        key = line.split("=", 1)[0].strip()
+        if key.startswith("export "):
+            key = key[len("export "):].strip()
+        normalized.append(f"{key}=<masked>" if key in masked_keys else line)
+    return __blake2_hexdigest("\n".join(normalized))
+
+def digest_pem_bundle_file(pem_path: str) -> str:
+    """Digest of the set of certificates of the pem bundle, independent of their order, of the line wrapping
+    and of the text around the pem blocks; the stripped content is digested if it has no pem block.
+    """
+    with open(pem_path, "r") as fp:
+        content = fp.read()
+    blocks = re.findall(r"-----BEGIN ([A-Z0-9 ]+)-----(.*?)-----END \1-----", content, flags=re.DOTALL)
+    if not blocks:
+        return __blake2_hexdigest(content.strip())
+    normalized_blocks = sorted(f"{label}:{''.join(body.split())}" for label, body in blocks)
+    return __blake2_hexdigest("\n".join(normalized_blocks))
+
+def sha256_file(path: str, chunk_size: int = 64 * 1024) -> str:
+    """Returns the sha256 hex digest of the file content, None if the file does not exist."""
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(chunk_size), b""):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+# caches with facts not written yet by id, see flush_digest_caches
+_caches_to_flush: Dict[int, "FileDigestCache"] = {}
+
+
+def flush_digest_caches() -> None:
+    """Writes the file digest caches changed during this module run;
+    modules call it once, before exit_json/fail_json."""
+    for cache in list(_caches_to_flush.values()):
+        cache.flush()
+
+
+class FileDigestCache:
+    """Facts derived from file contents (digests, parsed certificate facts, ...) cached in a json file,
+    keyed by path and validated by (inode, mtime_ns, size), so unchanged files are neither read
+    nor parsed again on later runs.
+    New facts are kept in memory and the json file is only written by flush, if something changed.
+    The cache is best effort: it is just not persisted if the cache file cannot be written.
+    It may be shared by concurrently running probes.
+    """
+    def __init__(self, cache_file: str) -> None:
+        self.cache_file = cache_file
+        self.entries: Dict[str, Dict[str, Any]] = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def __load(self) -> Dict[str, Dict[str, Any]]:
+        if self.entries is None:
+            try:
+                with open(self.cache_file, "r") as fp:
+                    self.entries = json.load(fp)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def __save(self) -> None:
+        cache_dir = os.path.dirname(self.cache_file)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".spire-digests.")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump(self.entries, fp, sort_keys=True)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def __cached_fact(self, path: str, file_key: List[int], kind: str) -> Any:
+        with self.lock:
+            entry = self.__load().get(path)
+            if not entry or entry.get("key") != file_key:
+                return None
+            return (entry.get("facts") or {}).get(kind)
+
+    def __store_fact(self, path: str, file_key: List[int], kind: str, fact: Any) -> None:
+        with self.lock:
+            entries = self.__load()
+            entry = entries.get(path)
+            if not entry or entry.get("key") != file_key or "facts" not in entry:
+                entry = {"key": file_key, "facts": {}}
+                entries[path] = entry
+            entry["facts"][kind] = fact
+            self.dirty = True
+            _caches_to_flush[id(self)] = self
+
+    def flush(self) -> None:
+        """Writes the cache file if facts got stored since the last flush."""
+        with self.lock:
+            if not self.dirty:
+                return
+            self.__save()
+            self.dirty = False
+            _caches_to_flush.pop(id(self), None)
+
+    def fact(self, path: str, kind: str, fact_func: Callable[[str], Any]) -> Any:
+        """Returns the fact of the given kind computed by fact_func from the file,
+        None if the file does not exist. The fact must be json serializable (tuples come back as lists).
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        file_key = [st.st_ino, st.st_mtime_ns, st.st_size]
+        fact = self.__cached_fact(path, file_key, kind)
+        if fact is None:
+            fact = fact_func(path)
+            self.__store_fact(path, file_key, kind, fact)
+        return fact
+
+    def digest(self, path: str, kind: str, digest_func: Callable[[str], str]) -> str:
+        """Returns the digest of the given kind (e.g. sha256) of the file, None if it does not exist."""
+        digest = self.fact(path, kind, digest_func)
+        return None if digest is None else str(digest)
+
+    def sha256(self, path: str) -> Tuple[Optional[str], Optional[str]]:
+        digest = self.digest(path, "sha256", sha256_file)
+        if digest is None:
+            return None, f"file does not exists: {path}"
+        return digest, None
+
+    def hcl_digest(self, path: str) -> str:
+        """Digest of the normalized content of the hcl file, see digest_hcl_file."""
+        return self.digest(path, "hcl", digest_hcl_file)
+
+    def ini_digest(self, path: str) -> str:
+        """Digest of the normalized content of the ini file, see digest_ini_file."""
+        return self.digest(path, "ini", digest_ini_file)
+
+    def env_digest(self, path: str) -> str:
+        """Digest of the normalized content of the env file, see digest_env_file."""
+        return self.digest(path, "env", digest_env_file)
+
+    def pem_bundle_digest(self, path: str) -> str:
+        """Digest of the certificates of the pem bundle, see digest_pem_bundle_file."""
+        return self.digest(path, "pem_bundle", digest_pem_bundle_file)
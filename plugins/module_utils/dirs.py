@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 import os
 from typing import Dict, List, Tuple
 from .file_stat import FileModes
+from .install_versions import versioned_bin_dir
 
 
 class SpireCmptDirs(ABC):
@@ -35,7 +36,14 @@ class SpireCmptDirs(ABC):
         self.path_conf_file: str = os.path.join(self.config_dir, conf_file_name)
         self.path_env_file: str = os.path.join(self.config_dir, env_file_name)
         self.path_service_file: str = os.path.join(self.service_dir, self.service_full_name)
+        self.exec_file_name = exec_file_name
         self.path_executable: str = os.path.join(self.install_dir_bin, exec_file_name)
+        # target side cache of file digests, not part of the expected files
+        self.path_digest_cache: str = os.path.join(self.data_dir, ".spire-ansible-digests.json")
+
+    def versioned_install_dir_bin(self, version: str) -> str:
+        """bin directory of a version in a versioned install; install_dir/bin then links to it through current."""
+        return versioned_bin_dir(self.install_dir, version)
 
     def __str__(self) -> str:
 
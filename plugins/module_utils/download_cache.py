@@ -0,0 +1,298 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .digests import sha256_file
+from .net_utils import url_filename
+
+# fetch(url, dest_path): downloads url into dest_path, raises on failure
+FetchCallable = Callable[[str, str], None]
+
+
+# fds of the shared "in use" locks of the entries returned by DownloadCache.get in this process
+_entries_in_use_fds: List[int] = []
+
+
+class UrlFetchOptions(NamedTuple):
+    """The get_url options applying to a release download, with the get_url defaults.
+    Proxies are taken from the environment (http_proxy, https_proxy, no_proxy) if use_proxy is set.
+    timeout applies to each socket operation, not to the whole download.
+    """
+    validate_certs: bool = True
+    use_proxy: bool = True
+    client_cert: Optional[str] = None
+    client_key: Optional[str] = None
+    headers: Optional[Dict[str, str]] = None
+    timeout: float = 10
+
+    def to_ansible_param(self) -> Dict[str, object]:
+        return self._asdict()
+
+    @staticmethod
+    def from_ansible_param(value: Optional[Dict[str, object]]) -> "UrlFetchOptions":
+        value = value or {}
+        return UrlFetchOptions(**{
+            field: value[field] for field in UrlFetchOptions._fields if value.get(field) is not None})
+
+
+def fetch_with_open_url(url: str, dest_path: str, options: UrlFetchOptions = UrlFetchOptions()) -> None:
+    from ansible.module_utils.urls import open_url
+    with open_url(
+            url, timeout=options.timeout,
+            validate_certs=options.validate_certs,
+            use_proxy=options.use_proxy,
+            client_cert=options.client_cert,
+            client_key=options.client_key,
+            headers=options.headers,
+    ) as response, open(dest_path, "wb") as dest:
+        shutil.copyfileobj(response, dest, 1024 * 1024)
+
+
+def release_entries_in_use() -> None:
+    """Releases the entries returned by DownloadCache.get in this process, making them evictable again.
+    They are otherwise released when the process (e.g. the ansible worker running the task) ends.
+    """
+    while _entries_in_use_fds:
+        DownloadCache._unlock(_entries_in_use_fds.pop())
+
+
+def parse_sha256_sidecar(content: str, filename: str) -> str:
+    """Returns the digest of a sha256sum like sidecar file.
+    Accepted forms are a bare digest or '<digest> <file-name>' lines.
+    """
+    lines = [line.split() for line in content.splitlines() if line.strip()]
+    for parts in lines:
+        if 1 == len(parts) and 1 == len(lines):
+            return parts[0].lower()
+        if 2 == len(parts) and filename == os.path.basename(parts[1].lstrip("*")):
+            return parts[0].lower()
+    raise RuntimeError(f"no sha256 found for {filename} in sidecar content: {content}")
+
+
+class DownloadedFile(NamedTuple):
+    path: str
+    sha256: str
+    downloaded: bool
+
+
+class DownloadCache:
+    """Download cache shared by all forks (controller side) or all runs on a host (target side).
+    Each url gets its own entry directory: <cache_dir>/<sha256(url)>/<file-name>.
+    A file lock per entry makes sure only one fork downloads a given url,
+    the other ones wait for the download and reuse it.
+    Files are downloaded into a temp file, verified against the expected sha256
+    (given or read from the sidecar url) and renamed into place.
+    Least recently used entries are evicted once the total size exceeds max_total_size.
+    An entry returned by get stays in use (shared lock) until the process ends, so it is
+    not evicted while a fork still extracts or transfers it.
+    """
+    def __init__(
+            self, cache_dir: str,
+            max_total_size: int = None,
+            fetch: FetchCallable = fetch_with_open_url,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_total_size = max_total_size
+        self.fetch = fetch
+
+    def __entry_dir(self, url: str) -> str:
+        url_key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, url_key)
+
+    @staticmethod
+    def __lock(entry_dir: str, blocking: bool = True, suffix: str = ".lock", shared: bool = False) -> int:
+        """Locks the entry: <entry>.lock guards its download, <entry>.use is held shared while it is in use.
+        evict removes the lock files of an evicted entry; a lock taken on a removed file is retried
+        on the current one.
+        """
+        path = f"{entry_dir}{suffix}"
+        operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, operation if blocking else operation | fcntl.LOCK_NB)
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            except OSError:
+                os.close(fd)
+                raise
+            os.close(fd)
+
+    @staticmethod
+    def _unlock(fd: int) -> None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def __expected_sha256(self, sha256: str, sidecar_url: str, filename: str, entry_dir: str) -> str:
+        if sha256:
+            return sha256.lower()
+        if not sidecar_url:
+            return None
+        fd, sidecar_path = tempfile.mkstemp(dir=entry_dir, prefix=".sidecar.")
+        os.close(fd)
+        try:
+            self.fetch(sidecar_url, sidecar_path)
+            with open(sidecar_path, "r") as sidecar:
+                return parse_sha256_sidecar(sidecar.read(), filename)
+        finally:
+            os.remove(sidecar_path)
+
+    def get(
+            self, url: str,
+            sha256: str = None,
+            sidecar_url: str = None,
+            filename: str = None,
+    ) -> DownloadedFile:
+        """Returns the cached file for url, downloading it first if necessary.
+        Parameters:
+            url: the url to download
+            sha256: expected sha256 hex digest of the file
+            sidecar_url: url of a sha256sum like file, only used if sha256 is not given
+            filename: name of the cached file, default to the url file name
+        """
+        filename = filename or url_filename(url)
+        if not filename:
+            raise ValueError(f"filename must be given if the url has none: {url}")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_dir = self.__entry_dir(url)
+        path = os.path.join(entry_dir, filename)
+        digest_path = f"{path}.sha256"
+        lock_fd = self.__lock(entry_dir)
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            cached = self.__cached(entry_dir, path, sha256)
+            if cached is not None:
+                return cached
+
+            expected_sha256 = self.__expected_sha256(sha256, sidecar_url, filename, entry_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir, prefix=f".{filename}.")
+            os.close(fd)
+            try:
+                self.fetch(url, tmp_path)
+                actual_sha256 = sha256_file(tmp_path)
+                if expected_sha256 and expected_sha256 != actual_sha256:
+                    raise RuntimeError(
+                        f"""sha256 mismatch for download:
+                            url: {url}
+                            expected: {expected_sha256}
+                            actual:   {actual_sha256}
+                        """)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            with open(digest_path, "w") as digest_file:
+                digest_file.write(actual_sha256)
+            os.utime(entry_dir)
+            self.__mark_in_use(entry_dir)
+        finally:
+            self._unlock(lock_fd)
+        self.evict(keep=entry_dir)
+        return DownloadedFile(path=path, sha256=actual_sha256, downloaded=True)
+
+    def lookup(self, url: str, sha256: str = None, filename: str = None) -> Optional[DownloadedFile]:
+        """Returns the cached file for url, None if it is not cached; nothing is downloaded.
+        Parameters: see get
+        """
+        filename = filename or url_filename(url)
+        if not filename:
+            raise ValueError(f"filename must be given if the url has none: {url}")
+        entry_dir = self.__entry_dir(url)
+        if not os.path.isdir(entry_dir):
+            return None
+        lock_fd = self.__lock(entry_dir)
+        try:
+            return self.__cached(entry_dir, os.path.join(entry_dir, filename), sha256)
+        finally:
+            self._unlock(lock_fd)
+
+    def __cached(self, entry_dir: str, path: str, sha256: Optional[str]) -> Optional[DownloadedFile]:
+        """Returns the cached file if it is there with the expected sha256; the entry lock must be held."""
+        digest_path = f"{path}.sha256"
+        if not (os.path.isfile(path) and os.path.isfile(digest_path)):
+            return None
+        with open(digest_path, "r") as digest_file:
+            cached_sha256 = digest_file.read().strip()
+        if sha256 and sha256.lower() != cached_sha256:
+            return None
+        os.utime(entry_dir)
+        self.__mark_in_use(entry_dir)
+        return DownloadedFile(path=path, sha256=cached_sha256, downloaded=False)
+
+    def __mark_in_use(self, entry_dir: str) -> None:
+        _entries_in_use_fds.append(self.__lock(entry_dir, suffix=".use", shared=True))
+
+    def __entries_lru_first(self) -> List[Tuple[float, int, str]]:
+        entries: List[Tuple[float, int, str]] = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(entry_dir):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir)
+                if os.path.isfile(os.path.join(entry_dir, f)))
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+        entries.sort()
+        return entries
+
+    def evict(self, keep: str = None) -> List[str]:
+        """Removes least recently used entries until the cache fits into max_total_size.
+        Entries being downloaded or in use (see get) by any fork are skipped.
+        Returns the evicted entry directories.
+        """
+        if self.max_total_size is None:
+            return []
+        entries = self.__entries_lru_first()
+        total_size = sum(size for _, size, _ in entries)
+        evicted: List[str] = []
+        for _, size, entry_dir in entries:
+            if total_size <= self.max_total_size:
+                break
+            if entry_dir == keep:
+                continue
+            try:
+                lock_fd = self.__lock(entry_dir, blocking=False)
+            except OSError:
+                continue
+            try:
+                try:
+                    use_fd = self.__lock(entry_dir, blocking=False, suffix=".use")
+                except OSError:
+                    continue
+                try:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    # removed while locked, so no fork keeps using them
+                    for suffix in [".use", ".lock"]:
+                        os.remove(f"{entry_dir}{suffix}")
+                finally:
+                    self._unlock(use_fd)
+            finally:
+                self._unlock(lock_fd)
+            total_size -= size
+            evicted.append(entry_dir)
+        return evicted
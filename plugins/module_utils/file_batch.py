@@ -0,0 +1,325 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import os
+import tarfile
+import tempfile
+from typing import Any, BinaryIO, Callable, Dict, List, NamedTuple, Tuple
+
+from ansible.module_utils.basic import AnsibleModule
+
+from .digests import sha256_file
+from .file_stat import FileStat
+
+
+class DirSpec(NamedTuple):
+    """Expected attributes of a directory.
+    Note:
+        mode may be given in symbolic (e.g. 'u=rwx,g=rx,o=') or octal ('0750') form.
+        owner and group are left untouched when None.
+    """
+    path: str
+    mode: str
+    owner: str
+    group: str
+
+    @staticmethod
+    def from_ansible_param(param: Dict[str, Any]) -> "DirSpec":
+        path = param.get("path")
+        if not path or path.isspace():
+            raise ValueError(f"path must be provided: {param}")
+        path = os.path.normpath(path.strip())
+        if "/" == path:
+            raise ValueError(f"/ is not accepted as directory to ensure: {param}")
+        return DirSpec(
+            path=path,
+            mode=param.get("mode"),
+            owner=param.get("owner"),
+            group=param.get("group")
+        )
+
+    def to_ansible_param(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+class DirOutcome(NamedTuple):
+    changed: bool
+    created: bool
+    file_stat: FileStat
+
+    def to_ansible_result_value(self) -> Dict[str, Any]:
+        return {
+            "changed": self.changed,
+            "created": self.created,
+            "file_stat": self.file_stat.to_ansible_result_value()
+        }
+
+    @staticmethod
+    def from_ansible_result_value(value: Dict[str, Any]) -> "DirOutcome":
+        return DirOutcome(
+            changed=bool(value.get("changed")),
+            created=bool(value.get("created")),
+            file_stat=FileStat.from_ansible_result_value(value["file_stat"])
+        )
+
+
+def __missing_dirs_top_down(path: str) -> List[str]:
+    missing: List[str] = []
+    current = path
+    while current and current != "/" and not os.path.exists(current):
+        missing.append(current)
+        current = os.path.dirname(current)
+    missing.reverse()
+    return missing
+
+
+def ensure_dir(module: AnsibleModule, spec: DirSpec) -> DirOutcome:
+    """Creates the directory if necessary and fixes its mode and ownership.
+    Like ansible.builtin.file(state=directory), missing parent directories are
+    created too and get the same attributes as the leaf.
+    """
+    file_args = module.load_file_common_arguments(
+        params=spec.to_ansible_param(), path=spec.path
+    )
+    changed = False
+    created = False
+    if os.path.exists(spec.path) and not os.path.isdir(spec.path):
+        raise RuntimeError(f"path exists but is not a directory: {spec.path}")
+    for missing_dir in __missing_dirs_top_down(spec.path):
+        os.mkdir(missing_dir)
+        created = True
+        changed = module.set_fs_attributes_if_different(
+            {**file_args, "path": missing_dir}, changed
+        )
+    changed = module.set_fs_attributes_if_different(file_args, changed)
+    return DirOutcome(
+        changed=bool(changed or created),
+        created=created,
+        file_stat=FileStat.of_local_file(spec.path)
+    )
+
+
+def ensure_dirs(module: AnsibleModule, specs: List[DirSpec]) -> Dict[str, DirOutcome]:
+    """Ensures all given directories in one go; specs are processed in the given order."""
+    return {spec.path: ensure_dir(module, spec) for spec in specs}
+
+
+class FileSpec(NamedTuple):
+    """Expected state of a file installed from a files bundle.
+    Note:
+        member is the name of the bundle member providing the content;
+        if None only the attributes (mode, owner, group) of dest are fixed.
+        sha256 is the expected digest of the member content, not checked if None.
+    """
+    dest: str
+    member: str
+    mode: str
+    owner: str
+    group: str
+    sha256: str
+
+    @staticmethod
+    def from_ansible_param(param: Dict[str, Any]) -> "FileSpec":
+        dest = param.get("dest")
+        if not dest or dest.isspace():
+            raise ValueError(f"dest must be provided: {param}")
+        return FileSpec(
+            dest=os.path.normpath(dest.strip()),
+            member=param.get("member"),
+            mode=param.get("mode"),
+            owner=param.get("owner"),
+            group=param.get("group"),
+            sha256=param.get("sha256"),
+        )
+
+    def to_ansible_param(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+class FileOutcome(NamedTuple):
+    changed: bool
+    content_changed: bool
+    file_stat: FileStat
+
+    def to_ansible_result_value(self) -> Dict[str, Any]:
+        return {
+            "changed": self.changed,
+            "content_changed": self.content_changed,
+            "file_stat": self.file_stat.to_ansible_result_value()
+        }
+
+    @staticmethod
+    def from_ansible_result_value(value: Dict[str, Any]) -> "FileOutcome":
+        return FileOutcome(
+            changed=bool(value.get("changed")),
+            content_changed=bool(value.get("content_changed")),
+            file_stat=FileStat.from_ansible_result_value(value["file_stat"])
+        )
+
+
+def make_files_bundle(bundle_path: str, member_by_src: Dict[str, str]) -> str:
+    """Packs the given local files into a tar.gz bundle.
+    Parameters:
+        bundle_path: path of the bundle to create
+        member_by_src: the bundle member name keyed by the local source path
+    """
+    with tarfile.open(bundle_path, mode="w:gz") as tar:
+        for src, member in member_by_src.items():
+            tar.add(src, arcname=member, recursive=False)
+    return bundle_path
+
+
+def __stage_member(module: AnsibleModule, tar: tarfile.TarFile, spec: FileSpec) -> str:
+    member_file = tar.extractfile(spec.member)
+    if member_file is None:
+        raise RuntimeError(f"bundle member is not a regular file: {spec.member}")
+    return __stage_content(module, member_file, spec, f"bundle member {spec.member}")
+
+
+def __stage_content(module: AnsibleModule, content: BinaryIO, spec: FileSpec, label: str) -> str:
+    fd, staged_path = tempfile.mkstemp(
+        dir=os.path.dirname(spec.dest),
+        prefix=f".{os.path.basename(spec.dest)}.",
+        suffix=".spire-tmp")
+    try:
+        with os.fdopen(fd, "wb") as staged, content:
+            for chunk in iter(lambda: content.read(64 * 1024), b""):
+                staged.write(chunk)
+        actual_sha256 = sha256_file(staged_path)
+        if spec.sha256 and spec.sha256 != actual_sha256:
+            raise RuntimeError(
+                f"""sha256 mismatch for {label}:
+                    expected: {spec.sha256}
+                    actual:   {actual_sha256}
+                """)
+        module.set_default_selinux_context(staged_path, False)
+        file_args = module.load_file_common_arguments(
+            params=spec.to_ansible_param(), path=staged_path)
+        module.set_fs_attributes_if_different(file_args, False)
+    except Exception:
+        os.remove(staged_path)
+        raise
+    return staged_path
+
+
+def staged_path_of(dest: str) -> str:
+    """Path a file is staged at before being committed to dest; same directory so the commit is a rename."""
+    return f"{dest}.spire-staged"
+
+
+def __move_changed_members(
+        module: AnsibleModule, bundle_path: str, specs: List[FileSpec],
+        target_of: Callable[[FileSpec], str]
+) -> Dict[str, FileOutcome]:
+    staged: List[Tuple[FileSpec, str]] = []
+    outcomes: Dict[str, FileOutcome] = {}
+    try:
+        if any(spec.member for spec in specs):
+            if not bundle_path:
+                raise ValueError(f"bundle path must be provided when members are to be installed: {specs}")
+            with tarfile.open(bundle_path) as tar:
+                for spec in specs:
+                    if spec.member:
+                        staged.append((spec, __stage_member(module, tar, spec)))
+        for spec, staged_path in staged:
+            if sha256_file(staged_path) == sha256_file(spec.dest):
+                continue
+            target = target_of(spec)
+            os.replace(staged_path, target)
+            outcomes[spec.dest] = FileOutcome(
+                changed=True, content_changed=True,
+                file_stat=FileStat.of_local_file(target))
+    finally:
+        for _, staged_path in staged:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+    return outcomes
+
+
+def __fix_attrs(module: AnsibleModule, spec: FileSpec) -> FileOutcome:
+    if not os.path.isfile(spec.dest):
+        raise RuntimeError(f"file to fix attributes for does not exist: {spec.dest}")
+    file_args = module.load_file_common_arguments(
+        params=spec.to_ansible_param(), path=spec.dest)
+    changed = module.set_fs_attributes_if_different(file_args, False)
+    return FileOutcome(
+        changed=bool(changed), content_changed=False,
+        file_stat=FileStat.of_local_file(spec.dest))
+
+
+def install_files_bundle(
+        module: AnsibleModule, bundle_path: str, specs: List[FileSpec]
+) -> Dict[str, FileOutcome]:
+    """Installs the files of a bundle to their destinations.
+    All members are first staged next to their destination (content, mode and ownership),
+    then moved in place with os.replace. A failure while staging leaves every destination
+    untouched. Members whose content equals the current destination content are not moved,
+    only the attributes of the destination are fixed.
+    """
+    outcomes = __move_changed_members(module, bundle_path, specs, lambda spec: spec.dest)
+    for spec in specs:
+        if spec.dest not in outcomes:
+            outcomes[spec.dest] = __fix_attrs(module, spec)
+    return {spec.dest: outcomes[spec.dest] for spec in specs}
+
+
+def install_local_file(module: AnsibleModule, src: str, spec: FileSpec) -> FileOutcome:
+    """Installs a file already on the host to spec.dest like install_files_bundle installs a member:
+    staged next to dest, verified, then moved in place if its content differs.
+    """
+    with open(src, "rb") as content:
+        staged_path = __stage_content(module, content, spec, f"file {src}")
+    try:
+        if sha256_file(staged_path) != sha256_file(spec.dest):
+            os.replace(staged_path, spec.dest)
+            return FileOutcome(
+                changed=True, content_changed=True,
+                file_stat=FileStat.of_local_file(spec.dest))
+    finally:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+    return __fix_attrs(module, spec)
+
+
+def stage_files_bundle(
+        module: AnsibleModule, bundle_path: str, specs: List[FileSpec]
+) -> Dict[str, FileOutcome]:
+    """First half of install_files_bundle: members whose content differs from their destination
+    are left at staged_path_of(dest), ready for commit_staged_files.
+    Destinations are not touched, except for attribute only fixes.
+    """
+    outcomes = __move_changed_members(
+        module, bundle_path, specs, lambda spec: staged_path_of(spec.dest))
+    for spec in specs:
+        if spec.dest not in outcomes:
+            outcomes[spec.dest] = __fix_attrs(module, spec)
+    return {spec.dest: outcomes[spec.dest] for spec in specs}
+
+
+def commit_staged_files(specs: List[FileSpec]) -> Dict[str, FileOutcome]:
+    """Renames the files staged by stage_files_bundle into place."""
+    outcomes: Dict[str, FileOutcome] = {}
+    for spec in specs:
+        staged_path = staged_path_of(spec.dest)
+        committed = os.path.exists(staged_path)
+        if committed:
+            os.replace(staged_path, spec.dest)
+        outcomes[spec.dest] = FileOutcome(
+            changed=committed, content_changed=committed,
+            file_stat=FileStat.of_local_file(spec.dest))
+    return outcomes
@@ -0,0 +1,275 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+"""In-process gRPC health check (grpc.health.v1.Health/Check) over a unix domain socket.
+
+Instead of forking <spire-agent|spire-server healthcheck>, the check speaks the few HTTP/2 frames
+a unary gRPC call needs. Request headers are sent as HPACK literals; the response headers are
+not decoded since the serving status is carried by the response message alone.
+"""
+
+import socket
+import struct
+from typing import List, NamedTuple, Optional, Tuple
+
+from .polling import Backoff, poll_until
+
+
+GRPC_HEALTH_CHECK_PATH = "/grpc.health.v1.Health/Check"
+HTTP2_CLIENT_PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+
+FRAME_DATA = 0x0
+FRAME_HEADERS = 0x1
+FRAME_RST_STREAM = 0x3
+FRAME_SETTINGS = 0x4
+FRAME_PING = 0x6
+FRAME_GOAWAY = 0x7
+
+FLAG_END_STREAM = 0x1
+FLAG_ACK = 0x1
+FLAG_END_HEADERS = 0x4
+FLAG_PADDED = 0x8
+
+STREAM_ID = 1
+
+# grpc.health.v1.HealthCheckResponse.ServingStatus
+SERVING_STATUS_NAMES = {0: "UNKNOWN", 1: "SERVING", 2: "NOT_SERVING", 3: "SERVICE_UNKNOWN"}
+SERVING = "SERVING"
+
+CONNECT_RETRY_BACKOFF = Backoff(initial_interval=0.05, multiplier=2.0, max_interval=0.5, jitter=0.2)
+
+
+class GrpcHealthResult(NamedTuple):
+    """Outcome of a health check.
+    conclusive is False if the exchange could not be carried out as expected (e.g. unexpected frames),
+    the caller may then fall back to the spire healthcheck command.
+    """
+    status: Optional[str]
+    issue: Optional[str]
+    conclusive: bool
+
+    def is_serving(self) -> bool:
+        return SERVING == self.status
+
+
+def frame(frame_type: int, flags: int, stream_id: int, payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload))[1:] + bytes([frame_type, flags]) \
+        + struct.pack(">I", stream_id & 0x7FFFFFFF) + payload
+
+
+def read_frame(sock: socket.socket) -> Tuple[int, int, int, bytes]:
+    """Returns (type, flags, stream id, payload) of the next frame, padding removed."""
+    header = _read_exact(sock, 9)
+    length = struct.unpack(">I", b"\x00" + header[:3])[0]
+    frame_type, flags = header[3], header[4]
+    stream_id = struct.unpack(">I", header[5:9])[0] & 0x7FFFFFFF
+    payload = _read_exact(sock, length)
+    if flags & FLAG_PADDED and frame_type in [FRAME_DATA, FRAME_HEADERS]:
+        payload = payload[1:len(payload) - payload[0]]
+    return frame_type, flags, stream_id, payload
+
+
+def _read_exact(sock: socket.socket, size: int) -> bytes:
+    chunks: List[bytes] = []
+    remaining = size
+    while remaining > 0:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            raise ConnectionError(f"connection closed while {remaining} of {size} bytes were expected")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def _hpack_int(value: int, prefix_bits: int) -> bytes:
+    max_prefix = (1 << prefix_bits) - 1
+    if value < max_prefix:
+        return bytes([value])
+    encoded = [max_prefix]
+    value -= max_prefix
+    while value >= 0x80:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def hpack_literal(name: str, value: str) -> bytes:
+    """Literal header field without indexing, new name, no huffman encoding (RFC 7541 6.2.2)."""
+    name_bytes, value_bytes = name.encode("ascii"), value.encode("ascii")
+    return b"\x00" + _hpack_int(len(name_bytes), 7) + name_bytes + _hpack_int(len(value_bytes), 7) + value_bytes
+
+
+def grpc_message(message: bytes) -> bytes:
+    # uncompressed flag followed by the big endian message length
+    return b"\x00" + struct.pack(">I", len(message)) + message
+
+
+def encode_health_check_request(service: str) -> bytes:
+    if not service:
+        return b""
+    service_bytes = service.encode("utf-8")
+    # field 1 (service), length delimited
+    return b"\x0a" + _varint(len(service_bytes)) + service_bytes
+
+
+def _varint(value: int) -> bytes:
+    encoded = []
+    while value >= 0x80:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def decode_serving_status(message: bytes) -> str:
+    """Returns the status (field 1, varint) of a HealthCheckResponse, UNKNOWN if absent."""
+    pos, status = 0, 0
+    while pos < len(message):
+        key, pos = _read_varint(message, pos)
+        field, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(message, pos)
+            if field == 1:
+                status = value
+        elif wire_type == 2:
+            length, pos = _read_varint(message, pos)
+            pos += length
+        elif wire_type == 1:
+            pos += 8
+        elif wire_type == 5:
+            pos += 4
+        else:
+            raise ValueError(f"unsupported protobuf wire type {wire_type} in {message!r}")
+    return SERVING_STATUS_NAMES.get(status, str(status))
+
+
+def connect_uds(socket_path: str, timeout: float, connect_retry_budget: float) -> Tuple[Optional[socket.socket], Optional[str]]:
+    """Connects to the unix domain socket, retrying with backoff for connect_retry_budget seconds
+    e.g. while the component is starting and the socket is not created yet.
+    """
+    def try_connect() -> Tuple[Optional[socket.socket], Optional[str]]:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+            return sock, None
+        except OSError as e:
+            sock.close()
+            return None, f"Fail to connect to {socket_path}: {e}"
+
+    outcome = poll_until(
+        attempt_func=try_connect,
+        is_done=lambda connected: connected[0] is not None,
+        timeout=connect_retry_budget,
+        backoff=CONNECT_RETRY_BACKOFF)
+    sock, issue = outcome.last_value
+    if sock is None:
+        return None, f"{issue} (attempts={len(outcome.attempts)}, elapsed={outcome.elapsed:.3f}s)"
+    return sock, None
+
+
+def check_health(
+    socket_path: str,
+    timeout: float = 5.0,
+    connect_retry_budget: float = 0.0,
+    service: str = "",
+) -> GrpcHealthResult:
+    """Performs grpc.health.v1.Health/Check against the gRPC server listening at socket_path.
+    Params:
+        timeout: socket timeout of each connect, send and receive
+        connect_retry_budget: how long connecting may be retried
+        service: the checked service, the server overall health if empty
+    """
+    sock, issue = connect_uds(socket_path, timeout=timeout, connect_retry_budget=connect_retry_budget)
+    if sock is None:
+        return GrpcHealthResult(status=None, issue=issue, conclusive=True)
+    try:
+        return _exchange(sock, service)
+    except socket.timeout as e:
+        return GrpcHealthResult(status=None, issue=f"Timeout while checking health at {socket_path}: {e}", conclusive=True)
+    except Exception as e:
+        return GrpcHealthResult(
+            status=None, issue=f"Fail to check health at {socket_path}: {type(e).__name__} {e}", conclusive=False)
+    finally:
+        sock.close()
+
+
+def _send_ack(sock: socket.socket, ack_frame: bytes) -> None:
+    # acks are best effort: the response may already be buffered while the server closed the connection,
+    # a connection really lost shows up when reading the next frame
+    try:
+        sock.sendall(ack_frame)
+    except OSError:
+        pass
+
+
+def _exchange(sock: socket.socket, service: str) -> GrpcHealthResult:
+    headers = b"".join([
+        hpack_literal(":method", "POST"),
+        hpack_literal(":scheme", "http"),
+        hpack_literal(":path", GRPC_HEALTH_CHECK_PATH),
+        hpack_literal(":authority", "localhost"),
+        hpack_literal("content-type", "application/grpc"),
+        hpack_literal("te", "trailers"),
+    ])
+    sock.sendall(
+        HTTP2_CLIENT_PREFACE
+        + frame(FRAME_SETTINGS, 0, 0, b"")
+        + frame(FRAME_HEADERS, FLAG_END_HEADERS, STREAM_ID, headers)
+        + frame(FRAME_DATA, FLAG_END_STREAM, STREAM_ID, grpc_message(encode_health_check_request(service))))
+
+    data = b""
+    while True:
+        frame_type, flags, stream_id, payload = read_frame(sock)
+        if frame_type == FRAME_SETTINGS and not flags & FLAG_ACK:
+            _send_ack(sock, frame(FRAME_SETTINGS, FLAG_ACK, 0, b""))
+        elif frame_type == FRAME_PING and not flags & FLAG_ACK:
+            _send_ack(sock, frame(FRAME_PING, FLAG_ACK, 0, payload))
+        elif frame_type == FRAME_GOAWAY:
+            return GrpcHealthResult(status=None, issue=f"connection refused with GOAWAY {payload!r}", conclusive=False)
+        elif stream_id != STREAM_ID:
+            continue
+        elif frame_type == FRAME_RST_STREAM:
+            return GrpcHealthResult(status=None, issue=f"stream reset by server: {payload!r}", conclusive=False)
+        elif frame_type == FRAME_DATA:
+            data += payload
+        if stream_id == STREAM_ID and flags & FLAG_END_STREAM and frame_type in [FRAME_DATA, FRAME_HEADERS]:
+            break
+
+    if len(data) < 5:
+        # e.g. service not registered, the grpc error status being in the (undecoded) trailers
+        return GrpcHealthResult(status=None, issue="call completed without health check response", conclusive=True)
+    if data[0] != 0:
+        return GrpcHealthResult(status=None, issue="compressed health check response not supported", conclusive=False)
+    length = struct.unpack(">I", data[1:5])[0]
+    status = decode_serving_status(data[5:5 + length])
+    issue = None if SERVING == status else f"health check status: {status}"
+    return GrpcHealthResult(status=status, issue=issue, conclusive=True)
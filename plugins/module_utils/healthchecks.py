@@ -18,14 +18,20 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
 from abc import ABC
 import re
-import time
 from typing import List, Pattern
 
 from ansible_collections.io_patricecongo.spire.plugins.module_utils import spire_cmd
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.polling import (
+    PollOutcome,
+    poll_until,
+)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing import (
     BoolResultWithIssue,
     CmdExecCallable,
 )
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.startup_watch import (
+    StartupFailureWatch,
+)
 
 
 class Check(ABC):
@@ -37,8 +43,14 @@ class Check(ABC):
         run_command: CmdExecCallable,
         spire_component_bin:str,
         readiness_probe_timeout_seconds: float = 5.0,
+        native_socket_path: str = None,
+        connect_retry_budget_seconds: float = 0.0,
+        startup_watch: StartupFailureWatch = None,
     ) -> None:
         super().__init__()
+        self.startup_watch = startup_watch
+        self.native_socket_path = native_socket_path
+        self.connect_retry_budget_seconds = connect_retry_budget_seconds
         self.readiness_probe_timeout_seconds = readiness_probe_timeout_seconds
         self.healthcheck_cmd_output_regex = healthcheck_cmd_output_regex
         self.ipc_socket_path_args = ipc_socket_path_args
@@ -50,33 +62,33 @@ class Check(ABC):
             healthcheck_cmd_output_regex=self.healthcheck_cmd_output_regex,
             ipc_socket_path_args=self.ipc_socket_path_args,
             run_command=self.run_command,
-            spire_component_bin=self.spire_component_bin
+            spire_component_bin=self.spire_component_bin,
+            socket_path=self.native_socket_path,
+            connect_retry_budget_seconds=self.connect_retry_budget_seconds,
         )
 
-    def wait_for_readiness(self) -> None:
-        """ Waits for the checked spire component to become healthy."""
-        start = time.time()
-
-        def has_not_timeout() -> bool:
-            return time.time() - start < self.readiness_probe_timeout_seconds
+    def poll_readiness(self) -> PollOutcome:
+        """ Polls until the checked spire component is healthy or the readiness timeout elapsed.
+        The last value of the outcome is the last health check result (BoolResultWithIssue).
+        With a startup watch, polling is aborted as soon as the component is found to have failed."""
+        return poll_until(
+            attempt_func=self.is_healthy,
+            is_done=lambda res_is_healthy: res_is_healthy.res,
+            timeout=self.readiness_probe_timeout_seconds,
+            abort_func=None if self.startup_watch is None else self.startup_watch.failure_reason)
 
-        res_is_healthy: BoolResultWithIssue = self.is_healthy()
-        res_has_not_timeout = True
-        attempts = 0
-        while (not res_is_healthy.res
-               and res_has_not_timeout):
-            time.sleep(1)
-            attempts = attempts + 1
-            res_is_healthy = self.is_healthy()
-            res_has_not_timeout = has_not_timeout()
-        res_is_healthy = self.is_healthy()
+    def wait_for_readiness(self) -> PollOutcome:
+        """ Waits for the checked spire component to become healthy."""
+        outcome = self.poll_readiness()
 
-        if not res_is_healthy.res:
+        if not outcome.succeeded:
             raise RuntimeError(
-                f"readiness probe failed:timeout={not res_has_not_timeout}"
+                f"readiness probe failed:timeout={outcome.timed_out}"
+                f", startup failure={outcome.abort_reason}"
                 f", self.readiness_probe_timeout_seconds={self.readiness_probe_timeout_seconds}"
-                f", health check:{res_is_healthy}"
-                f", attempts={attempts}")
+                f", health check:{outcome.last_value}"
+                f", polling:{outcome.summary()}")
+        return outcome
 
 
 class CheckServer(Check):
@@ -84,7 +96,10 @@ class CheckServer(Check):
         self, run_command: CmdExecCallable,
         file_spire_server_bin: str,
         registration_uds_path: str,
-        readiness_probe_timeout_seconds: float = 5.0
+        readiness_probe_timeout_seconds: float = 5.0,
+        native: bool = True,
+        connect_retry_budget_seconds: float = 0.0,
+        startup_watch: StartupFailureWatch = None,
     ) -> None:
         super().__init__(
             run_command=run_command,
@@ -92,7 +107,10 @@ class CheckServer(Check):
             ipc_socket_path_args=spire_cmd.ipc_socket_path_args_server(
                                                             registration_uds_path),
             spire_component_bin=file_spire_server_bin,
-            readiness_probe_timeout_seconds=readiness_probe_timeout_seconds
+            readiness_probe_timeout_seconds=readiness_probe_timeout_seconds,
+            native_socket_path=registration_uds_path if native else None,
+            connect_retry_budget_seconds=connect_retry_budget_seconds,
+            startup_watch=startup_watch,
         )
 
 
@@ -101,12 +119,18 @@ class CheckAgent(Check):
         self, run_command: CmdExecCallable,
         file_spire_agent_bin: str,
         socket_path: str,
-        readiness_probe_timeout_seconds: float = 5.0
+        readiness_probe_timeout_seconds: float = 5.0,
+        native: bool = True,
+        connect_retry_budget_seconds: float = 0.0,
+        startup_watch: StartupFailureWatch = None,
     ) -> None:
         super().__init__(
             run_command=run_command,
             healthcheck_cmd_output_regex=re.compile(r"^.*Agent\sis\shealthy.*$"),
             ipc_socket_path_args=spire_cmd.ipc_socket_path_args_agent(socket_path),
             spire_component_bin=file_spire_agent_bin,
-            readiness_probe_timeout_seconds=readiness_probe_timeout_seconds
+            readiness_probe_timeout_seconds=readiness_probe_timeout_seconds,
+            native_socket_path=socket_path if native else None,
+            connect_retry_budget_seconds=connect_retry_budget_seconds,
+            startup_watch=startup_watch,
         )
@@ -0,0 +1,95 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+import fcntl
+import hashlib
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Callable, Generator, Optional
+
+from .polling import Backoff, poll_until
+
+# backoff of processes waiting for a slot; slots are typically held for one remote command
+SLOT_WAIT_BACKOFF = Backoff(initial_interval=0.05, multiplier=1.5, max_interval=1.0, jitter=0.5)
+
+
+class FileLockSemaphore:
+    """Counting semaphore shared by all forks of the controller, e.g. to limit the concurrent commands
+    run on a given host: slots are lock files <lock_dir>/<sha256(name)>.<slot>.lock held with flock,
+    so a slot is released as soon as its holder closes it or dies.
+    """
+    def __init__(
+            self, lock_dir: str, name: str, slots: int,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep,
+            random_func: Callable[[], float] = random.random,
+    ) -> None:
+        if slots < 1:
+            raise ValueError(f"at least one slot expected, got slots={slots} for {name}")
+        self.lock_dir = lock_dir
+        self.name = name
+        self.slots = slots
+        self.clock = clock
+        self.sleep = sleep
+        self.random_func = random_func
+
+    def __slot_path(self, slot: int) -> str:
+        name_key = hashlib.sha256(self.name.encode("utf-8")).hexdigest()
+        return os.path.join(self.lock_dir, f"{name_key}.{slot}.lock")
+
+    def __try_lock_any_slot(self) -> Optional[int]:
+        # starting at a random slot spreads the forks over the slots
+        first = int(self.random_func() * self.slots) % self.slots
+        for i in range(self.slots):
+            fd = os.open(self.__slot_path((first + i) % self.slots), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    @contextmanager
+    def slot(self, timeout: float) -> Generator[float, None, None]:
+        """Holds a slot for the duration of the with block and yields the seconds waited for it.
+        Raises RuntimeError if no slot gets free within timeout seconds.
+        """
+        outcome = poll_until(
+            attempt_func=self.__try_lock_any_slot,
+            timeout=timeout,
+            is_done=lambda fd: fd is not None,
+            backoff=SLOT_WAIT_BACKOFF,
+            clock=self.clock,
+            sleep=self.sleep,
+            random_func=self.random_func,
+        )
+        if not outcome.succeeded:
+            raise RuntimeError(
+                f"no free slot out of {self.slots} for {self.name} within {timeout}s: {outcome.summary()}")
+        fd: int = outcome.last_value
+        try:
+            yield outcome.elapsed
+        finally:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
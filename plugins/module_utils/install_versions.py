@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import os
+import shutil
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from .digests import sha256_file
+
+VERSIONS_DIR_NAME = "versions"
+CURRENT_LINK_NAME = "current"
+# install_dir/bin/<exe> as used before versioned installs; kept stable as a symlink to current/bin
+BIN_DIR_NAME = "bin"
+UNVERSIONED_NAME = "unversioned"
+
+
+def versioned_bin_dir(install_dir: str, version: str) -> str:
+    if not version or "/" in version or version.startswith("."):
+        raise ValueError(f"version not usable as directory name: {version}")
+    return os.path.join(install_dir, VERSIONS_DIR_NAME, version, BIN_DIR_NAME)
+
+
+class ActivationOutcome(NamedTuple):
+    activated: bool
+    changed: bool
+    previous_version: Optional[str]
+    removed_versions: List[str]
+
+    def to_ansible_result_value(self) -> Dict[str, Any]:
+        return {
+            "activated": self.activated,
+            "changed": self.changed,
+            "previous_version": self.previous_version,
+            "removed_versions": self.removed_versions,
+        }
+
+    @staticmethod
+    def from_ansible_result_value(value: Dict[str, Any]) -> "ActivationOutcome":
+        return ActivationOutcome(
+            activated=bool(value.get("activated")),
+            changed=bool(value.get("changed")),
+            previous_version=value.get("previous_version"),
+            removed_versions=value.get("removed_versions") or [],
+        )
+
+
+def __switch_symlink(link_path: str, link_target: str) -> bool:
+    """Points link_path at link_target, atomically by renaming a fresh symlink over it."""
+    if os.path.islink(link_path) and os.readlink(link_path) == link_target:
+        return False
+    tmp_link = f"{link_path}.spire-tmp"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(link_target, tmp_link)
+    os.replace(tmp_link, link_path)
+    return True
+
+
+def __ensure_bin_link(install_dir: str) -> bool:
+    """Makes install_dir/bin a symlink to current/bin.
+    A bin directory of a former unversioned install is kept as version 'unversioned' if not empty.
+    """
+    bin_path = os.path.join(install_dir, BIN_DIR_NAME)
+    link_target = os.path.join(CURRENT_LINK_NAME, BIN_DIR_NAME)
+    if os.path.isdir(bin_path) and not os.path.islink(bin_path):
+        if os.listdir(bin_path):
+            unversioned_dir = os.path.join(install_dir, VERSIONS_DIR_NAME, UNVERSIONED_NAME)
+            shutil.rmtree(unversioned_dir, ignore_errors=True)
+            os.makedirs(unversioned_dir)
+            os.rename(bin_path, os.path.join(unversioned_dir, BIN_DIR_NAME))
+        else:
+            os.rmdir(bin_path)
+    return __switch_symlink(bin_path, link_target)
+
+
+def __current_version(install_dir: str) -> Optional[str]:
+    current = os.path.join(install_dir, CURRENT_LINK_NAME)
+    if not os.path.islink(current):
+        return None
+    return os.path.basename(os.readlink(current).rstrip("/"))
+
+
+def __remove_old_versions(install_dir: str, keep: List[str], retention: int) -> List[str]:
+    versions_dir = os.path.join(install_dir, VERSIONS_DIR_NAME)
+    candidates = [
+        name for name in os.listdir(versions_dir)
+        if name not in keep and os.path.isdir(os.path.join(versions_dir, name))
+    ]
+    # most recently activated first
+    candidates.sort(key=lambda name: os.path.getmtime(os.path.join(versions_dir, name)), reverse=True)
+    removed = candidates[retention:]
+    for name in removed:
+        shutil.rmtree(os.path.join(versions_dir, name))
+    return removed
+
+
+def activate_version(
+        install_dir: str, version: str, exec_file_name: str,
+        retention: int, only_if_sha256: str = None
+) -> ActivationOutcome:
+    """Switches install_dir/current to versions/<version> and removes versions beyond retention.
+    Parameters:
+        retention: number of previous versions to keep besides the activated one
+        only_if_sha256: when given, the version is only activated if its executable has this digest,
+                        e.g. to roll back to a version which is still installed
+    """
+    previous_version = __current_version(install_dir)
+    bin_dir = versioned_bin_dir(install_dir, version)
+    executable = os.path.join(bin_dir, exec_file_name)
+    if only_if_sha256 and only_if_sha256 != sha256_file(executable):
+        return ActivationOutcome(
+            activated=False, changed=False, previous_version=previous_version, removed_versions=[])
+    if not os.path.isfile(executable):
+        raise RuntimeError(f"executable of version {version} not installed: {executable}")
+    version_dir = os.path.dirname(bin_dir)
+    switched = __switch_symlink(
+        os.path.join(install_dir, CURRENT_LINK_NAME),
+        os.path.join(VERSIONS_DIR_NAME, version))
+    if switched:
+        # the version dir mtime records the activation order used for the retention
+        os.utime(version_dir)
+    bin_linked = __ensure_bin_link(install_dir)
+    removed = __remove_old_versions(install_dir, keep=[version], retention=max(retention, 0))
+    return ActivationOutcome(
+        activated=True,
+        changed=bool(switched or bin_linked or removed),
+        previous_version=previous_version,
+        removed_versions=removed,
+    )
@@ -0,0 +1,118 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+"""Polling with exponential backoff, jitter and a deadline, for readiness and termination waits."""
+
+import random
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+
+class Backoff(NamedTuple):
+    """Sleep intervals between attempts: initial_interval * multiplier^attempt, capped at max_interval,
+    then spread by +/- jitter (a fraction of the interval) so that concurrent pollers do not align.
+    """
+    initial_interval: float = 0.05
+    multiplier: float = 2.0
+    max_interval: float = 2.0
+    jitter: float = 0.2
+
+    def interval(self, attempt: int, random_func: Callable[[], float] = random.random) -> float:
+        capped = min(self.initial_interval * (self.multiplier ** attempt), self.max_interval)
+        return max(0.0, capped * (1.0 + self.jitter * (2.0 * random_func() - 1.0)))
+
+
+DEFAULT_BACKOFF = Backoff()
+
+
+class PollAttempt(NamedTuple):
+    """An attempt; times are in seconds, started_at being relative to the start of the polling."""
+    started_at: float
+    duration: float
+    succeeded: bool
+
+    def to_ansible_result_value(self) -> Dict[str, Any]:
+        return {
+            "started_at": round(self.started_at, 3),
+            "duration": round(self.duration, 3),
+            "succeeded": self.succeeded,
+        }
+
+
+class PollOutcome(NamedTuple):
+    succeeded: bool
+    timed_out: bool
+    elapsed: float
+    attempts: List[PollAttempt]
+    last_value: Any
+    abort_reason: Optional[str] = None
+
+    def summary(self) -> str:
+        return (f"succeeded={self.succeeded}, timed_out={self.timed_out}, elapsed={self.elapsed:.3f}s"
+                f", aborted={self.abort_reason is not None}, attempts={len(self.attempts)}"
+                f", attempt_durations={[round(a.duration, 3) for a in self.attempts]}")
+
+    def to_ansible_result_value(self) -> Dict[str, Any]:
+        return {
+            "succeeded": self.succeeded,
+            "timed_out": self.timed_out,
+            "elapsed": round(self.elapsed, 3),
+            "attempts": [a.to_ansible_result_value() for a in self.attempts],
+            "abort_reason": self.abort_reason,
+        }
+
+
+def poll_until(
+    attempt_func: Callable[[], Any],
+    timeout: float,
+    is_done: Callable[[Any], bool] = bool,
+    backoff: Backoff = DEFAULT_BACKOFF,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep,
+    random_func: Callable[[], float] = random.random,
+    abort_func: Callable[[], Optional[str]] = None,
+) -> PollOutcome:
+    """Calls attempt_func until is_done(its value) or timeout seconds elapsed.
+
+    The first attempt is made right away. Sleeps never go past the deadline, so a last attempt
+    is made at the deadline instead of one interval after it.
+    After each unsuccessful attempt, abort_func may return a reason to stop waiting,
+    e.g. because the awaited process already failed.
+    """
+    start = clock()
+    deadline = start + timeout
+    attempts: List[PollAttempt] = []
+    while True:
+        attempt_start = clock()
+        value = attempt_func()
+        attempt_end = clock()
+        done = bool(is_done(value))
+        attempts.append(PollAttempt(
+            started_at=attempt_start - start, duration=attempt_end - attempt_start, succeeded=done))
+        abort_reason = None if done or abort_func is None else abort_func()
+        if abort_reason is not None:
+            return PollOutcome(
+                succeeded=False, timed_out=False, elapsed=clock() - start,
+                attempts=attempts, last_value=value, abort_reason=abort_reason)
+        remaining = deadline - attempt_end
+        if done or remaining <= 0:
+            return PollOutcome(
+                succeeded=done, timed_out=not done, elapsed=attempt_end - start,
+                attempts=attempts, last_value=value)
+        sleep(min(backoff.interval(len(attempts) - 1, random_func), remaining))
@@ -0,0 +1,145 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import concurrent.futures
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+DEFAULT_PROBE_TIMEOUT = 60.0
+DEFAULT_MAX_WORKERS = 16
+
+# probes left running after their timeout, see wait_for_straggling_probes
+_straggling_probes: List[Tuple[str, "concurrent.futures.Future[Any]"]] = []
+_straggling_probes_lock = threading.Lock()
+
+
+def issue_result(issue: str) -> Tuple[None, str]:
+    """Default result of a timed out probe: the usual (value, issue) tuple."""
+    return None, issue
+
+
+class Probe(NamedTuple):
+    """An independent fact gathering step, e.g. a systemctl call or a config digest.
+    Note:
+        timeout_result builds the result reported if the probe does not complete within timeout
+        seconds; it gets the issue text and must return a value shaped like the probe result.
+    """
+    name: str
+    func: Callable[[], Any]
+    timeout: float = DEFAULT_PROBE_TIMEOUT
+    timeout_result: Callable[[str], Any] = issue_result
+
+
+def __timed(func: Callable[[], Any]) -> Tuple[Any, float]:
+    started = time.monotonic()
+    result = func()
+    return result, time.monotonic() - started
+
+
+def run_probes(
+        probes: List[Probe],
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        log_func: Optional[Callable[[str, Optional[Dict[str, str]]], None]] = None,
+) -> Dict[str, Any]:
+    """Runs the probes concurrently and returns their results keyed by probe name.
+    The wall time is roughly the one of the slowest probe instead of the sum of all.
+    A probe still running after its timeout (counted from the start of the run) gets its
+    timeout_result; a probe not started yet is cancelled, a running one cannot be interrupted
+    and is left to complete in the background: modules must call wait_for_straggling_probes
+    before exit_json/fail_json.
+    An exception raised by a probe is re-raised.
+    Note:
+        The probes run in threads of the module process, so they must not change process-global
+        state (cwd, umask, environment); commands must go through a thread-safe run_command,
+        e.g. ansible_module_cmd.RunCommand, which does not use AnsibleModule.run_command in probe threads.
+    """
+    if not probes:
+        return {}
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(probes)))
+    started = time.monotonic()
+    results: Dict[str, Any] = {}
+    futures: Dict[str, "concurrent.futures.Future[Any]"] = {}
+    try:
+        futures = {probe.name: executor.submit(__timed, probe.func) for probe in probes}
+        for probe in probes:
+            remaining = probe.timeout - (time.monotonic() - started)
+            try:
+                results[probe.name], elapsed = futures[probe.name].result(timeout=max(remaining, 0))
+            except concurrent.futures.TimeoutError:
+                results[probe.name] = probe.timeout_result(
+                    f"probe {probe.name} timed out after {probe.timeout}s")
+                elapsed = None
+            if log_func is not None:
+                log_func(f"probe {probe.name}: elapsed={elapsed}", None)
+    finally:
+        __leave_stragglers(futures)
+        executor.shutdown(wait=False)
+    return results
+
+
+def __leave_stragglers(futures: Dict[str, "concurrent.futures.Future[Any]"]) -> None:
+    with _straggling_probes_lock:
+        for name, future in futures.items():
+            if not future.done() and not future.cancel():
+                _straggling_probes.append((name, future))
+
+
+def wait_for_straggling_probes(timeout: float = DEFAULT_PROBE_TIMEOUT) -> List[str]:
+    """Waits for the probes left running after their timeout by run_probes.
+    Returns:
+        the names of the probes still running after timeout seconds
+    """
+    with _straggling_probes_lock:
+        stragglers = list(_straggling_probes)
+    concurrent.futures.wait([future for _, future in stragglers], timeout=timeout)
+    with _straggling_probes_lock:
+        _straggling_probes[:] = [(name, future) for name, future in _straggling_probes if not future.done()]
+        return [name for name, _ in _straggling_probes]
+
+
+class ProbeMemo:
+    """Memoizes probe results by probe name so each fact is computed at most once per state epoch.
+    invalidate() starts a new epoch; it must be called after each mutation of the probed state,
+    e.g. after starting or stopping the service or changing files.
+    Safe to use from the concurrently running probes of run_probes.
+    """
+    def __init__(self) -> None:
+        self.epoch = 0
+        self.__lock = threading.Lock()
+        self.__results: Dict[str, Any] = {}
+        self.__locks_by_name: Dict[str, threading.Lock] = {}
+
+    def get(self, name: str, func: Callable[[], Any]) -> Any:
+        with self.__lock:
+            name_lock = self.__locks_by_name.setdefault(name, threading.Lock())
+        with name_lock:
+            with self.__lock:
+                if name in self.__results:
+                    return self.__results[name]
+                epoch = self.epoch
+            result = func()
+            with self.__lock:
+                if epoch == self.epoch:
+                    self.__results[name] = result
+            return result
+
+    def invalidate(self) -> None:
+        with self.__lock:
+            self.epoch += 1
+            self.__results.clear()
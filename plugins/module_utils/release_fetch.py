@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import functools
+import os
+from typing import Any, Dict, NamedTuple, Optional
+
+from .download_cache import DownloadCache, UrlFetchOptions, fetch_with_open_url
+from .tar_utils import cached_member_sha256, extract_tar_member_cached
+
+
+class FetchedRelease(NamedTuple):
+    """A release fetched into the download cache of a host.
+    Paths are also given relative to the cache dir, so a file server serving the
+    cache dir (e.g. on a distribution host) can make them available to other hosts.
+    """
+    path: str
+    relpath: str
+    sha256: str
+    downloaded: bool
+    member_path: Optional[str]
+    member_relpath: Optional[str]
+    member_sha256: Optional[str]
+
+    def to_ansible_result_value(self) -> Dict[str, Any]:
+        return self._asdict()
+
+    @staticmethod
+    def from_ansible_result_value(value: Dict[str, Any]) -> "FetchedRelease":
+        return FetchedRelease(**{field: value.get(field) for field in FetchedRelease._fields})
+
+
+def fetch_release(
+        cache_dir: str, url: str,
+        sha256: str = None,
+        sidecar_url: str = None,
+        filename: str = None,
+        max_total_size: int = None,
+        member_suffix: str = None,
+        url_options: UrlFetchOptions = UrlFetchOptions(),
+) -> FetchedRelease:
+    """Downloads url into the cache dir of this host (once, verified) and
+    extracts the tar member ending with member_suffix if given.
+    """
+    downloaded = DownloadCache(
+        cache_dir=os.path.join(cache_dir, "downloads"),
+        max_total_size=max_total_size,
+        fetch=functools.partial(fetch_with_open_url, options=url_options),
+    ).get(url=url, sha256=sha256, sidecar_url=sidecar_url, filename=filename)
+    # cache files may be served to other hosts by a file server running as another user
+    os.chmod(downloaded.path, 0o644)
+    member_path = None
+    member_sha256 = None
+    if member_suffix:
+        member_path = extract_tar_member_cached(
+            tar_gz_archive_path=downloaded.path,
+            tar_member_name_suffix=member_suffix,
+            cache_dir=os.path.join(cache_dir, "extracted"),
+            tar_gz_archive_sha256=downloaded.sha256)
+        member_sha256 = cached_member_sha256(member_path)
+    return FetchedRelease(
+        path=downloaded.path,
+        relpath=os.path.relpath(downloaded.path, cache_dir),
+        sha256=downloaded.sha256,
+        downloaded=downloaded.downloaded,
+        member_path=member_path,
+        member_relpath=None if member_path is None else os.path.relpath(member_path, cache_dir),
+        member_sha256=member_sha256,
+    )
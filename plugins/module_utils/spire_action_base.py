@@ -21,12 +21,16 @@
 # Make coding more python3-ish, this is required for contributions to Ansible
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
+import functools
+import hashlib
 import itertools
 import os
+import sys
 import tempfile
-from typing import Any, Callable, Dict, Generator, Generic, List, NamedTuple, Tuple, TypeVar, Union, cast
+from typing import Any, Callable, Dict, Generator, Generic, List, NamedTuple, Optional, Tuple, TypeVar, Union, cast
 
 from ansible import constants
+from ansible.module_utils.parsing.convert_bool import boolean
 from ansible.inventory.host import Host
 from ansible.inventory.manager import InventoryManager
 from ansible.parsing import dataloader
@@ -40,16 +44,39 @@ from ansible.plugins.connection.__init__ import ConnectionBase
 from ansible.template import Templar
 from ansible.vars.manager import VariableManager
 from ansible_collections.io_patricecongo.spire.plugins.module_utils import strings
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.change_plan import (
+    ChangeKind,
+    ChangePlan,
+    Disruption,
+    PlannedChange,
+)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.diffs import (
     DiffABC,
     DigestDiff,
     StrResourceDiff,
     VersionDiff,
 )
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.download_cache import (
+    DownloadCache,
+    DownloadedFile,
+    UrlFetchOptions,
+    fetch_with_open_url,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_batch import (
+    DirOutcome,
+    DirSpec,
+    FileOutcome,
+    FileSpec,
+    make_files_bundle,
+    staged_path_of,
+)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_stat import (
     FileStatDiff, FileStats,
     RemoteFileAccessFacade,
 )
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.install_versions import (
+    ActivationOutcome,
+)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.module_outcome import (
     assert_shell_or_cmd_task_successful,
     assert_task_did_not_failed,
@@ -58,11 +85,23 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils.net_utils im
     is_localhost,
     url_filename,
 )
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.release_fetch import (
+    FetchedRelease,
+)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing import (
     State, StateOfAgent, StateOfAgentDiff, StateOfServer,
     StateOfServerDiff, SubStateServiceInstallation, SubStateServiceStatus,
 )
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.state_fingerprint import (
+    FINGERPRINT_FILE_NAME,
+    FingerprintRecord,
+    canonical_digest,
+)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.systemd import Scope
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.tar_utils import (
+    cached_member_sha256,
+    extract_tar_member_cached,
+)
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.users import User
 
 
@@ -76,6 +115,27 @@ def make_local_temp_work_dir(temp_dir_prefix:str) -> str:
     return local_tempdir
 
 
+def make_executable_diffs(
+        path_executable: str,
+        version_actual: str, version_expected: str,
+        sha256_actual: str, sha256_expected: str,
+) -> Tuple[List[VersionDiff], List[DigestDiff]]:
+    """Returns the diffs of the spire executable as (exe_versions, file_contents).
+    The digest is used when known on both sides, so a binary whose version output
+    does not match (e.g. custom build) is not pushed again if it is the expected one.
+    The version is used otherwise.
+    """
+    if sha256_actual and sha256_expected:
+        return [], [DigestDiff(
+            file=path_executable,
+            digest_actual=sha256_actual,
+            digest_expected=sha256_expected)]
+    return [VersionDiff(
+        resource_id=path_executable,
+        version_actual=version_actual,
+        version_expected=version_expected)], []
+
+
 class SpireTemplateRes(NamedTuple):
     label: str
     src: str
@@ -166,6 +226,41 @@ class DiffSpireCmptActualExpected:
         )
         return not no_diff
 
+    def plan(
+            self, path_executable: str, path_service_file: str,
+            binary_swap_is_atomic: bool
+    ) -> ChangePlan:
+        """Classifies each diff by the service interruption it requires.
+        Params:
+            binary_swap_is_atomic
+                True if the binary is renamed into place, so it can be replaced while the service runs
+        """
+        binary_disruption = Disruption.restart if binary_swap_is_atomic else Disruption.stop
+        changes: List[PlannedChange] = [
+            PlannedChange(d.resource_id, ChangeKind.file_attrs, Disruption.none)
+            for d in self.file_attrs if not d.no_diff()
+        ]
+        for d in self.file_contents:
+            if d.no_diff():
+                continue
+            if d.resource_id == path_executable:
+                changes.append(PlannedChange(d.resource_id, ChangeKind.binary, binary_disruption))
+            elif d.resource_id == path_service_file:
+                # systemd keeps using the loaded unit until the service has been stopped
+                changes.append(PlannedChange(d.resource_id, ChangeKind.file_content, Disruption.stop))
+            else:
+                changes.append(PlannedChange(d.resource_id, ChangeKind.file_content, Disruption.restart))
+        changes.extend(
+            PlannedChange(d.resource_id, ChangeKind.binary, binary_disruption)
+            for d in self.exe_versions if not d.no_diff()
+        )
+        if not self.scope_diff.no_diff():
+            changes.append(PlannedChange(self.scope_diff.resource_id, ChangeKind.scope, Disruption.stop))
+        if not self.state_diff.no_diff():
+            # the spire module applies state changes (start, stop, enable, ...) itself
+            changes.append(PlannedChange(self.state_diff.resource_id, ChangeKind.state, Disruption.none))
+        return ChangePlan(changes)
+
     def dirs_needing_change(self, dirs: List[str])->List[str]:
         # dirs_to_change = list(map(
         #         DiffABC.get_resource_id,
@@ -174,7 +269,7 @@ class DiffSpireCmptActualExpected:
         dirs_to_change = [
             d.resource_id
             for d in self.file_attrs
-            if d.resource_id in dirs
+            if d.resource_id in dirs and not d.no_diff()
         ]
         return dirs_to_change
 
@@ -219,6 +314,9 @@ class SpireCmptInfoResultAdapter(ABC, Generic[StateOfSpireCmpt]):
         hexdigest_config_file: str,
         hexdigest_config_file_issue: str,
         file_stats: FileStats ,
+        executable_sha256: str = None,
+        hexdigest_env_file: str = None,
+        hexdigest_env_file_issue: str = None,
     ) -> None:
         self.result: Dict[str, Any] = result
         self.installed: bool = installed
@@ -241,7 +339,10 @@ class SpireCmptInfoResultAdapter(ABC, Generic[StateOfSpireCmpt]):
         self.hexdigest_service_file_issue = hexdigest_service_file_issue
         self.hexdigest_config_file = hexdigest_config_file
         self.hexdigest_config_file_issue = hexdigest_config_file_issue
+        self.hexdigest_env_file = hexdigest_env_file
+        self.hexdigest_env_file_issue = hexdigest_env_file_issue
         self.file_stats: FileStats = file_stats
+        self.executable_sha256: str = executable_sha256
 
     def _get_issues_issues(self) -> str:
         issues_str = "\n".join([value for key, value in self.result.items() if key.endswith("_issue") and value])
@@ -301,6 +402,13 @@ class SpireActionBase(ActionBase,RemoteFileAccessFacade):  # type: ignore[misc]
             shared_loader_obj=shared_loader_obj)
         self.module_fq_name:str = module_fq_name
         self.diff_actual_expected: DiffSpireCmptActualExpected = None
+        self.downloaded_spire_dist_sha256: str = None
+        self.staged_file_specs: List[FileSpec] = []
+        self.version_to_activate: Optional[str] = None
+        # (url, sha256) of the binary when targets get it from the download host file server
+        self.spire_binary_served_by_download_host: Optional[Tuple[str, str]] = None
+        # polling outcome of the readiness wait done by the component module, if any
+        self.readiness_wait: Optional[Dict[str, Any]] = None
 
     def _get_current_spire_target_host(self, task_vars: Dict[str, Any]) -> str:
         return cast(str, task_vars['inventory_hostname'])
@@ -367,6 +475,322 @@ class SpireActionBase(ActionBase,RemoteFileAccessFacade):  # type: ignore[misc]
             raise RuntimeError(msg)
         return
 
+    def _get_install_files_copy_mode(self) -> str:
+        copy_mode = self._get_str_from_original_task_args("spire_install_files_copy_mode")
+        return copy_mode or "bundle"
+
+    def _install_files_on_target(
+            self, task_vars: Dict[str, Any],
+            copy_task_specs: List[Tuple[str, str, str]],
+            sec_attributes: Dict[str, Any],
+            force_copy: List[str] = None
+    ) -> None:
+        """Copies the files needing a content change and fixes the attributes of the ones
+        only needing an attributes change.
+        Params:
+            copy_task_specs: list of (label, local source, remote destination)
+            force_copy: remote destinations to copy even if their content does not diff
+        """
+        diff: DiffSpireCmptActualExpected = self.diff_actual_expected
+        forced = set(force_copy or [])
+
+        def need_copy(dest: str) -> bool:
+            return dest in forced or diff.need_content_change(dest)
+
+        to_copy = [spec for spec in copy_task_specs if need_copy(spec[2])]
+        to_fix_attrs = [
+            spec for spec in copy_task_specs
+            if not need_copy(spec[2]) and diff.need_attrs_change(spec[2])
+        ]
+        if "bundle" == self._get_install_files_copy_mode() or self._is_staged_upgrade():
+            self._copy_bundle_from_controller_to_target(
+                task_vars=task_vars, to_copy=to_copy,
+                to_fix_attrs=to_fix_attrs, sec_attributes=sec_attributes)
+            return
+
+        for label, src, dest in to_copy:
+            self._copy_from_controller_to_target(
+                task_vars=task_vars, copy_task_label=label,
+                src=src, dest=dest,
+                sec_attributes=sec_attributes.copy())
+        for _, _, dest in to_fix_attrs:
+            self.create_remote_file(
+                file_path=dest,
+                mode=None,
+                state="file",
+                task_vars=task_vars,
+                module_args_overrides=sec_attributes.copy(),
+            )
+
+    def _copy_bundle_from_controller_to_target(
+            self, task_vars: Dict[str, Any],
+            to_copy: List[Tuple[str, str, str]],
+            to_fix_attrs: List[Tuple[str, str, str]],
+            sec_attributes: Dict[str, Any]
+    ) -> Dict[str, FileOutcome]:
+        """Packs the files to copy into one tar.gz, transfers it once and installs
+        all files with a single remote module execution.
+        """
+        if not to_copy and not to_fix_attrs:
+            return {}
+        owner = sec_attributes.get("owner") or None
+        mode = sec_attributes.get("mode") or None
+        member_by_src = {src: f"{idx:02d}-{label}" for idx, (label, src, _) in enumerate(to_copy)}
+        file_specs = [
+            *[FileSpec(dest=dest, member=member_by_src[src], mode=mode, owner=owner,
+                       group=None, sha256=None)
+              for _, src, dest in to_copy],
+            *[FileSpec(dest=dest, member=None, mode=mode, owner=owner, group=None, sha256=None)
+              for _, _, dest in to_fix_attrs],
+        ]
+        local_bundle = None
+        try:
+            if to_copy:
+                local_bundle = make_files_bundle(
+                    bundle_path=self.__make_tempfile_name(prefix="spire-files-bundle-", suffix=".tar.gz"),
+                    member_by_src=member_by_src)
+            return self._install_bundle_on_target(
+                task_vars=task_vars, local_bundle=local_bundle, file_specs=file_specs)
+        finally:
+            if local_bundle and os.path.exists(local_bundle):
+                os.remove(local_bundle)
+
+    def _install_bundle_on_target(
+            self, task_vars: Dict[str, Any],
+            local_bundle: str,
+            file_specs: List[FileSpec]
+    ) -> Dict[str, FileOutcome]:
+        """Transfers the local tar.gz bundle (if any) once and installs the given files
+        with the spire_files_bundle module.
+        In a staged upgrade the files are only staged; _commit_staged_files moves them in place.
+        """
+        module_args: Dict[str, Any] = {
+            "spire_bundle_files": [spec.to_ansible_param() for spec in file_specs]
+        }
+        if self._is_staged_upgrade():
+            module_args["spire_bundle_phase"] = "stage"
+            self.staged_file_specs.extend(spec for spec in file_specs if spec.member)
+        remote_tmp = None
+        try:
+            if local_bundle:
+                remote_tmp = self.create_remote_tmp_dir()
+                remote_bundle = self._connection._shell.join_path(remote_tmp, "spire-files-bundle.tar.gz")
+                self._transfer_file(local_bundle, remote_bundle)
+                self._fixup_perms2((remote_tmp, remote_bundle))
+                module_args["spire_bundle_src"] = remote_bundle
+            self._display.vvv(f"""installing files bundle on target node:
+                module_args: {module_args}
+                """)
+            with self.check_mode_and_diff_being_no():
+                module_ret = self._execute_module(
+                    module_name='io_patricecongo.spire.spire_files_bundle',
+                    module_args=module_args,
+                    task_vars={**task_vars}, tmp=None)
+        finally:
+            if remote_tmp:
+                self.remove_remote_tmp_dir(remote_tmp)
+        assert_task_did_not_failed(
+            module_ret,
+            f"Fail to install files bundle {[spec.dest for spec in file_specs]}")
+        outcomes: Dict[str, Dict[str, Any]] = module_ret.get("spire_bundle_files") or {}
+        return {
+            dest: FileOutcome.from_ansible_result_value(outcome)
+            for dest, outcome in outcomes.items()
+        }
+
+    def _extract_spire_binary(
+            self, tar_member_name_suffix: str, downloaded_dist_path: str = None
+    ) -> Tuple[str, str]:
+        """Returns the path and sha256 of the binary extracted (and cached) from the downloaded release.
+        With a download host, the binary is extracted there and either served to the targets
+        by the file server at spire_download_host_url or relayed to the controller.
+        """
+        if self._get_download_host():
+            host_url = self._get_str_from_original_task_args("spire_download_host_url")
+            if not host_url:
+                relayed = self._lookup_relayed(tar_member_name_suffix)
+                if relayed is not None:
+                    return relayed.path, relayed.sha256
+            fetched = self._fetch_release_on_download_host(member_suffix=tar_member_name_suffix)
+            if host_url:
+                self.spire_binary_served_by_download_host = (
+                    f"{host_url.rstrip('/')}/{fetched.member_relpath}", fetched.member_sha256)
+                return fetched.member_path, fetched.member_sha256
+            return (
+                self._relay_from_download_host(
+                    fetched.member_path, fetched.member_sha256, member_suffix=tar_member_name_suffix),
+                fetched.member_sha256,
+            )
+        extracted_path = extract_tar_member_cached(
+            tar_gz_archive_path=downloaded_dist_path or self.action_data.downloaded_dist_path,
+            tar_member_name_suffix=tar_member_name_suffix,
+            cache_dir=self._get_controller_cache_dir("extracted"),
+            tar_gz_archive_sha256=self.downloaded_spire_dist_sha256)
+        return extracted_path, cached_member_sha256(extracted_path)
+
+    def _is_staged_upgrade(self) -> bool:
+        upgrade_mode = self._get_str_from_original_task_args("spire_upgrade_mode")
+        return "staged" == upgrade_mode
+
+    def _commit_staged_files(self, task_vars: Dict[str, Any]) -> Dict[str, FileOutcome]:
+        """Moves the files staged during a staged upgrade in place with a single module execution."""
+        if not self.staged_file_specs:
+            return {}
+        module_args = {
+            "spire_bundle_phase": "commit",
+            "spire_bundle_files": [spec.to_ansible_param() for spec in self.staged_file_specs]
+        }
+        with self.check_mode_and_diff_being_no():
+            module_ret = self._execute_module(
+                module_name='io_patricecongo.spire.spire_files_bundle',
+                module_args=module_args,
+                task_vars={**task_vars}, tmp=None)
+        assert_task_did_not_failed(
+            module_ret,
+            f"Fail to commit staged files {[spec.dest for spec in self.staged_file_specs]}")
+        self.staged_file_specs = []
+        outcomes: Dict[str, Dict[str, Any]] = module_ret.get("spire_bundle_files") or {}
+        return {
+            dest: FileOutcome.from_ansible_result_value(outcome)
+            for dest, outcome in outcomes.items()
+        }
+
+    def _get_install_versions_retention(self) -> Optional[int]:
+        """Number of previous versions kept by a versioned install, None for the unversioned layout."""
+        retention = self._get_int_from_original_task_args("spire_install_versions_retention")
+        return None if retention is None else int(retention)
+
+    def _is_versioned_install(self) -> bool:
+        return self._get_install_versions_retention() is not None
+
+    def _install_dirs_to_create(self, dirs_needing_change: List[str]) -> List[str]:
+        """In a versioned install, install_dir/bin is a symlink created by the activation
+        and the bin directory of the expected version is created instead."""
+        if not self._is_versioned_install():
+            return dirs_needing_change
+        dirs = self.action_data.dirs
+        dirs_to_create = [d for d in dirs_needing_change if d != dirs.install_dir_bin]
+        if self.diff_actual_expected.need_binary_change(dirs.path_executable):
+            dirs_to_create.append(dirs.versioned_install_dir_bin(self.get_expected_version()))
+        return dirs_to_create
+
+    def _spire_binary_dest(self, task_vars: Dict[str, Any], sha256: str) -> Optional[str]:
+        """Returns where the spire binary must be pushed to, None if nothing must be pushed.
+        In a versioned install a retained version with the expected binary is just activated again,
+        otherwise the binary goes to the version bin directory and gets activated after commit.
+        """
+        dirs = self.action_data.dirs
+        if not self._is_versioned_install():
+            return dirs.path_executable
+        if self._activate_spire_version(task_vars=task_vars, only_if_sha256=sha256):
+            return None
+        self.version_to_activate = self.get_expected_version()
+        return os.path.join(dirs.versioned_install_dir_bin(self.version_to_activate), dirs.exec_file_name)
+
+    def _activate_installed_version(self, task_vars: Dict[str, Any]) -> None:
+        if self.version_to_activate is None:
+            return
+        self._activate_spire_version(task_vars=task_vars)
+        self.version_to_activate = None
+
+    def _activate_spire_version(self, task_vars: Dict[str, Any], only_if_sha256: str = None) -> bool:
+        """Switches the current symlink of the versioned install to the expected version.
+        Returns False if only_if_sha256 is given and the version is not installed with that digest.
+        """
+        dirs = self.action_data.dirs
+        module_args = {
+            "spire_install_dir": dirs.install_dir,
+            "spire_install_version": self.get_expected_version(),
+            "spire_install_exec_file_name": dirs.exec_file_name,
+            "spire_install_versions_retention": self._get_install_versions_retention(),
+        }
+        if only_if_sha256:
+            module_args["spire_install_version_sha256"] = only_if_sha256
+        with self.check_mode_and_diff_being_no():
+            module_ret = self._execute_module(
+                module_name='io_patricecongo.spire.spire_install_version',
+                module_args=module_args,
+                task_vars={**task_vars}, tmp=None)
+        assert_task_did_not_failed(
+            module_ret,
+            f"Fail to activate version {module_args['spire_install_version']} in {dirs.install_dir}")
+        outcome = ActivationOutcome.from_ansible_result_value(module_ret.get("spire_install_version") or {})
+        self._display.vvv(f"version activation: {outcome}")
+        return outcome.activated
+
+    def _get_binary_transfer_mode(self) -> str:
+        transfer_mode = self._get_str_from_original_task_args("spire_binary_transfer_mode")
+        return transfer_mode or "compressed"
+
+    def _install_spire_binary(
+            self, task_vars: Dict[str, Any],
+            extracted_path: str,
+            dest: str,
+            sec_attributes: Dict[str, Any]
+    ) -> None:
+        """Pushes the extracted spire binary to dest on the target.
+        In compressed mode (always used by staged upgrades) a gzip compressed bundle of the binary
+        (built once next to the cached binary) is transferred and decompressed on the target
+        into a staging file, verified against the binary sha256 and renamed into place.
+        """
+        if self.spire_binary_served_by_download_host:
+            self._install_spire_binary_from_download_host(
+                task_vars=task_vars, dest=dest, sec_attributes=sec_attributes)
+            return
+        if "compressed" != self._get_binary_transfer_mode() and not self._is_staged_upgrade():
+            self._copy_from_controller_to_target(
+                copy_task_label=f"{os.path.basename(dest)}({extracted_path})",
+                src=extracted_path,
+                dest=dest,
+                sec_attributes=sec_attributes,
+                task_vars=task_vars,
+            )
+            return
+        member = os.path.basename(extracted_path)
+        compressed_bundle = f"{extracted_path}.tar.gz"
+        if not os.path.isfile(compressed_bundle):
+            fd, tmp_bundle = tempfile.mkstemp(
+                dir=os.path.dirname(extracted_path), prefix=f".{member}.", suffix=".tar.gz")
+            os.close(fd)
+            make_files_bundle(bundle_path=tmp_bundle, member_by_src={extracted_path: member})
+            os.replace(tmp_bundle, compressed_bundle)
+        file_spec = FileSpec(
+            dest=dest, member=member,
+            mode=sec_attributes.get("mode") or None,
+            owner=sec_attributes.get("owner") or None,
+            group=None,
+            sha256=cached_member_sha256(extracted_path))
+        self._install_bundle_on_target(
+            task_vars=task_vars, local_bundle=compressed_bundle, file_specs=[file_spec])
+
+    def _install_spire_binary_from_download_host(
+            self, task_vars: Dict[str, Any],
+            dest: str,
+            sec_attributes: Dict[str, Any]
+    ) -> None:
+        """Makes the target fetch the binary from the download host file server into its own cache
+        and install it to dest (or next to it in a staged upgrade)."""
+        url, sha256 = self.spire_binary_served_by_download_host
+        if self._is_staged_upgrade():
+            self.staged_file_specs.append(
+                FileSpec(dest=dest, member=None, mode=None, owner=None, group=None, sha256=sha256))
+            dest = staged_path_of(dest)
+        module_args = {
+            "spire_fetch_url": url,
+            "spire_fetch_sha256": sha256,
+            "spire_fetch_cache_dir": self._get_download_host_cache_dir(),
+            "spire_fetch_cache_max_size_mb": self._get_download_cache_max_size() // (1024 * 1024),
+            "spire_fetch_dest": dest,
+            "spire_fetch_mode": sec_attributes.get("mode") or None,
+            "spire_fetch_owner": sec_attributes.get("owner") or None,
+        }
+        with self.check_mode_and_diff_being_no():
+            module_ret = self._execute_module(
+                module_name='io_patricecongo.spire.spire_release_fetch',
+                module_args=module_args,
+                task_vars={**task_vars}, tmp=None)
+        assert_task_did_not_failed(module_ret, f"Fail to fetch {url} to {dest}")
+
     def __make_tempfile_with_data(self, prefix: str = None, suffix: str = None, data: str = '') -> str:
         fd, template_dest_local = tempfile.mkstemp(prefix=prefix, suffix=suffix)
         with open(fd, mode="wt") as dest_file:
@@ -543,42 +967,143 @@ class SpireActionBase(ActionBase,RemoteFileAccessFacade):  # type: ignore[misc]
             self._play_context.check_mode = pctx_check_mode
             self._play_context.diff = pctx_diff
 
+    def _get_controller_cache_dir(self, name: str) -> str:
+        """Returns a controller directory which survives the ansible run.
+        DEFAULT_LOCAL_TMP is removed at the end of each run, so the cache lives next to it.
+        """
+        cache_dir = os.path.join(
+            os.path.dirname(constants.DEFAULT_LOCAL_TMP), "io_patricecongo.spire-cache", name)
+        os.makedirs(name=cache_dir, exist_ok=True)
+        return cache_dir
+
     def _download_spire_release(self, download_decider: Callable[[],bool]) -> str:
         if not download_decider():
             from . import randoms
             hint_as_file_name = randoms.random_file_name_with_datetime("spire_download_not_need")
             return os.path.join("/tmp", hint_as_file_name)
-        # Using the controller as download platform.
-        # Idea: You may have a dedicated download node for security and performance reason
-
-        target_host = "localhost"
-
-        download_target_dir = os.path.join(constants.DEFAULT_LOCAL_TMP, "spire")
-        os.makedirs(name=download_target_dir, exist_ok=True)
+        # The controller is the download platform unless a dedicated download host is configured.
+        if self._get_download_host():
+            fetched = self._fetch_release_on_download_host()
+            self.downloaded_spire_dist_sha256 = fetched.sha256
+            return fetched.path
         url = self._get_str_from_original_task_args("spire_download_url")
-        filename = url_filename(url)
+        download_cache = DownloadCache(
+            cache_dir=self._get_controller_cache_dir("downloads"),
+            max_total_size=self._get_download_cache_max_size(),
+            fetch=functools.partial(fetch_with_open_url, options=self._get_download_url_options()))
+        downloaded = download_cache.get(
+            url=url,
+            sha256=self._get_str_from_original_task_args("spire_download_sha256"),
+            sidecar_url=self._get_str_from_original_task_args("spire_download_sha256_url"),
+            filename=self._get_spire_release_filename())
+        self._display.vvv(f"spire release download: url={url}, downloaded={downloaded}")
+        self.downloaded_spire_dist_sha256 = downloaded.sha256
+        return downloaded.path
+
+    def _get_spire_release_filename(self) -> str:
+        filename = url_filename(self._get_str_from_original_task_args("spire_download_url"))
         if not filename:
             version = self.get_expected_version()
             # todo put current host name into name!?!
             filename = f"spire-{version}-linux-x86_64-glibc.tar.gz"
-        filepath = os.path.join(download_target_dir, filename)
-        delegate_to_old = self._task.delegate_to
-
-        module_args = {
-            "url": url,
-            "dest": filepath,
+        return filename
+
+    def _get_download_url_options(self) -> UrlFetchOptions:
+        """The get_url options of the release download, unset task args keep the get_url defaults."""
+        def bool_arg(key: str) -> Optional[bool]:
+            value = self._task.args.get(key)
+            return None if value is None else bool(boolean(value))
+
+        return UrlFetchOptions.from_ansible_param({
+            "validate_certs": bool_arg("spire_download_validate_certs"),
+            "use_proxy": bool_arg("spire_download_use_proxy"),
+            "client_cert": self._get_str_from_original_task_args("spire_download_client_cert"),
+            "client_key": self._get_str_from_original_task_args("spire_download_client_key"),
+            "headers": self._task.args.get("spire_download_headers"),
+        })
+
+    def _get_download_cache_max_size(self) -> int:
+        max_size_mb = self._get_int_from_original_task_args("spire_download_cache_max_size_mb")
+        return int((1024 if max_size_mb is None else max_size_mb) * 1024 * 1024)
+
+    def _get_download_host(self) -> Optional[str]:
+        """Inventory host downloading the release once for all targets, None for the controller."""
+        return self._get_str_from_original_task_args("spire_download_host")
+
+    def _get_download_host_cache_dir(self) -> str:
+        cache_dir = self._get_str_from_original_task_args("spire_download_host_cache_dir")
+        return cache_dir or "/var/cache/io_patricecongo.spire"
+
+    def _fetch_release_on_download_host(self, member_suffix: str = None) -> FetchedRelease:
+        """Fetches the release into the cache of the download host; the cache lock on that host
+        makes sure the release is only downloaded once for all targets."""
+        download_host = self._get_download_host()
+        module_args: Dict[str, Any] = {
+            "spire_fetch_url": self._get_str_from_original_task_args("spire_download_url"),
+            "spire_fetch_sha256": self._get_str_from_original_task_args("spire_download_sha256"),
+            "spire_fetch_sha256_url": self._get_str_from_original_task_args("spire_download_sha256_url"),
+            "spire_fetch_filename": self._get_spire_release_filename(),
+            "spire_fetch_cache_dir": self._get_download_host_cache_dir(),
+            "spire_fetch_cache_max_size_mb": self._get_download_cache_max_size() // (1024 * 1024),
+            "spire_fetch_url_options": self._get_download_url_options().to_ansible_param(),
         }
+        if member_suffix:
+            module_args["spire_fetch_member_suffix"] = member_suffix
         data = {
-            "name": f"{self._task.get_name()}-get-url",
-            "get_url": module_args,
+            "name": f"fetch spire release on {download_host}",
+            "io_patricecongo.spire.spire_release_fetch": module_args,
         }
-
-        get_url_ret = self._run_sub_task(task_data=data, hostname=target_host)
+        fetch_ret = self._run_sub_task(task_data=data, hostname=download_host)
         assert_task_did_not_failed(
-            get_url_ret,
-            f"Fail to download spire binary with  get_url({delegate_to_old} --> {target_host})")
+            fetch_ret, f"Fail to fetch spire release on download host {download_host}")
+        fetched = FetchedRelease.from_ansible_result_value(fetch_ret.get("spire_release_fetch") or {})
+        self._display.vvv(f"spire release fetched on {download_host}: {fetched}")
+        return fetched
+
+    def _get_relay_cache_key(self, member_suffix: str) -> Optional[str]:
+        """Key of a release member relayed to the controller cache: the release sha256 and the member,
+        None if the release sha256 is not known before fetching (e.g. read from a sidecar url)."""
+        release_sha256 = self._get_str_from_original_task_args("spire_download_sha256")
+        if not release_sha256:
+            return None
+        return f"sha256:{release_sha256.lower()}/{member_suffix}"
 
-        return cast(str,get_url_ret.get("dest"))
+    def _lookup_relayed(self, member_suffix: str) -> Optional[DownloadedFile]:
+        """Returns the release member already relayed to the controller cache, None on a miss;
+        the download host is only reached on a miss."""
+        relay_cache_key = self._get_relay_cache_key(member_suffix)
+        if relay_cache_key is None:
+            return None
+        relay_cache = DownloadCache(cache_dir=self._get_controller_cache_dir("relayed"))
+        relayed = relay_cache.lookup(url=relay_cache_key, filename=os.path.basename(member_suffix))
+        self._display.vvv(f"relay cache lookup: key={relay_cache_key}, relayed={relayed}")
+        return relayed
+
+    def _relay_from_download_host(self, remote_path: str, sha256: str, member_suffix: str = None) -> str:
+        """Gets a file of the download host cache to the controller over the existing connection.
+        The controller cache makes sure it is only transferred once for all forks;
+        a release member is cached under its release sha256 when known, see _lookup_relayed.
+        """
+        download_host = self._get_download_host()
+
+        def fetch_over_connection(url: str, dest_path: str) -> None:
+            data = {
+                "name": f"relay {remote_path} from {download_host}",
+                "fetch": {"src": remote_path, "dest": dest_path, "flat": True},
+            }
+            fetch_ret = self._run_sub_task(task_data=data, hostname=download_host, action_name="fetch")
+            assert_task_did_not_failed(fetch_ret, f"Fail to relay {remote_path} from {download_host}")
+
+        relay_cache = DownloadCache(
+            cache_dir=self._get_controller_cache_dir("relayed"),
+            max_total_size=self._get_download_cache_max_size(),
+            fetch=fetch_over_connection)
+        relay_cache_key = None if not member_suffix else self._get_relay_cache_key(member_suffix)
+        relayed = relay_cache.get(
+            url=relay_cache_key or f"{download_host}:{remote_path}",
+            sha256=sha256,
+            filename=os.path.basename(member_suffix or remote_path))
+        return relayed.path
 
     def _execute_actual_spire_ansible_module(
         self,
@@ -592,18 +1117,23 @@ class SpireActionBase(ActionBase,RemoteFileAccessFacade):  # type: ignore[misc]
             task_vars=task_vars)
         if ret.get("failed", False):
             raise RuntimeError(f"spire agent module failed: {ret}")
+        self.readiness_wait = ret.get("readiness_wait") or self.readiness_wait
         return cast(Dict[str, Any], ret)
 
     def remote_stat(
             self, task_vars: Dict[str, Any],
             file_path: str,
+            checksum_algorithm: str = None
     ) -> Dict[str, Any]:
         #- name: Get stats of a file
         # ansible.builtin.stat:
         #     path: /etc/foo.conf
-        module_args = {
+        module_args: Dict[str, Any] = {
             "path": file_path
         }
+        if checksum_algorithm:
+            module_args["get_checksum"] = True
+            module_args["checksum_algorithm"] = checksum_algorithm
         cmd_task_vars = {**task_vars}
         with self.check_mode_and_diff_being_no():
             module_ret = self._execute_module(
@@ -654,16 +1184,32 @@ class SpireActionBase(ActionBase,RemoteFileAccessFacade):  # type: ignore[misc]
     def _create_remote_dirs(
             self, task_vars: Dict[str, Any],
             expected_dirs: List[str],
-            mode: str
-    ) -> None:
-        # TODO what about owner???
-        for expected_dir in expected_dirs:
-            self.create_remote_file(
-                file_path=expected_dir,
-                mode=mode,
-                state="directory",
-                task_vars=task_vars
-            )
+            mode: str,
+            owner: str = None
+    ) -> FileStats:
+        """Creates or fixes all given directories with a single remote module execution.
+        Returns the file stats of the directories after the change.
+        """
+        if not expected_dirs:
+            return FileStats({})
+        module_args = {
+            "spire_dirs": [
+                DirSpec(path=expected_dir, mode=mode, owner=owner, group=None).to_ansible_param()
+                for expected_dir in expected_dirs
+            ]
+        }
+        cmd_task_vars = {**task_vars}
+        with self.check_mode_and_diff_being_no():
+            module_ret = self._execute_module(
+                module_name='io_patricecongo.spire.spire_dirs',
+                module_args=module_args,
+                task_vars=cmd_task_vars, tmp=None)
+        assert_task_did_not_failed(module_ret, f"Fail to ensure remote dirs {expected_dirs}")
+        outcomes: Dict[str, Dict[str, Any]] = module_ret.get("spire_dirs") or {}
+        return FileStats({
+            path: DirOutcome.from_ansible_result_value(outcome).file_stat
+            for path, outcome in outcomes.items()
+        })
 
     def execute_cmd_on_target(self, cmd:str) -> Dict[str, Any]:
         ret: Dict[str, Any] = self._low_level_execute_command(cmd=cmd)
@@ -699,6 +1245,19 @@ class SpireActionBase(ActionBase,RemoteFileAccessFacade):  # type: ignore[misc]
         task: Task = self._task
         task.check_mode = check_mode
 
+    def run(
+        self, tmp: Any = None, task_vars: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        ret: Dict[str,Any] = super(SpireActionBase, self).run(tmp, task_vars)
+        return ret
+
+
+class SpireCmptActionBase(SpireActionBase):  # type: ignore[misc]
+    """'abstract' class of the actions managing a spire component (binary, config and service),
+    i.e. spire_server and spire_agent, whose actual state is gathered with get_info.
+    SpireActionBase alone is enough for actions only pushing release files (e.g. spire_prestage).
+    """
+
     def check_mode_ansible_return(self) -> Dict[str, Any]:
         return {
             'changed': self.diff_actual_expected.need_change(),
@@ -711,6 +1270,28 @@ class SpireActionBase(ActionBase,RemoteFileAccessFacade):  # type: ignore[misc]
     def get_info(self) -> SpireCmptInfoResultAdapter:
         pass
 
+    @abstractmethod
+    def _get_expected_service_scope(self) -> Scope:
+        pass
+
+    def _plan_changes(self) -> ChangePlan:
+        dirs = self.action_data.dirs
+        plan = self.diff_actual_expected.plan(
+            path_executable=dirs.path_executable,
+            path_service_file=dirs.path_service_file,
+            binary_swap_is_atomic=(
+                "compressed" == self._get_binary_transfer_mode()
+                or self._is_staged_upgrade()
+                or self._is_versioned_install()))
+        self._display.vvv(f"change plan: {plan}")
+        return plan
+
+    def _service_state_to_stopped_after_change(self, task_args: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **task_args,
+            "substate_service_status": SubStateServiceStatus.stopped.name,
+        }
+
     def stop_spire_cmpt_service_if_running(
         self,
         task_vars: Dict[str, Any],
@@ -741,8 +1322,120 @@ class SpireActionBase(ActionBase,RemoteFileAccessFacade):  # type: ignore[misc]
                     """
             raise RuntimeError(msg)
 
-    def run(
-        self, tmp: Any = None, task_vars: Dict[str, Any] = None
-    ) -> Dict[str, Any]:
-        ret: Dict[str,Any] = super(SpireActionBase, self).run(tmp, task_vars)
-        return ret
+    def _is_state_fingerprint_enabled(self) -> bool:
+        value = self._task.args.get("spire_state_fingerprint")
+        return value is not None and bool(boolean(value))
+
+    def _expected_inputs_digest(self, template_files: List[str]) -> str:
+        """Digest of everything the expected state is derived from on the controller:
+        the task args, the templates and the action code itself.
+        """
+        file_digests = {}
+        for path in sorted([*template_files, self._get_action_source_file()]):
+            with open(path, "rb") as fp:
+                file_digests[os.path.basename(path)] = hashlib.sha256(fp.read()).hexdigest()
+        return canonical_digest({
+            "module": self.module_fq_name,
+            "task_args": self._task.args,
+            "files": file_digests,
+        })
+
+    def _get_action_source_file(self) -> str:
+        return cast(str, sys.modules[type(self).__module__].__file__)
+
+    def _query_state_fingerprint(
+            self, task_vars: Dict[str, Any],
+            inputs_digest: str,
+            result_to_record: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Optional[FingerprintRecord]]:
+        """Computes the current state fingerprint on the target and returns it with the record found there.
+        The current fingerprint is recorded with the given result if result_to_record is set.
+        """
+        dirs = self.action_data.dirs
+        module_args = {
+            "spire_fingerprint_files": [*dirs.expected_files_not_exec(), *dirs.expected_files_exec()],
+            "spire_fingerprint_service_name": dirs.service_full_name,
+            "spire_fingerprint_service_scope": self._get_expected_service_scope().scope(),
+            "spire_fingerprint_record_path": os.path.join(dirs.data_dir, FINGERPRINT_FILE_NAME),
+            "spire_fingerprint_digest_cache_path": dirs.path_digest_cache,
+            "spire_fingerprint_inputs_digest": inputs_digest,
+            "spire_fingerprint_record": result_to_record is not None,
+            "spire_fingerprint_result": result_to_record,
+        }
+        with self.check_mode_and_diff_being_no():
+            module_ret = self._execute_module(
+                module_name='io_patricecongo.spire.spire_state_fingerprint',
+                module_args=module_args,
+                task_vars={**task_vars}, tmp=None)
+        assert_task_did_not_failed(module_ret, "Fail to query state fingerprint")
+        record = FingerprintRecord.from_ansible_result_value(module_ret.get("spire_state_fingerprint_record"))
+        return module_ret["spire_state_fingerprint"], record
+
+    def _state_fingerprint_fast_path(
+            self, task_vars: Dict[str, Any],
+            template_files: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Returns the result recorded by the last successful run if neither the inputs
+        nor the target state changed since then, None if the run has to go through the full path.
+        """
+        if not self._is_state_fingerprint_enabled():
+            return None
+        if State.present != State.by_name(self._task.args.get("state")):
+            return None
+        inputs_digest = self._expected_inputs_digest(template_files)
+        fingerprint, record = self._query_state_fingerprint(task_vars=task_vars, inputs_digest=inputs_digest)
+        if record is None or not record.matches(inputs_digest, fingerprint):
+            self._display.vvv(f"state fingerprint fast path not taken: record={record}, fingerprint={fingerprint}")
+            return None
+        return {
+            **record.result,
+            **self._run_return_data(),
+            "changed": False,
+            "spire_state_fingerprint_fast_path": True,
+        }
+
+    def _run_return_data(self) -> Dict[str, Any]:
+        """Returns the result part describing this run rather than the target state, e.g. timings.
+        It is not recorded with the state fingerprint; the fast path reports the one of its own run.
+        """
+        if self.readiness_wait is None:
+            return {}
+        return {"readiness_wait": self.readiness_wait}
+
+    def _record_state_fingerprint(
+            self, task_vars: Dict[str, Any],
+            template_files: List[str],
+            ret: Dict[str, Any]
+    ) -> None:
+        """Records the state left by this successful run, so that the next run with the same inputs
+        may take the fast path as long as the target state does not change.
+        """
+        if not self._is_state_fingerprint_enabled() or self.get_check_mode():
+            return
+        if State.present != self.action_data.expected_state.state or ret.get("failed"):
+            return
+        not_recorded = ["changed", "diff", *self._run_return_data().keys()]
+        result_to_record = {key: value for key, value in ret.items() if key not in not_recorded}
+        self._query_state_fingerprint(
+            task_vars=task_vars,
+            inputs_digest=self._expected_inputs_digest(template_files),
+            result_to_record=result_to_record)
+
+    def _use_executable_digest_for_binary_diff(self, tar_member_name_suffix: str) -> None:
+        """Makes the binary diff digest based when the target reports the digest of its executable.
+        Only done when the version diff asks for a binary change: the release is needed then anyway
+        and the binary is not pushed again if it already is the expected one.
+        Also done in check mode, so that it reports the same binary change as a real run would
+        (the release is only downloaded and extracted on the controller).
+        """
+        path_executable = self.action_data.dirs.path_executable
+        if not (self.diff_actual_expected.need_binary_change(path_executable)
+                and self.get_info().executable_sha256):
+            return
+        self.action_data.downloaded_dist_path = self._download_spire_release(
+            download_decider=lambda: True)
+        _, self.action_data.expected_executable_sha256 = self._extract_spire_binary(tar_member_name_suffix)
+        self.diff_actual_expected = self.action_data.diff()
+        self._display.vvv(
+            f"binary diff by digest: path={path_executable}, "
+            f"need_binary_change={self.diff_actual_expected.need_binary_change(path_executable)}")
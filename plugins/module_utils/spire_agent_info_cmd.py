@@ -16,6 +16,7 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
+from datetime import datetime, timezone
 import os
 import re
 from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
@@ -23,9 +24,10 @@ from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.dirs import SpireCmptDirs
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_stat import FileStats
 
-from . import certificates, spire_cmd, systemd
+from . import certificates, spire_cmd
 from .ansible_module_cmd import RunCommand
-from .digests import digest_hcl_file, digest_ini_file
+from .digests import FileDigestCache
+from .probes import Probe, ProbeMemo, run_probes
 from .spire_typing import (
     BoolResultWithIssue,
     State,
@@ -34,7 +36,7 @@ from .spire_typing import (
     SubStateServiceInstallation,
     SubStateServiceStatus,
 )
-from .systemd import Scope, SpireComponentService, detect_spire_service_scope
+from .systemd import SERVICE_BACKEND_SYSTEMCTL, Scope, SpireComponentService, UnitState, detect_spire_service_unit_state
 
 
 class AgentDirs(SpireCmptDirs):
@@ -93,6 +95,7 @@ class SpireAgentInfo:
         socket_path: str = None,
         expected_version: Optional[str] = None,
         file_exists_func: Callable[[str],bool] = os.path.exists,
+        service_backend: str = SERVICE_BACKEND_SYSTEMCTL,
     ) -> None:
         super().__init__()
         if not (dirs.config_dir and dirs.data_dir and dirs.install_dir
@@ -118,33 +121,48 @@ class SpireAgentInfo:
         # if not service_name.endswith(".service"):
         #     self.service_fullname = f"{service_name}.service"
         self.expected_version = expected_version
-        self.service_scope, self.service_scope_issue = detect_spire_service_scope(
-            run_command=self.run_command,
-            service_fullname=dirs.service_full_name
-        )
-        self.service_scope_cmd_arg_list = [] if not self.service_scope else [self.service_scope.systemctl_cmd_arg]
-
         self.file_exists_func: Callable[[str],bool] = file_exists_func
-        self.executable_exists:bool = file_exists_func(dirs.path_executable)
-        self.config_file_exists:bool = file_exists_func(dirs.path_conf_file)
-        self.version: Tuple[Optional[str],Optional[str]] = self.get_agent_version()
         self.socket_path:str = socket_path
+        self.digest_cache = FileDigestCache(dirs.path_digest_cache)
         self.re_matching_is_healthy: Pattern[str] = re.compile(r".*Agent\sis\shealthy.*")
+        self.expected_service_scope = service_scope
+        self.service_backend = service_backend
+        self.probe_memo = ProbeMemo()
+        self.__compute_base_state()
+
+    def __compute_base_state(self) -> None:
+        self.executable_exists:bool = self.file_exists_func(self.dirs.path_executable)
+        self.config_file_exists:bool = self.file_exists_func(self.dirs.path_conf_file)
+        probed = run_probes([
+            Probe("service_scope",
+                  lambda: detect_spire_service_unit_state(
+                      run_command=self.run_command,
+                      service_fullname=self.dirs.service_full_name),
+                  timeout_result=lambda issue: (None, None, issue)),
+            Probe("version", self.get_agent_version),
+        ], log_func=self.log_func)
+        self.service_scope, detected_unit_state, self.service_scope_issue = probed["service_scope"]
+        self.service_scope_cmd_arg_list = [] if not self.service_scope else [self.service_scope.systemctl_cmd_arg]
+        self.version: Tuple[Optional[str],Optional[str]] = probed["version"]
 
         self.service = SpireComponentService(
-            log_func=log_func,
-            run_command=run_command,
-            scope=Scope.scopeOrDefault(self.service_scope, service_scope),
-            service_name=dirs.service_full_name
+            log_func=self.log_func,
+            run_command=self.run_command,
+            scope=Scope.scopeOrDefault(self.service_scope, self.expected_service_scope),
+            service_name=self.dirs.service_full_name,
+            service_backend=self.service_backend,
         )
+        if detected_unit_state is not None:
+            # the unit state of the detected scope is the one of the service, no need to query it again
+            self.probe_memo.get("unit_state", lambda: (detected_unit_state, None))
 
     def get_local_file_stats(self) -> FileStats:
         return FileStats.get_local_stats(self.dirs.expected_dirs_and_files())
 
     def reset_computed_base_state(self) -> None:
-        self.executable_exists = self.file_exists_func(self.dirs.path_executable)
-        self.config_file_exists = self.file_exists_func(self.dirs.path_conf_file)
-        self.version = self.get_agent_version()
+        """Starts a new probe epoch; to be called after the agent, its files or its service changed."""
+        self.probe_memo.invalidate()
+        self.__compute_base_state()
 
     def __str__(self) -> str:
         return str(self.__dict__)
@@ -159,48 +177,71 @@ class SpireAgentInfo:
     def get_executable_path_does_not_exists_msg(self) -> str:
         return f"spire_executable[{self.dirs.path_executable}] does not exits"
 
+    def get_executable_sha256(self) -> Tuple[Optional[str],Optional[str]]:
+        return self.probe_memo.get(
+            "executable_sha256", lambda: self.digest_cache.sha256(self.dirs.path_executable))
+
     def get_agent_version(self) -> Tuple[Optional[str],Optional[str]]:
-        return spire_cmd.get_pire_executable_version(
+        return self.probe_memo.get("version", lambda: spire_cmd.get_pire_executable_version(
             executable_path=self.get_executable_path(),
             executable_exists_func= lambda : self.executable_exists,
             executable_path_does_not_exists_msg_func=self.get_executable_path_does_not_exists_msg,
             run_command=self.run_command
-        )
+        ))
 
     def is_agent_healthy(self) -> Tuple[Optional[bool], Optional[str]]:
         if not self.executable_exists:
             return None, self.get_executable_path_does_not_exists_msg()
-        return spire_cmd.is_spire_component_healthy(
+        return self.probe_memo.get("healthy", lambda: spire_cmd.is_spire_component_healthy(
             healthcheck_cmd_output_regex=self.re_matching_is_healthy,
             ipc_socket_path_args=spire_cmd.ipc_socket_path_args_agent(self.socket_path),
             run_command=self.run_command,
-            spire_component_bin=self.dirs.path_executable
-        )
+            spire_component_bin=self.dirs.path_executable,
+            socket_path=self.socket_path,
+        ))
 
     def get_agent_spiffe_id_and_sertial_number(self) -> Tuple[Optional[str],Optional[int], Optional[str]]:
         """ return agent spiffe-i,serial-number,None or None,None,<error txt> """
         agent_svid_der_path = os.path.join(self.dirs.data_dir, "agent_svid.der")
-        return certificates.get_cert_san(agent_svid_der_path)
+        return self.probe_memo.get("agent_svid_san", lambda: certificates.get_cert_san_cached(agent_svid_der_path, self.digest_cache))
+
+    def verify_agent_svid(self) -> Tuple[Optional[datetime], Optional[str]]:
+        """Verifies the agent svid locally against bundle.der, see certificates.verify_svid."""
+        return self.probe_memo.get("agent_svid_verified", lambda: certificates.verify_svid(
+            svid_path=os.path.join(self.dirs.data_dir, "agent_svid.der"),
+            bundle_path=os.path.join(self.dirs.data_dir, "bundle.der"),
+            now=datetime.now(timezone.utc)))
 
     def get_trust_domain_id(self) -> Tuple[Optional[str],Optional[str]]:
         agent_svid_der_path = os.path.join(self.dirs.data_dir, "bundle.der")
-        trust_domain, serial_nr, issue = certificates.get_cert_san(agent_svid_der_path)
+        trust_domain, serial_nr, issue = self.probe_memo.get(
+            "bundle_san", lambda: certificates.get_cert_san_cached(agent_svid_der_path, self.digest_cache))
         return trust_domain, issue
 
     def is_service_running(self) -> Tuple[Optional[bool],  Optional[str]]:
-        res:BoolResultWithIssue = self.service.is_active()
+        unit_state, issue = self.get_unit_state()
+        if unit_state is None:
+            return False, issue
+        res:BoolResultWithIssue = unit_state.is_active()
         return res
 
     def is_service_enabled(self) -> Tuple[Optional[bool],  Optional[str]]:
-        res:BoolResultWithIssue = self.service.is_enabled()
+        unit_state, issue = self.get_unit_state()
+        if unit_state is None:
+            return False, issue
+        res:BoolResultWithIssue = unit_state.is_enabled()
         return res
 
+    def get_unit_state(self) -> Tuple[Optional[UnitState], Optional[str]]:
+        return self.probe_memo.get("unit_state", self.service.unit_state)
+
     def is_service_installed(self)  -> Tuple[Optional[bool],  Optional[str]]:
-        return systemd.is_service_installed(
-            run_command=self.run_command,
-            service_fullname=self.dirs.service_full_name,
-            service_scope=self.service_scope,
-        )
+        if self.service_scope is None:
+            return False, self.service_scope_issue
+        unit_state, issue = self.get_unit_state()
+        if unit_state is None:
+            return None, issue
+        return unit_state.is_installed(), None
 
 
     def is_agent_installed(self) -> Tuple[Optional[bool], Optional[str]]:
@@ -227,37 +268,79 @@ class SpireAgentInfo:
     def hexdigest_config_file(self) -> Tuple[Optional[str],Optional[str]]:
         if not self.config_file_exists:
             return None, f"config file does not exists: {self.config_file_exists}"
-        return digest_hcl_file(self.dirs.path_conf_file), None
+        return self.probe_memo.get(
+            "hexdigest_config_file", lambda: (self.digest_cache.hcl_digest(self.dirs.path_conf_file), None))
 
     def hexdigest_service_file(self) -> Tuple[Optional[str],Optional[str]]:
         if not self.file_exists_func(self.service.service_file):
             return None, f"service file does not exists: {self.service.service_file}"
-        return digest_ini_file(self.service.service_file), None
+        return self.probe_memo.get(
+            "hexdigest_service_file", lambda: (self.digest_cache.ini_digest(self.service.service_file), None))
+
+    def hexdigest_env_file(self) -> Tuple[Optional[str],Optional[str]]:
+        env_file = self.dirs.path_env_file
+        if not self.file_exists_func(env_file):
+            return None, f"env file does not exists: {env_file}"
+        return self.probe_memo.get(
+            "hexdigest_env_file", lambda: (self.digest_cache.env_digest(env_file), None))
+
+    def hexdigest_trust_bundle_file(self) -> Tuple[Optional[str],Optional[str]]:
+        bundle_file = self.dirs.path_trust_bundle_pem
+        if not self.file_exists_func(bundle_file):
+            return None, f"trust bundle file does not exists: {bundle_file}"
+        return self.probe_memo.get(
+            "hexdigest_trust_bundle_file", lambda: (self.digest_cache.pem_bundle_digest(bundle_file), None))
 
 
 class AgentStateSnapshot:
 
     def __init__(self, info: SpireAgentInfo):
+        # independent probes run concurrently, see probes.run_probes
+        probed = run_probes([
+            Probe("spiffe_id_and_sn", info.get_agent_spiffe_id_and_sertial_number,
+                  timeout_result=lambda issue: (None, None, issue)),
+            Probe("version", info.get_agent_version),
+            Probe("executable_sha256", info.get_executable_sha256),
+            Probe("trust_domain_id", info.get_trust_domain_id),
+            Probe("svid_verified", info.verify_agent_svid),
+            Probe("healthy", info.is_agent_healthy),
+            Probe("service_running", info.is_service_running),
+            Probe("service_enabled", info.is_service_enabled),
+            Probe("hexdigest_config_file", info.hexdigest_config_file),
+            Probe("hexdigest_service_file", info.hexdigest_service_file),
+            Probe("hexdigest_env_file", info.hexdigest_env_file),
+            Probe("hexdigest_trust_bundle_file", info.hexdigest_trust_bundle_file),
+        ], log_func=info.log_func)
+
         _is_agent_installed = info.is_agent_installed()
         self.spire_agent_installed = _is_agent_installed[0]
         self.spire_agent_installed_issue = _is_agent_installed[1]
 
-        _spiffe_id_and_sn = info.get_agent_spiffe_id_and_sertial_number()
+        _spiffe_id_and_sn = probed["spiffe_id_and_sn"]
         self.spire_agent_spiffe_id = _spiffe_id_and_sn[0]
         self.spire_agent_serial_number = _spiffe_id_and_sn[1]
         self.spire_agent_spiffe_id_issue = _spiffe_id_and_sn[2]
 
-        _agent_version = info.get_agent_version()
+        _agent_version = probed["version"]
         self.spire_agent_version = _agent_version[0]
         self.spire_agent_version_issue = _agent_version[1]
 
         self.spire_agent_executable_path = info.get_executable_path()
 
-        _trust_domain_id = info.get_trust_domain_id()
+        self.spire_agent_executable_sha256, \
+            self.spire_agent_executable_sha256_issue = probed["executable_sha256"]
+
+        _trust_domain_id = probed["trust_domain_id"]
         self.spire_agent_trust_domain_id = _trust_domain_id[0]
         self.spire_agent_trust_domain_id_issue = _trust_domain_id[1]
 
-        _is_service_healthy = info.is_agent_healthy()
+        svid_not_after, self.spire_agent_svid_verified_issue = probed["svid_verified"]
+        self.spire_agent_svid_verified = svid_not_after is not None and self.spire_agent_svid_verified_issue is None
+        self.spire_agent_svid_not_after = None if svid_not_after is None else svid_not_after.isoformat()
+        self.spire_agent_svid_validity_remaining_seconds = None if svid_not_after is None else \
+            (svid_not_after - datetime.now(timezone.utc)).total_seconds()
+
+        _is_service_healthy = probed["healthy"]
         self.spire_agent_is_healthy = _is_service_healthy[0]
         self.spire_agent_is_healthy_issue = _is_service_healthy[1]
 
@@ -265,19 +348,25 @@ class AgentStateSnapshot:
         self.spire_agent_service_installed = _is_service_installed[0]
         self.spire_agent_service_installed_issue = _is_service_installed[1]
 
-        _is_service_running =  info.is_service_running()
+        _is_service_running = probed["service_running"]
         self.spire_agent_service_running:bool = _is_service_running[0]
         self.spire_agent_service_running_issue:str = _is_service_running[1]
 
-        _is_service__enabled =  info.is_service_enabled()
+        _is_service__enabled = probed["service_enabled"]
         self.spire_agent_service_enabled: bool = _is_service__enabled[0]
         self.spire_agent_service_enabled_issue = _is_service__enabled[1]
 
         self.hexdigest_config_file, \
-            self.hexdigest_config_file_issue = info.hexdigest_config_file()
+            self.hexdigest_config_file_issue = probed["hexdigest_config_file"]
 
         self.hexdigest_service_file, \
-            self.hexdigest_service_file_issue = info.hexdigest_service_file()
+            self.hexdigest_service_file_issue = probed["hexdigest_service_file"]
+
+        self.hexdigest_env_file, \
+            self.hexdigest_env_file_issue = probed["hexdigest_env_file"]
+
+        self.hexdigest_trust_bundle_file, \
+            self.hexdigest_trust_bundle_file_issue = probed["hexdigest_trust_bundle_file"]
 
         self.service_scope = info.service_scope
         self.service_scope_issue = info.service_scope_issue
@@ -340,8 +429,14 @@ class AgentStateSnapshot:
             "spire_agent_version": self.spire_agent_version,
             "spire_agent_version_issue": self.spire_agent_version_issue,
             "spire_agent_executable_path": self.spire_agent_executable_path,
+            "spire_agent_executable_sha256": self.spire_agent_executable_sha256,
+            "spire_agent_executable_sha256_issue": self.spire_agent_executable_sha256_issue,
             "spire_agent_trust_domain_id": self.spire_agent_trust_domain_id,
             "spire_agent_trust_domain_id_issue": self.spire_agent_trust_domain_id_issue,
+            "spire_agent_svid_verified": self.spire_agent_svid_verified,
+            "spire_agent_svid_verified_issue": self.spire_agent_svid_verified_issue,
+            "spire_agent_svid_not_after": self.spire_agent_svid_not_after,
+            "spire_agent_svid_validity_remaining_seconds": self.spire_agent_svid_validity_remaining_seconds,
             "spire_agent_is_healthy": self.spire_agent_is_healthy,
             "spire_agent_is_healthy_issue": self.spire_agent_is_healthy_issue,
             "spire_agent_service_scope": self.__get_scope_str(),
@@ -356,5 +451,9 @@ class AgentStateSnapshot:
             "spire_agent_hexdigest_service_file_issue": self.hexdigest_service_file_issue,
             "spire_agent_hexdigest_config_file": self.hexdigest_config_file,
             "spire_agent_hexdigest_config_file_issue": self.hexdigest_config_file_issue,
+            "spire_agent_hexdigest_env_file": self.hexdigest_env_file,
+            "spire_agent_hexdigest_env_file_issue": self.hexdigest_env_file_issue,
+            "spire_agent_hexdigest_trust_bundle_file": self.hexdigest_trust_bundle_file,
+            "spire_agent_hexdigest_trust_bundle_file_issue": self.hexdigest_trust_bundle_file_issue,
             "spire_agent_file_stats": self.file_stats.to_ansible_result_value()
         }
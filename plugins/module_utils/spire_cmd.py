@@ -16,10 +16,10 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-import time
 from typing import Any, Callable, List, Optional, Pattern, Tuple
 
-from . import logging
+from . import grpc_health, logging
+from .polling import poll_until
 from .spire_typing import BoolResultWithIssue, CmdExecCallable, CmdExecOutcome
 
 
@@ -62,7 +62,9 @@ def is_spire_component_healthy(
     run_command: CmdExecCallable,
     spire_component_bin: str,
     ipc_socket_path_args: List[str],
-    healthcheck_cmd_output_regex: Pattern[str]
+    healthcheck_cmd_output_regex: Pattern[str],
+    socket_path: str = None,
+    connect_retry_budget_seconds: float = 0.0,
 ) -> BoolResultWithIssue:
     """check health of a spire component(spire-server/agent).
     Params:
@@ -70,7 +72,17 @@ def is_spire_component_healthy(
         spire_component_bin: path to the component binary,
         ipc_socket_path_args: list containing the arg to specify the socket for ipc with the spire component
         healthcheck_cmd_output_regex: regex Pattern to check the output for healthyness state
+        socket_path: if set, the gRPC health check is performed in-process over this socket
+            and the health check command only runs if the in-process check was not conclusive
+        connect_retry_budget_seconds: how long connecting to socket_path may be retried
     """
+    if socket_path:
+        res_native = grpc_health.check_health(
+            socket_path=socket_path, connect_retry_budget=connect_retry_budget_seconds)
+        if res_native.conclusive:
+            if res_native.is_serving():
+                return BoolResultWithIssue(True, None)
+            return BoolResultWithIssue(False, f"gRPC health check over {socket_path}: {res_native.issue}")
     cmd_healthy_args = [
         spire_component_bin, "healthcheck",
         *ipc_socket_path_args
@@ -97,19 +109,11 @@ def wait_for_termination(
     is_terminated_func: Callable[[], bool],
     termination_probe_timeout_seconds: float = None
 ) -> BoolResultWithIssue:
-    start = time.time()
+    outcome = poll_until(
+        attempt_func=is_terminated_func,
+        timeout=termination_probe_timeout_seconds)
 
-    def has_not_timeout() -> bool:
-        return time.time() - start < termination_probe_timeout_seconds
-
-    res_has_not_timeout = True
-    while (
-            not is_terminated_func()
-            and res_has_not_timeout):
-        time.sleep(1)
-        res_has_not_timeout = has_not_timeout()
-
-    if not is_terminated_func():
-        msg = f"termination probe failed:timeout={not res_has_not_timeout}"
+    if not outcome.succeeded:
+        msg = f"termination probe failed:timeout={outcome.timed_out}, polling:{outcome.summary()}"
         return BoolResultWithIssue(False, msg)
     return BoolResultWithIssue(True, None)
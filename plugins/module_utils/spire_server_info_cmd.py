@@ -22,7 +22,7 @@ from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
 
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.ansible_module_cmd import RunCommand
 
-from . import certificates, spire_cmd, systemd
+from . import certificates, spire_cmd
 from .spire_typing import (
     BoolResultWithIssue, State,
     StateOfServer,
@@ -31,12 +31,13 @@ from .spire_typing import (
 )
 
 from .digests import(
-    digest_hcl_file,
-    digest_ini_file
+    FileDigestCache,
 )
 
+from .probes import Probe, ProbeMemo, run_probes
+
 from .systemd import (
-    Scope, SpireComponentService, detect_spire_service_scope
+    Scope, SpireComponentService, SERVICE_BACKEND_SYSTEMCTL, UnitState, detect_spire_service_unit_state
 )
 
 from .file_stat import(
@@ -94,6 +95,7 @@ class SpireServerInfo:
         registration_uds_path: str = None,
         expected_version: Optional[str] = None,
         file_exists_func: Callable[[str],bool] = os.path.exists,
+        service_backend: str = SERVICE_BACKEND_SYSTEMCTL,
     ) -> None:
         super().__init__()
         if not (server_dirs.config_dir and server_dirs.data_dir and server_dirs.install_dir
@@ -114,35 +116,48 @@ class SpireServerInfo:
         if not service_name.endswith(".service"):
             self.service_fullname = f"{service_name}.service"
         self.expected_version = expected_version
-        self.service_scope, self.service_scope_issue = detect_spire_service_scope(
-            run_command=self.run_command,
-            service_fullname=self.service_fullname
-        )
-        self.service_scope_cmd_arg_list = [] if not self.service_scope else [self.service_scope.systemctl_cmd_arg]
-
-
-
         self.file_exists_func: Callable[[str],bool] = file_exists_func
-        self.executable_exists:bool = file_exists_func(self.server_dirs.path_executable)
-        self.config_file_exists:bool = file_exists_func(self.server_dirs.path_conf_file)
-        self.version: Tuple[Optional[str],Optional[str]] = self.get_version()
         self.registration_uds_path:str = registration_uds_path
+        self.digest_cache = FileDigestCache(self.server_dirs.path_digest_cache)
         self.re_matching_is_healthy: Pattern[str] = re.compile(r".*Server\sis\shealthy.*")
+        self.expected_service_scope = service_scope
+        self.service_backend = service_backend
+        self.probe_memo = ProbeMemo()
+        self.__compute_base_state()
+
+    def __compute_base_state(self) -> None:
+        self.executable_exists:bool = self.file_exists_func(self.server_dirs.path_executable)
+        self.config_file_exists:bool = self.file_exists_func(self.server_dirs.path_conf_file)
+        probed = run_probes([
+            Probe("service_scope",
+                  lambda: detect_spire_service_unit_state(
+                      run_command=self.run_command,
+                      service_fullname=self.service_fullname),
+                  timeout_result=lambda issue: (None, None, issue)),
+            Probe("version", self.get_version),
+        ], log_func=self.log_func)
+        self.service_scope, detected_unit_state, self.service_scope_issue = probed["service_scope"]
+        self.service_scope_cmd_arg_list = [] if not self.service_scope else [self.service_scope.systemctl_cmd_arg]
+        self.version: Tuple[Optional[str],Optional[str]] = probed["version"]
 
         self.service = SpireComponentService(
-            log_func=log_func,
-            run_command=run_command,
-            scope=Scope.scopeOrDefault(self.service_scope, service_scope),
-            service_name=self.service_fullname
+            log_func=self.log_func,
+            run_command=self.run_command,
+            scope=Scope.scopeOrDefault(self.service_scope, self.expected_service_scope),
+            service_name=self.service_fullname,
+            service_backend=self.service_backend,
         )
+        if detected_unit_state is not None:
+            # the unit state of the detected scope is the one of the service, no need to query it again
+            self.probe_memo.get("unit_state", lambda: (detected_unit_state, None))
 
     def get_local_server_file_stats(self) -> FileStats:
         return FileStats.get_local_stats(self.server_dirs.expected_dirs_and_files())
 
     def reset_computed_base_state(self) -> None:
-        self.executable_exists = self.file_exists_func(self.server_dirs.path_executable)
-        self.config_file_exists = self.file_exists_func(self.server_dirs.path_conf_file)
-        self.version = self.get_version()
+        """Starts a new probe epoch; to be called after the server, its files or its service changed."""
+        self.probe_memo.invalidate()
+        self.__compute_base_state()
 
     def __str__(self) -> str:
         return str(self.__dict__)
@@ -156,43 +171,59 @@ class SpireServerInfo:
     def get_executable_path_does_not_exists_msg(self) -> str:
         return f"spire_executable[{self.server_dirs.path_executable}] does not exits"
 
+    def get_executable_sha256(self) -> Tuple[Optional[str],Optional[str]]:
+        return self.probe_memo.get(
+            "executable_sha256", lambda: self.digest_cache.sha256(self.server_dirs.path_executable))
+
     def get_version(self) -> Tuple[Optional[str],Optional[str]]:
-        return spire_cmd.get_pire_executable_version(
+        return self.probe_memo.get("version", lambda: spire_cmd.get_pire_executable_version(
             executable_path=self.get_executable_path(),
             executable_exists_func= lambda : self.executable_exists,
             executable_path_does_not_exists_msg_func=self.get_executable_path_does_not_exists_msg,
             run_command=self.run_command
-        )
+        ))
 
     def is_healthy(self) -> Tuple[Optional[bool], Optional[str]]:
         if not self.executable_exists:
             return None, self.get_executable_path_does_not_exists_msg()
-        return spire_cmd.is_spire_component_healthy(
+        return self.probe_memo.get("healthy", lambda: spire_cmd.is_spire_component_healthy(
             healthcheck_cmd_output_regex=self.re_matching_is_healthy,
             ipc_socket_path_args=spire_cmd.ipc_socket_path_args_server(self.registration_uds_path),
             run_command=self.run_command,
-            spire_component_bin=self.server_dirs.path_executable
-        )
+            spire_component_bin=self.server_dirs.path_executable,
+            socket_path=self.registration_uds_path,
+        ))
 
     def get_trust_domain_id(self) -> Tuple[Optional[str],Optional[str]]:
         agent_svid_der_path = os.path.join(self.server_dirs.data_dir, "bundle.der")
-        trust_domain, serial_nr, issue = certificates.get_cert_san(agent_svid_der_path)
+        trust_domain, serial_nr, issue = self.probe_memo.get(
+            "bundle_san", lambda: certificates.get_cert_san_cached(agent_svid_der_path, self.digest_cache))
         return trust_domain, issue
 
     def is_service_running(self) -> Tuple[Optional[bool],  Optional[str]]:
-        res:BoolResultWithIssue = self.service.is_active()
+        unit_state, issue = self.get_unit_state()
+        if unit_state is None:
+            return False, issue
+        res:BoolResultWithIssue = unit_state.is_active()
         return res
 
     def is_service_enabled(self) -> Tuple[Optional[bool],  Optional[str]]:
-        res:BoolResultWithIssue = self.service.is_enabled()
+        unit_state, issue = self.get_unit_state()
+        if unit_state is None:
+            return False, issue
+        res:BoolResultWithIssue = unit_state.is_enabled()
         return res
 
+    def get_unit_state(self) -> Tuple[Optional[UnitState], Optional[str]]:
+        return self.probe_memo.get("unit_state", self.service.unit_state)
+
     def is_service_installed(self)  -> Tuple[Optional[bool],  Optional[str]]:
-        return systemd.is_service_installed(
-            run_command=self.run_command,
-            service_fullname=self.service_fullname,
-            service_scope=self.service_scope,
-        )
+        if self.service_scope is None:
+            return False, self.service_scope_issue
+        unit_state, issue = self.get_unit_state()
+        if unit_state is None:
+            return None, issue
+        return unit_state.is_installed(), None
 
     def is_installed(self) -> Tuple[Optional[bool], Optional[str]]:
         actual_version = None if not self.version else self.version[0]
@@ -214,32 +245,57 @@ class SpireServerInfo:
     def hexdigest_config_file(self) -> Tuple[Optional[str],Optional[str]]:
         if not self.config_file_exists:
             return None, f"config file does not exists: {self.config_file_exists}"
-        return digest_hcl_file(self.server_dirs.path_conf_file), None
+        return self.probe_memo.get(
+            "hexdigest_config_file", lambda: (self.digest_cache.hcl_digest(self.server_dirs.path_conf_file), None))
 
     def hexdigest_service_file(self) -> Tuple[Optional[str],Optional[str]]:
         if not self.file_exists_func(self.service.service_file):
             return None, f"service file does not exists: {self.service.service_file}"
-        return digest_ini_file(self.service.service_file), None
+        return self.probe_memo.get(
+            "hexdigest_service_file", lambda: (self.digest_cache.ini_digest(self.service.service_file), None))
+
+    def hexdigest_env_file(self) -> Tuple[Optional[str],Optional[str]]:
+        env_file = self.server_dirs.path_env_file
+        if not self.file_exists_func(env_file):
+            return None, f"env file does not exists: {env_file}"
+        return self.probe_memo.get(
+            "hexdigest_env_file", lambda: (self.digest_cache.env_digest(env_file), None))
 
 
 class ServerStateSnapshot:
 
     def __init__(self, server_info: SpireServerInfo):
+        # independent probes run concurrently, see probes.run_probes
+        probed = run_probes([
+            Probe("version", server_info.get_version),
+            Probe("executable_sha256", server_info.get_executable_sha256),
+            Probe("trust_domain_id", server_info.get_trust_domain_id),
+            Probe("healthy", server_info.is_healthy),
+            Probe("service_running", server_info.is_service_running),
+            Probe("service_enabled", server_info.is_service_enabled),
+            Probe("hexdigest_config_file", server_info.hexdigest_config_file),
+            Probe("hexdigest_service_file", server_info.hexdigest_service_file),
+            Probe("hexdigest_env_file", server_info.hexdigest_env_file),
+        ], log_func=server_info.log_func)
+
         _is_installed = server_info.is_installed()
         self.installed = _is_installed[0]
         self.installed_issue = _is_installed[1]
 
-        _agent_version = server_info.get_version()
+        _agent_version = probed["version"]
         self.version = _agent_version[0]
         self.version_issue = _agent_version[1]
 
         self.executable_path = server_info.get_executable_path()
 
-        _trust_domain_id = server_info.get_trust_domain_id()
+        self.executable_sha256, \
+            self.executable_sha256_issue = probed["executable_sha256"]
+
+        _trust_domain_id = probed["trust_domain_id"]
         self.trust_domain_id = _trust_domain_id[0]
         self.trust_domain_id_issue = _trust_domain_id[1]
 
-        _is_service_healthy = server_info.is_healthy()
+        _is_service_healthy = probed["healthy"]
         self.is_healthy = _is_service_healthy[0]
         self.is_healthy_issue = _is_service_healthy[1]
 
@@ -247,19 +303,22 @@ class ServerStateSnapshot:
         self.service_installed = _is_service_installed[0]
         self.service_installed_issue = _is_service_installed[1]
 
-        _is_service_running =  server_info.is_service_running()
+        _is_service_running = probed["service_running"]
         self.service_running:bool = _is_service_running[0]
         self.service_running_issue:str = _is_service_running[1]
 
-        _is_service__enabled =  server_info.is_service_enabled()
+        _is_service__enabled = probed["service_enabled"]
         self.service_enabled: bool = _is_service__enabled[0]
         self.service_enabled_issue = _is_service__enabled[1]
 
         self.hexdigest_config_file, \
-            self.hexdigest_config_file_issue = server_info.hexdigest_config_file()
+            self.hexdigest_config_file_issue = probed["hexdigest_config_file"]
 
         self.hexdigest_service_file, \
-            self.hexdigest_service_file_issue = server_info.hexdigest_service_file()
+            self.hexdigest_service_file_issue = probed["hexdigest_service_file"]
+
+        self.hexdigest_env_file, \
+            self.hexdigest_env_file_issue = probed["hexdigest_env_file"]
         self.service_scope = server_info.service_scope
         self.service_scope_issue = server_info.service_scope_issue
 
@@ -315,6 +374,8 @@ class ServerStateSnapshot:
             "spire_server_version": self.version,
             "spire_server_version_issue": self.version_issue,
             "spire_server_executable_path": self.executable_path,
+            "spire_server_executable_sha256": self.executable_sha256,
+            "spire_server_executable_sha256_issue": self.executable_sha256_issue,
             "spire_server_trust_domain_id": self.trust_domain_id,
             "spire_server_trust_domain_id_issue": self.trust_domain_id_issue,
             "spire_server_is_healthy": self.is_healthy,
@@ -331,5 +392,7 @@ class ServerStateSnapshot:
             "spire_server_hexdigest_service_file_issue": self.hexdigest_service_file_issue,
             "spire_server_hexdigest_config_file": self.hexdigest_config_file,
             "spire_server_hexdigest_config_file_issue": self.hexdigest_config_file_issue,
+            "spire_server_hexdigest_env_file": self.hexdigest_env_file,
+            "spire_server_hexdigest_env_file_issue": self.hexdigest_env_file_issue,
             "spire_server_file_stats": self.file_stats.to_ansible_result_value()
         }
@@ -0,0 +1,117 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+"""Watches a starting spire component for failures, so that readiness waits can stop early."""
+
+import collections
+import os
+import re
+from typing import Callable, Deque, List, Optional, Pattern, Tuple
+
+from .systemd import UnitState
+
+
+# spire logs with logrus, e.g. time="..." level=error msg="Agent crashed" error="..."
+DEFAULT_FATAL_LOG_LINE_REGEX: Pattern[str] = re.compile(r"level=(fatal|panic)\b|\bcrashed\b", re.IGNORECASE)
+DEFAULT_EXCERPT_LINES = 20
+
+
+def configured_log_file(conf_file_path: str) -> Optional[str]:
+    """Returns the log_file of the spire component configuration, None if not set.
+    The configuration is not parsed as HCL, as a broken configuration is a likely startup failure reason.
+    """
+    try:
+        with open(conf_file_path, "r") as conf_file:
+            content = conf_file.read()
+    except OSError:
+        return None
+    match = re.search(r'^\s*log_file\s*=\s*"([^"]*)"', content, re.MULTILINE)
+    return match.group(1) if match and match.group(1) else None
+
+
+class LogTail:
+    """Reads the lines appended to a log file since the tail was created."""
+
+    def __init__(self, path: str, excerpt_lines: int = DEFAULT_EXCERPT_LINES) -> None:
+        self.path = path
+        self.offset = os.path.getsize(path) if os.path.isfile(path) else 0
+        self.partial_line = ""
+        self.excerpt: Deque[str] = collections.deque(maxlen=excerpt_lines)
+
+    def read_new_lines(self) -> List[str]:
+        if not os.path.isfile(self.path):
+            return []
+        if os.path.getsize(self.path) < self.offset:
+            # truncated or rotated
+            self.offset = 0
+        with open(self.path, "r", errors="replace") as log_file:
+            log_file.seek(self.offset)
+            content = log_file.read()
+            self.offset = log_file.tell()
+        lines = (self.partial_line + content).split("\n")
+        self.partial_line = lines.pop()
+        self.excerpt.extend(lines)
+        return lines
+
+
+class StartupFailureWatch:
+    """To be created before the component is started.
+
+    failure_reason() reports a failure if, since then, the unit failed (or is waiting for an automatic restart),
+    its main process was replaced, or a fatal line was logged; the reason ends with the last log lines.
+    """
+
+    def __init__(
+        self,
+        unit_state_func: Callable[[], Tuple[Optional[UnitState], Optional[str]]],
+        log_file: Optional[str],
+        fatal_log_line_regex: Pattern[str] = DEFAULT_FATAL_LOG_LINE_REGEX,
+        excerpt_lines: int = DEFAULT_EXCERPT_LINES,
+    ) -> None:
+        self.unit_state_func = unit_state_func
+        self.log_file = log_file
+        self.log_tail: Optional[LogTail] = LogTail(log_file, excerpt_lines) if log_file else None
+        self.fatal_log_line_regex = fatal_log_line_regex
+        self.main_pid: Optional[int] = None
+
+    def __unit_failure(self) -> Optional[str]:
+        unit_state, _ = self.unit_state_func()
+        if unit_state is None:
+            return None
+        if unit_state.has_failed():
+            return f"unit failed: active_state={unit_state.active_state}, result={unit_state.result}"
+        if unit_state.main_pid:
+            if self.main_pid is None:
+                self.main_pid = unit_state.main_pid
+            elif self.main_pid != unit_state.main_pid:
+                return f"main process {self.main_pid} exited, main process is now {unit_state.main_pid}"
+        return None
+
+    def failure_reason(self) -> Optional[str]:
+        new_lines = [] if self.log_tail is None else self.log_tail.read_new_lines()
+        reason = self.__unit_failure()
+        if reason is None:
+            fatal_lines = [line for line in new_lines if self.fatal_log_line_regex.search(line)]
+            if not fatal_lines:
+                return None
+            reason = f"fatal log line: {fatal_lines[0]}"
+        if self.log_tail is None:
+            return reason
+        excerpt = "\n".join(self.log_tail.excerpt)
+        return f"{reason}\nlast lines of {self.log_file}:\n{excerpt}"
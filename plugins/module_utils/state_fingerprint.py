@@ -0,0 +1,126 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+"""Target-side state fingerprint, used by the actions to skip runs where nothing changed.
+
+After a successful run, the action records on the target the digest of its expected inputs
+together with the fingerprint of the target state (managed files and unit state).
+A later run with the same inputs digest whose state fingerprint still matches has nothing to do.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from .digests import FileDigestCache
+from .systemd import UnitState
+
+
+FINGERPRINT_FILE_NAME = ".spire-ansible-state-fingerprint.json"
+
+
+def canonical_digest(obj: Any) -> str:
+    as_json = json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(as_json.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(path: str, digest_cache: FileDigestCache) -> Dict[str, Any]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return {"path": path, "exists": False}
+    sha256, _ = digest_cache.sha256(path)
+    return {
+        "path": path,
+        "exists": True,
+        "mode": st.st_mode,
+        "uid": st.st_uid,
+        "gid": st.st_gid,
+        "sha256": sha256,
+    }
+
+
+def compute_state_fingerprint(
+    files: List[str],
+    unit_state: Optional[UnitState],
+    digest_cache: FileDigestCache,
+) -> str:
+    """Digest of the stat data and content of the files and of the unit state.
+    File contents are digested through the cache, so that unchanged files (e.g. the binary) are not read again.
+    """
+    unit = None
+    if unit_state is not None:
+        unit = {
+            "load_state": unit_state.load_state,
+            "active_state": unit_state.active_state,
+            "unit_file_state": unit_state.unit_file_state,
+            "fragment_path": unit_state.fragment_path,
+        }
+    return canonical_digest({
+        "files": [file_fingerprint(path, digest_cache) for path in sorted(files)],
+        "unit": unit,
+    })
+
+
+class FingerprintRecord(NamedTuple):
+    inputs_digest: str
+    state_fingerprint: str
+    result: Dict[str, Any]
+
+    def to_ansible_result_value(self) -> Dict[str, Any]:
+        return {
+            "inputs_digest": self.inputs_digest,
+            "state_fingerprint": self.state_fingerprint,
+            "result": self.result,
+        }
+
+    @staticmethod
+    def from_ansible_result_value(value: Optional[Dict[str, Any]]) -> Optional["FingerprintRecord"]:
+        if not value:
+            return None
+        return FingerprintRecord(
+            inputs_digest=value.get("inputs_digest"),
+            state_fingerprint=value.get("state_fingerprint"),
+            result=value.get("result") or {},
+        )
+
+    def matches(self, inputs_digest: str, state_fingerprint: str) -> bool:
+        return self.inputs_digest == inputs_digest and self.state_fingerprint == state_fingerprint
+
+
+def read_record(record_path: str) -> Optional[FingerprintRecord]:
+    try:
+        with open(record_path, "r") as fp:
+            return FingerprintRecord.from_ansible_result_value(json.load(fp))
+    except (OSError, ValueError):
+        return None
+
+
+def write_record(record_path: str, record: FingerprintRecord) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(record_path), prefix=".spire-fingerprint.")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            json.dump(record.to_ansible_result_value(), fp, sort_keys=True)
+        os.replace(tmp_path, record_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
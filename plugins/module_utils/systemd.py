@@ -18,7 +18,7 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
 import enum
 import os
-from typing import Callable, Dict, List, Optional, Any, Tuple
+from typing import Callable, Dict, List, NamedTuple, Optional, Any, Tuple
 
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing import (
     BoolResultWithIssue,
@@ -26,6 +26,8 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing
     CmdExecOutcome,
 )
 
+from .systemd_dbus import SystemdDbusBackend, get_dbus_backend, user_bus_address, JOB_RESULT_DONE
+
 
 
 
@@ -85,6 +87,120 @@ class Scope(enum.Enum):
             return None
         return scope.scope()
 
+class UnitState(NamedTuple):
+    """Snapshot of the systemd state of a unit, as reported by
+    <systemctl show --property=LoadState,ActiveState,UnitFileState,FragmentPath,Result,MainPID>.
+    unit_file_listed is set when the unit files were looked up directly
+    (<systemctl list-unit-files> or GetUnitFileState), None if installation is derived from the properties.
+    """
+    load_state: str
+    active_state: str
+    unit_file_state: str
+    fragment_path: str
+    result: str = ""
+    main_pid: int = 0
+    unit_file_listed: Optional[bool] = None
+
+    @staticmethod
+    def parse_systemctl_show(stdout: str) -> "UnitState":
+        values: Dict[str, str] = {}
+        for line in stdout.splitlines():
+            key, sep, value = line.partition("=")
+            if sep:
+                values[key.strip()] = value.strip()
+        return UnitState(
+            load_state=values.get("LoadState", ""),
+            active_state=values.get("ActiveState", ""),
+            unit_file_state=values.get("UnitFileState", ""),
+            fragment_path=values.get("FragmentPath", ""),
+            result=values.get("Result", ""),
+            main_pid=UnitState.__to_pid(values.get("MainPID")),
+        )
+
+    @staticmethod
+    def __to_pid(value: Any) -> int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def from_dbus_properties(properties: Dict[str, Any], unit_file_listed: Optional[bool] = None) -> "UnitState":
+        return UnitState(
+            load_state=str(properties.get("LoadState", "")),
+            active_state=str(properties.get("ActiveState", "")),
+            unit_file_state=str(properties.get("UnitFileState", "")),
+            fragment_path=str(properties.get("FragmentPath", "")),
+            result=str(properties.get("Result", "")),
+            main_pid=UnitState.__to_pid(properties.get("MainPID")),
+            unit_file_listed=unit_file_listed,
+        )
+
+    def is_installed(self) -> bool:
+        if self.unit_file_listed is not None:
+            return self.unit_file_listed
+        # Not derived from LoadState alone: the service may be not-found (e.g. the service file has just been
+        # copied and the daemon not reloaded yet) while UnitFileState, looked up on disk, already knows
+        # its unit file; a masked unit is loaded from /dev/null and still counts as installed.
+        return bool(self.unit_file_state or self.fragment_path) \
+            or self.load_state not in ["", "not-found"]
+
+    def is_active(self) -> BoolResultWithIssue:
+        if "active" != self.active_state:
+            return BoolResultWithIssue(False, f"service found not to be active:{self}")
+        return BoolResultWithIssue(True, None)
+
+    def is_enabled(self) -> BoolResultWithIssue:
+        if "enabled" != self.unit_file_state:
+            return BoolResultWithIssue(False, f"service found not to be enabled:{self}")
+        return BoolResultWithIssue(True, None)
+
+    def has_failed(self) -> bool:
+        """True if the unit is failed or its last run did not succeed, e.g. while waiting for an automatic restart."""
+        return "failed" == self.active_state or self.result not in ["", "success"]
+
+
+UNIT_STATE_PROPERTIES = ["LoadState", "ActiveState", "UnitFileState", "FragmentPath", "Result", "MainPID"]
+
+
+def query_unit_state(
+    run_command: Callable[[Any], Tuple[int, str, str]],
+    service_fullname: str,
+    service_scope: Scope
+) -> Tuple[Optional[UnitState], Optional[str]]:
+    """Returns the state of the unit, installation included, with a single <systemctl show> call.
+    Returns:
+        (unit_state, None) or (None, issue) if systemctl failed
+    Note:
+        <systemctl --global> does not support show; for the global scope only the
+        unit file state is known, from <systemctl --global list-unit-files>.
+    """
+    service_scope_cmd_arg_list = [] if not service_scope else [service_scope.systemctl_cmd_arg()]
+    if Scope.scope_global == service_scope:
+        args = ["systemctl", *service_scope_cmd_arg_list, "list-unit-files", service_fullname]
+        rc, stdout, stderr = run_command(args)
+        # UNIT FILE                     STATE
+        # spire_agent_unit_test.service disabled
+        # rc is not 0 if no unit file matches
+        for line in stdout.splitlines() if rc == 0 else []:
+            parts = line.split()
+            if len(parts) >= 2 and service_fullname == parts[0]:
+                return UnitState(
+                    load_state="", active_state="", unit_file_state=parts[1], fragment_path="",
+                    unit_file_listed=True), None
+        return UnitState(
+            load_state="", active_state="", unit_file_state="", fragment_path="", unit_file_listed=False), None
+
+    args = [
+        "systemctl", *service_scope_cmd_arg_list, "show", service_fullname, "--no-pager",
+        f"--property={','.join(UNIT_STATE_PROPERTIES)}",
+    ]
+    rc, stdout, stderr = run_command(args)
+    if rc != 0:
+        return None, f"failed to query unit state: rc={rc} cmd={args}, stdout={stdout} stderr={stderr}"
+    return UnitState.parse_systemctl_show(stdout), None
+
+
 #TODO us Scope type; make it mandatory
 def is_service_installed(
     run_command: Callable[[Any], Tuple[int, str, str]],
@@ -100,13 +216,11 @@ def is_service_installed(
         a tuple (is_installed, msg) indicating the outcome of the check.
         is_installed:
             true if the service is installed
-            false if the service is not installed,
-            None if the systemcl command failed
+            false if the service is not installed (systemctl fails if no unit file matches)
         msg:
             a message containing std-out and std-err if is_installed is not true
 
     """
-
     # Because the service may be loaded but inactive (e.g. the service file has just been copied)
     # <systemctl show pattern> will not always answer the installation question correctly
     # we are using <systemctl list_unit-files> instead:
@@ -123,26 +237,59 @@ def is_service_installed(
         "list-unit-files", pattern,
     ]
     rc, stdout, stderr = run_command(args)
-    if rc != 0:
-        return None, f"failed to systemctl-list-unit-files: rc={rc} cmd={args}, stdout={stdout} stderr={stderr}"
-    is_installed: bool = service_fullname in stdout
+    is_installed: bool = rc == 0 and service_fullname in stdout
     msg = None if is_installed else f"systemctl-show-names: rc={rc} cmd={args}, stdout={stdout} stderr={stderr}"
     return is_installed, msg
 
-def detect_spire_service_scope(
+def detect_spire_service_unit_state(
     run_command: Callable[[Any],Tuple[int,str, str]],
     service_fullname: str,
-) -> Tuple[Optional[Scope], Optional[str]] :
+) -> Tuple[Optional[Scope], Optional[UnitState], Optional[str]]:
+    """Returns the first scope (in Scope order) the service is installed in, with its unit state.
+    Scopes are queried one systemctl call each, in order, until the first installed one.
+    """
     issues = []
     for scope in Scope:
-        installed: Tuple[Optional[bool], Optional[str]] = is_service_installed(
-                                                run_command=run_command,
-                                                service_fullname=service_fullname,
-                                                service_scope=scope)
-        if installed is not None and installed[0]:
-            return scope, None
-        issues.append(installed[1] or "")
-    return None, "".join(issues)
+        unit_state, issue = query_unit_state(
+            run_command=run_command, service_fullname=service_fullname, service_scope=scope)
+        if unit_state is not None and unit_state.is_installed():
+            return scope, unit_state, None
+        issues.append(issue or f"not installed in scope {scope.scope()}: {unit_state}")
+    return None, None, "".join(issues)
+
+
+def detect_spire_service_scope(
+    run_command: Callable[[Any],Tuple[int,str, str]],
+    service_fullname: str,
+) -> Tuple[Optional[Scope], Optional[str]] :
+    scope, _, issue = detect_spire_service_unit_state(
+        run_command=run_command, service_fullname=service_fullname)
+    return scope, issue
+
+
+SERVICE_BACKEND_SYSTEMCTL = "systemctl"
+SERVICE_BACKEND_DBUS = "dbus"
+SERVICE_BACKENDS = [SERVICE_BACKEND_SYSTEMCTL, SERVICE_BACKEND_DBUS]
+
+
+def dbus_backend_for_scope(
+    scope: Scope,
+    log_func: Callable[[str, Optional[Dict[str, str]]], None] = None,
+) -> Optional[SystemdDbusBackend]:
+    """Returns the D-Bus backend of the manager of the scope, None if systemctl must be used.
+    There is no manager for the global scope, which only has unit files.
+    """
+    bus_address_by_scope = {
+        Scope.scope_system: "SYSTEM",
+        Scope.scope_user: user_bus_address(),
+    }
+    bus_address = bus_address_by_scope.get(scope)
+    if bus_address is None:
+        return None
+    backend, issue = get_dbus_backend(bus_address)
+    if backend is None and log_func is not None:
+        log_func(f"D-Bus backend not available for scope {scope.scope()}, using systemctl: {issue}", None)
+    return backend
 
 
 class SpireComponentService:
@@ -152,6 +299,7 @@ class SpireComponentService:
         run_command: CmdExecCallable,
         scope: Scope = Scope.scope_system,
         log_func: Callable[[str, Optional[Dict[str, str]]], None] = None,
+        service_backend: str = SERVICE_BACKEND_SYSTEMCTL,
     ) -> None:
         self.service_name = service_name
         self.service_full_name = service_name
@@ -164,6 +312,9 @@ class SpireComponentService:
             os.makedirs(self.install_dir, mode=0o770, exist_ok=True)
         self.service_file = os.path.join(self.install_dir, self.service_full_name)
         self.log_func: Callable[[str, Optional[Dict[str, str]]], None] = log_func
+        self.dbus_backend: Optional[SystemdDbusBackend] = None
+        if SERVICE_BACKEND_DBUS == service_backend:
+            self.dbus_backend = dbus_backend_for_scope(scope=scope, log_func=log_func)
 
     def __run_cmd(self, args: List[str]) -> CmdExecOutcome:
         rc, stdout, stderr = self.run_command(args)
@@ -174,6 +325,29 @@ class SpireComponentService:
         if self.log_func is not None:
             self.log_func(msg, None)
 
+    def __with_dbus(self, label: str, func: Callable[[SystemdDbusBackend], Any]) -> Tuple[bool, Any]:
+        """Runs func with the D-Bus backend.
+        Returns:
+            (True, result) or (False, None) if there is no backend or the D-Bus call failed;
+            the caller then uses systemctl. After a failure the backend is not used anymore.
+        """
+        if self.dbus_backend is None:
+            return False, None
+        try:
+            return True, func(self.dbus_backend)
+        except Exception as e:
+            self.__log(f"D-Bus {label} of {self.service_full_name} failed, falling back to systemctl: {e}")
+            self.dbus_backend = None
+            return False, None
+
+    def __assert_job_done(self, action: str, job_result: str) -> None:
+        if JOB_RESULT_DONE != job_result:
+            msg = f"""failed to {action} service[{self.service_full_name}]:
+                    job_result={job_result}
+                    unit_state={self.unit_state()}
+                    """
+            raise RuntimeError(msg)
+
     def __run_unit_file_cmd(self, action: str) -> CmdExecOutcome:
         args = ["systemctl", *self.__scope_args(), action, self.service_full_name]
         outcome: CmdExecOutcome = self.__run_cmd(args)
@@ -210,6 +384,9 @@ class SpireComponentService:
         return [self.scope.systemctl_cmd_arg()]
 
     def enable(self) -> None:
+        done, _ = self.__with_dbus("enable", lambda backend: backend.enable_unit_file(self.service_full_name))
+        if done:
+            return
         args = ["systemctl", *self.__scope_args(), "enable", self.service_full_name]
         outcome: CmdExecOutcome = self.__run_cmd(args)
         if outcome.failed():
@@ -219,29 +396,35 @@ class SpireComponentService:
                     """
             raise RuntimeError(msg)
 
+    def unit_state(self) -> Tuple[Optional[UnitState], Optional[str]]:
+        done, unit_state = self.__with_dbus(
+            "unit state", lambda backend: UnitState.from_dbus_properties(
+                properties=backend.unit_properties(self.service_full_name),
+                unit_file_listed=backend.unit_file_state(self.service_full_name) is not None))
+        if done:
+            return unit_state, None
+        return query_unit_state(
+            run_command=self.run_command,
+            service_fullname=self.service_full_name,
+            service_scope=self.scope)
+
     def is_enabled(self) -> BoolResultWithIssue:
-        res = self.__run_unit_file_cmd("is-enabled")
-        if res.failed():
-            issue = f"Fail to execute <systemctl is-enabled ...>:{res}"
-            return BoolResultWithIssue(False, issue)
-
-        if "enabled" != str(res.stdout).strip():
-            issue = f"service found not to be enabled:{res}"
-            return BoolResultWithIssue(False, issue)
-        return BoolResultWithIssue(True, None)
+        unit_state, issue = self.unit_state()
+        if unit_state is None:
+            return BoolResultWithIssue(False, f"Fail to query unit state:{issue}")
+        return unit_state.is_enabled()
 
     def is_active(self) -> BoolResultWithIssue:
-        res = self.__run_unit_file_cmd("is-active")
-        if res.failed():
-            issue = f"Fail to execute <systemctl is-active ...>:{res}"
-            return BoolResultWithIssue(False, issue)
-
-        if "active" != str(res.stdout).strip():
-            issue = f"service found not to be active:{res}"
-            return BoolResultWithIssue(False, issue)
-        return BoolResultWithIssue(True, None)
+        unit_state, issue = self.unit_state()
+        if unit_state is None:
+            return BoolResultWithIssue(False, f"Fail to query unit state:{issue}")
+        return unit_state.is_active()
 
     def start(self) -> None:
+        done, job_result = self.__with_dbus("start", lambda backend: backend.start_unit(self.service_full_name))
+        if done:
+            self.__assert_job_done("start", job_result)
+            return
         args = ["systemctl", *self.__scope_args(), "start", self.service_full_name]
         outcome: CmdExecOutcome = self.__run_cmd(args)
         if outcome.failed():
@@ -253,6 +436,10 @@ class SpireComponentService:
             raise RuntimeError(msg)
 
     def stop(self) -> None:
+        done, job_result = self.__with_dbus("stop", lambda backend: backend.stop_unit(self.service_full_name))
+        if done:
+            self.__assert_job_done("stop", job_result)
+            return
         args = ["systemctl", *self.__scope_args(), "stop", self.service_full_name]
         outcome: CmdExecOutcome = self.__run_cmd(args)
         if outcome.failed():
@@ -262,27 +449,50 @@ class SpireComponentService:
                     """
             raise RuntimeError(msg)
 
+    def __disable_now(self) -> Any:
+        def disable_now(backend: SystemdDbusBackend) -> str:
+            job_result = backend.stop_unit(self.service_full_name)
+            backend.disable_unit_file(self.service_full_name)
+            return f"dbus: stop job {job_result}, unit file disabled"
+        done, res = self.__with_dbus("disable --now", disable_now)
+        if done:
+            return res
+        # disable --now also stops the service; there is nothing to stop in the global scope
+        now_arg = [] if Scope.scope_global == self.scope else ["--now"]
+        return self.__run_cmd(["systemctl", *self.__scope_args(), "disable", *now_arg, self.service_full_name])
+
+    def __daemon_reload(self) -> Any:
+        done, _ = self.__with_dbus("daemon-reload", lambda backend: backend.reload())
+        if done:
+            return "dbus: reloaded"
+        return self.__run_cmd(["systemctl", *self.__scope_args(), "daemon-reload"])
+
+    def __reset_failed(self) -> Any:
+        if self.dbus_backend is not None:
+            try:
+                self.dbus_backend.reset_failed_unit(self.service_full_name)
+                return "dbus: failed state reset"
+            except Exception as e:
+                # like <systemctl reset-failed>, failing for units not loaded anymore; not a backend failure
+                return f"dbus: {e}"
+        return self.__run_unit_file_cmd("reset-failed")
+
     def teardown_service(self) -> None:
-        res_show_srv_name: CmdExecOutcome = self.exec_systemctl_show_srv_name()
-        if SpireComponentService.is_service_not_installed(res_show_srv_name):
-            self.__log(f"Not installed: skipping teardown of {self.service_name}: {res_show_srv_name}")
+        unit_state, issue = self.unit_state()
+        if unit_state is not None and not unit_state.is_installed():
+            self.__log(f"Not installed: skipping teardown of {self.service_name}: {unit_state}")
             return
 
-        res_stop: CmdExecOutcome = self.__run_unit_file_cmd("stop")
-        res_disable: CmdExecOutcome = self.__run_unit_file_cmd("disable")
+        res_disable = self.__disable_now()
         rm_srv_file_msg = self.remove_service_file()
-        res_daemon_reload: CmdExecOutcome = self.__run_cmd(["systemctl", *self.__scope_args(), "daemon-reload"])
-        res_reset_failed: CmdExecOutcome = self.__run_unit_file_cmd("reset-failed")
-
-        res_show_srv_name = self.exec_systemctl_show_srv_name()
-        installed: Tuple[Optional[bool], Optional[str]] = is_service_installed(
-                                                run_command=self.run_command,
-                                                service_fullname=self.service_full_name,
-                                                service_scope=self.scope)
-        if installed[0]: # SpireComponentService.is_service_not_installed(res_show_srv_name):
+        res_daemon_reload = self.__daemon_reload()
+        res_reset_failed = self.__reset_failed()
+
+        installed: Tuple[Optional[UnitState], Optional[str]] = self.unit_state()
+        if installed[0] is not None and installed[0].is_installed():
             msg = f"""Fail to remove service {self.service_full_name}
-                outcome_stop:{res_stop}
-                outcome_disable:{res_disable}
+                unit_state_before:{unit_state or issue}
+                outcome_disable_now:{res_disable}
                 rm_srv_file_msg :{rm_srv_file_msg}
                 outcome_daemon_reload:{res_daemon_reload}
                 outcome_reset_failed:{res_reset_failed}
@@ -0,0 +1,194 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+"""Optional systemd backend talking to the systemd manager over D-Bus (org.freedesktop.systemd1).
+
+It avoids forking <systemctl> for each service query or job and waits for job completion
+through the JobRemoved signal. It requires the jeepney library on the target;
+callers fall back to systemctl when it is missing or when a D-Bus call fails.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from jeepney import DBus, DBusAddress, MatchRule, Message, Properties, new_method_call
+    from jeepney.io.blocking import DBusConnection, open_dbus_connection
+    from jeepney.wrappers import DBusErrorResponse, unwrap_msg
+    HAS_JEEPNEY = True
+except ImportError:
+    HAS_JEEPNEY = False
+
+
+SYSTEMD_BUS_NAME = "org.freedesktop.systemd1"
+SYSTEMD_OBJECT_PATH = "/org/freedesktop/systemd1"
+MANAGER_INTERFACE = "org.freedesktop.systemd1.Manager"
+UNIT_INTERFACE = "org.freedesktop.systemd1.Unit"
+SERVICE_INTERFACE = "org.freedesktop.systemd1.Service"
+
+DEFAULT_CALL_TIMEOUT = 25.0
+DEFAULT_JOB_TIMEOUT = 90.0
+
+JOB_RESULT_DONE = "done"
+# GetUnitFileState answers ENOENT for a missing unit file
+FILE_NOT_FOUND_ERRORS = ["org.freedesktop.DBus.Error.FileNotFound", "org.freedesktop.systemd1.NoSuchUnit"]
+
+
+class SystemdDbusBackend:
+    """Systemd manager client sharing one bus connection.
+
+    The blocking jeepney connection is not thread-safe; calls are serialized because
+    the info probes may query the service concurrently.
+    """
+
+    def __init__(
+        self,
+        connection: "DBusConnection",
+        call_timeout: float = DEFAULT_CALL_TIMEOUT,
+        job_timeout: float = DEFAULT_JOB_TIMEOUT,
+    ) -> None:
+        self.connection = connection
+        self.call_timeout = call_timeout
+        self.job_timeout = job_timeout
+        self.manager = DBusAddress(SYSTEMD_OBJECT_PATH, bus_name=SYSTEMD_BUS_NAME, interface=MANAGER_INTERFACE)
+        self.job_removed_rule = MatchRule(
+            type="signal", interface=MANAGER_INTERFACE, member="JobRemoved", path=SYSTEMD_OBJECT_PATH)
+        self.subscribed = False
+        self.lock = threading.Lock()
+
+    def __send(self, msg: "Message") -> Tuple[Any, ...]:
+        reply = self.connection.send_and_get_reply(msg, timeout=self.call_timeout)
+        return tuple(unwrap_msg(reply))
+
+    def __call_manager(self, method: str, signature: str = None, body: Tuple[Any, ...] = ()) -> Tuple[Any, ...]:
+        with self.lock:
+            return self.__send(new_method_call(self.manager, method, signature, body))
+
+    def __subscribe(self) -> None:
+        # systemd only emits job signals to subscribed clients,
+        # and the bus only routes them to connections with a matching rule
+        if self.subscribed:
+            return
+        self.__send(DBus().AddMatch(self.job_removed_rule))
+        self.__send(new_method_call(self.manager, "Subscribe"))
+        self.subscribed = True
+
+    def __run_job(self, method: str, unit_name: str) -> str:
+        """Enqueues a job for the unit and waits for its JobRemoved signal.
+        Returns:
+            the job result, e.g. done, failed, timeout, canceled, dependency, skipped
+        """
+        with self.lock:
+            self.__subscribe()
+            # filtering before sending the call so that a signal arriving before the reply is not lost
+            with self.connection.filter(self.job_removed_rule, bufsize=64) as queue:
+                (job_path,) = self.__send(new_method_call(self.manager, method, "ss", (unit_name, "replace")))
+                deadline = time.monotonic() + self.job_timeout
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Job {job_path} ({method} {unit_name}) not done after {self.job_timeout}s")
+                    signal = self.connection.recv_until_filtered(queue, timeout=remaining)
+                    # JobRemoved(u id, o job, s unit, s result)
+                    _, removed_job_path, _, result = signal.body
+                    if removed_job_path == job_path:
+                        return str(result)
+
+    def unit_properties(self, unit_name: str) -> Dict[str, Any]:
+        """Returns the properties of the org.freedesktop.systemd1.Unit interface of the unit,
+        and of the org.freedesktop.systemd1.Service interface (e.g. Result, MainPID) for a service.
+        LoadUnit is used instead of GetUnit, so that a unit which is not loaded is reported too.
+        """
+        (unit_path,) = self.__call_manager("LoadUnit", "s", (unit_name,))
+        interfaces = [UNIT_INTERFACE, SERVICE_INTERFACE] if unit_name.endswith(".service") else [UNIT_INTERFACE]
+        unit_properties: Dict[str, Any] = {}
+        for interface in interfaces:
+            unit = DBusAddress(unit_path, bus_name=SYSTEMD_BUS_NAME, interface=interface)
+            with self.lock:
+                (properties,) = self.__send(Properties(unit).get_all())
+            # values are (signature, value) variants
+            unit_properties.update({name: variant[1] for name, variant in properties.items()})
+        return unit_properties
+
+    def unit_file_state(self, unit_name: str) -> Optional[str]:
+        """Returns the state of the unit file (e.g. enabled, disabled, masked), None if there is no unit file.
+        Like <systemctl list-unit-files>, it looks at the unit files on disk, not at the loaded unit.
+        """
+        try:
+            (state,) = self.__call_manager("GetUnitFileState", "s", (unit_name,))
+        except DBusErrorResponse as e:
+            if e.name in FILE_NOT_FOUND_ERRORS:
+                return None
+            raise
+        return str(state)
+
+    def start_unit(self, unit_name: str) -> str:
+        return self.__run_job("StartUnit", unit_name)
+
+    def stop_unit(self, unit_name: str) -> str:
+        return self.__run_job("StopUnit", unit_name)
+
+    def enable_unit_file(self, unit_name: str) -> None:
+        # EnableUnitFiles(as files, b runtime, b force)
+        self.__call_manager("EnableUnitFiles", "asbb", ([unit_name], False, False))
+        self.reload()
+
+    def disable_unit_file(self, unit_name: str) -> None:
+        # DisableUnitFiles(as files, b runtime)
+        self.__call_manager("DisableUnitFiles", "asb", ([unit_name], False))
+        self.reload()
+
+    def reload(self) -> None:
+        self.__call_manager("Reload")
+
+    def reset_failed_unit(self, unit_name: str) -> None:
+        self.__call_manager("ResetFailedUnit", "s", (unit_name,))
+
+
+def user_bus_address() -> str:
+    env_address = os.environ.get("DBUS_SESSION_BUS_ADDRESS")
+    if env_address:
+        return env_address
+    # e.g. when running through su/sudo, the user manager is still listening at its well-known path
+    return f"unix:path=/run/user/{os.getuid()}/bus"
+
+
+# one backend, hence one bus connection, per bus address and module run
+_backends: Dict[str, SystemdDbusBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_dbus_backend(bus_address: str) -> Tuple[Optional[SystemdDbusBackend], Optional[str]]:
+    """Returns the backend connected to the bus at bus_address (SYSTEM, SESSION or a D-Bus address).
+    Returns:
+        (backend, None) or (None, issue) if jeepney is missing or the bus is not reachable
+    """
+    if not HAS_JEEPNEY:
+        return None, "python library jeepney not available"
+    with _backends_lock:
+        backend = _backends.get(bus_address)
+        if backend is None:
+            try:
+                backend = SystemdDbusBackend(open_dbus_connection(bus=bus_address))
+            except Exception as e:
+                return None, f"Fail to connect to D-Bus at {bus_address}: {e}"
+            _backends[bus_address] = backend
+        return backend, None
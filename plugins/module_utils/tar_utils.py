@@ -16,6 +16,65 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import os
+import tarfile
+import tempfile
+from typing import Callable, List
+
+from .digests import sha256_file
+
+
+def __stream_member_to(
+        tar_gz_archive_path: str, tar_member_name_suffix: str,
+        dest_path_of: Callable[[str], str]
+) -> str:
+    """Decompresses the archive as a stream and writes only the member matching the suffix
+    (atomically) to the path given by dest_path_of(member-name).
+    Exactly one member must match: the whole archive is read, and nothing is written
+    if no or more than one member matches.
+    Returns the path of the extracted member.
+    """
+    seen: List[str] = []
+    matching: List[str] = []
+    dest_path: str = None
+    tmp_path: str = None
+    mode: int = None
+    try:
+        with tarfile.open(tar_gz_archive_path, mode="r|*") as tar:
+            for member in tar:
+                seen.append(member.name)
+                if not (member.isfile()
+                        and member.name.startswith("./")
+                        and member.name.endswith(tar_member_name_suffix)):
+                    continue
+                matching.append(member.name)
+                if len(matching) > 1:
+                    continue
+                member_file = tar.extractfile(member)
+                dest_path = dest_path_of(member.name)
+                dest_dir = os.path.dirname(dest_path)
+                os.makedirs(dest_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=f".{os.path.basename(dest_path)}.")
+                with os.fdopen(fd, "wb") as dest_file, member_file:
+                    for chunk in iter(lambda: member_file.read(1024 * 1024), b""):
+                        dest_file.write(chunk)
+                mode = member.mode
+        if 1 != len(matching):
+            msg = f"""could not find {tar_member_name_suffix} member in tar.gz
+                    tar-gz: {tar_gz_archive_path}
+                    matching: {matching}
+                    tar-gz-content: {seen}
+                """
+            raise RuntimeError(msg)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, dest_path)
+        tmp_path = None
+        return dest_path
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
 def extract_tar_member(tar_gz_archive_path: str, tar_member_name_suffix: str) -> str:
     """extracts tar(gz) archive member.
     Parameters:
@@ -23,22 +82,56 @@ def extract_tar_member(tar_gz_archive_path: str, tar_member_name_suffix: str) ->
         tar_member_name_suffix: a suffix used to select the member to extract.
                                 e.g. /bin/spire-agent to extract spire-agent library
     """
-    import os
-    import tarfile
-    with tarfile.open(tar_gz_archive_path) as tar:
-        spire_agent_binary_as_list = [
-            e for e in tar
-            if str(e.name).endswith(tar_member_name_suffix) and e.name.startswith("./")]
-        if 1 != len(spire_agent_binary_as_list):
-            tar_gz_ls = [e.name for e in tar]
-            msg = f"""could not find {tar_member_name_suffix} member in tar.gz
-                    tar-gz: {tar_gz_archive_path}
-                    tar-gz-content: {tar_gz_ls}
-                """
-            raise RuntimeError(msg)
-        target_dir = os.path.dirname(tar_gz_archive_path)
-        tar.extractall(members=spire_agent_binary_as_list, path=target_dir)
-        target_file = os.path.join(target_dir, spire_agent_binary_as_list[0].name)
-        target_file = os.path.normpath(target_file)
+    target_dir = os.path.dirname(tar_gz_archive_path)
+    return __stream_member_to(
+        tar_gz_archive_path, tar_member_name_suffix,
+        lambda member_name: os.path.normpath(os.path.join(target_dir, member_name)))
+
 
-    return target_file
+def extract_tar_member_cached(
+        tar_gz_archive_path: str, tar_member_name_suffix: str,
+        cache_dir: str, tar_gz_archive_sha256: str = None
+) -> str:
+    """extracts a tar(gz) archive member into a content addressed cache.
+    The member is cached under <cache_dir>/<archive-sha256>/<member-name-suffix>,
+    so it is extracted once and the cached path is returned right away afterwards.
+    Only the selected member is written; exactly one member must match the suffix.
+    Parameters:
+        tar_gz_archive_path: the path if the downloaded achive
+        tar_member_name_suffix: a suffix used to select the member to extract.
+                                e.g. /bin/spire-agent to extract spire-agent library
+        cache_dir: root directory of the cache
+        tar_gz_archive_sha256: the archive digest if already known, computed otherwise
+    """
+    archive_sha256 = tar_gz_archive_sha256 or sha256_file(tar_gz_archive_path)
+    if not archive_sha256:
+        raise RuntimeError(f"tar-gz archive not found: {tar_gz_archive_path}")
+    member_key = os.path.normpath(tar_member_name_suffix.lstrip("/"))
+    if not member_key or member_key.startswith(".."):
+        raise ValueError(f"invalid member name suffix: {tar_member_name_suffix}")
+    cached_path = os.path.join(cache_dir, archive_sha256, member_key)
+    if os.path.isfile(cached_path):
+        return cached_path
+    __stream_member_to(tar_gz_archive_path, tar_member_name_suffix, lambda _: cached_path)
+    cached_member_sha256(cached_path)
+    return cached_path
+
+
+def cached_member_sha256(cached_path: str) -> str:
+    """Returns the sha256 of a member extracted by extract_tar_member_cached.
+    The digest is kept next to the member (<member>.sha256) and only computed once.
+    """
+    digest_path = f"{cached_path}.sha256"
+    try:
+        with open(digest_path, "r") as digest_file:
+            return digest_file.read().strip()
+    except FileNotFoundError:
+        pass
+    digest = sha256_file(cached_path)
+    if digest is None:
+        raise RuntimeError(f"cached member not found: {cached_path}")
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cached_path), prefix=".sha256.")
+    with os.fdopen(fd, "w") as digest_file:
+        digest_file.write(digest)
+    os.replace(tmp_path, digest_path)
+    return digest
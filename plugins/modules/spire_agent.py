@@ -25,7 +25,7 @@ import pathlib
 
 # https://github.com/ansible/ansible-modules-core/blob/devel/database/postgresql/postgresql_db.py
 import shutil
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_agent_info_cmd import (
@@ -33,9 +33,13 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_agent_
     SpireAgentInfo
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    digests,
     healthchecks,
     logging,
+    polling,
+    probes,
     spire_agent_info_cmd,
+    startup_watch,
     systemd,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.ansible_module_cmd import (
@@ -102,6 +106,25 @@ options:
         default: yes
         choices: [yes, no, partially]
 
+    spire_agent_registration_verification:
+        description:
+            - how the registration of the agent is verified
+            - with server, the agent entries are listed on the spire server and matched by spiffe-id, serial number and expiry
+            - with local, the agent svid (agent_svid.der) is verified on the agent host against its bundle (bundle.der);
+              the server is only asked if the svid is missing, does not verify or expires within
+              spire_agent_registration_local_min_validity_seconds
+            - local does not detect an agent evicted on the server while its svid is still valid
+        required: false
+        default: server
+        choices: [server, local]
+
+    spire_agent_registration_local_min_validity_seconds:
+        description:
+            - minimal remaining validity of the agent svid for the local registration verification to be conclusive
+        type: int
+        required: false
+        default: 600
+
     spire_server_install_dir:
         description:
             - installation directory of the spire server binaries
@@ -118,6 +141,22 @@ options:
             - e.g.  "spire_server"
         required: true
 
+    spire_server_cmd_concurrency:
+        description:
+            - maximal number of commands (token generate, bundle show, agent list, ...) run concurrently
+              on the spire server host by all forks of the controller; 0 disables the limit
+            - forks waiting for a free slot report the time waited in spire_server_cmd_queue_wait_seconds
+        type: int
+        required: false
+        default: 4
+
+    spire_server_cmd_queue_timeout_seconds:
+        description:
+            - how long to wait for a free spire server command slot before failing
+        type: float
+        required: false
+        default: 300
+
     spire_server_address:
         description:
             - IP address or dns name of the spire server
@@ -246,6 +285,122 @@ options:
             - e.g. "file:///tmp/download/docker-spire-server/.download/spire-0.10.0-linux-x86_64-glibc.tar.gz"
             - e.g. "https://github.com/spiffe/spire/releases/download/v0.10.0/spire-0.10.0-linux-x86_64-glibc.tar.gz"
         required: true
+    spire_download_sha256:
+        description:
+            - expected sha256 hex digest of the spire distribution downloaded from spire_download_url
+        required: false
+    spire_download_sha256_url:
+        description:
+            - url of a sha256sum like file holding the digest of the spire distribution
+            - only used if spire_download_sha256 is not given
+            - the download is not verified if neither is given
+        required: false
+    spire_download_cache_max_size_mb:
+        description:
+            - size limit of the controller download cache; least recently used downloads are evicted first
+        required: false
+        default: 1024
+    spire_download_validate_certs:
+        description:
+            - if false, the ssl certificates of spire_download_url and of its sha256 sidecar are not validated
+        required: false
+        default: true
+    spire_download_use_proxy:
+        description:
+            - if false, the proxy environment variables (http_proxy, https_proxy, no_proxy)
+              of the downloading host (controller or spire_download_host) are ignored
+        required: false
+        default: true
+    spire_download_client_cert:
+        description:
+            - PEM client certificate (path on the downloading host) used to authenticate the download
+            - may also hold the private key, see spire_download_client_key
+        required: false
+    spire_download_client_key:
+        description:
+            - PEM private key (path on the downloading host) of spire_download_client_cert
+        required: false
+    spire_download_headers:
+        description:
+            - additional http headers of the download requests
+        required: false
+    spire_binary_transfer_mode:
+        description:
+            - how the spire binary is pushed to the target
+            - with compressed, a gzip compressed copy is transferred, decompressed on the target, checked against its sha256 and renamed into place
+            - with copy, the uncompressed binary is copied with the copy module
+        required: false
+        default: compressed
+        choices: [compressed, copy]
+    spire_upgrade_mode:
+        description:
+            - with in_place, files and binary are installed directly at their destination
+            - with staged, files and binary are uploaded next to their destination while the service keeps running,
+              then the service is stopped if needed, the staged files are renamed into place and the service is started
+            - staged always uses the bundle copy and the compressed binary transfer
+        required: false
+        default: in_place
+        choices: [in_place, staged]
+    spire_download_host:
+        description:
+            - inventory host downloading the release once for all targets instead of the controller
+            - the release is fetched and the binary extracted into spire_download_host_cache_dir of that host
+            - targets get the binary from spire_download_host_url if given, otherwise it is relayed
+              over the existing connections through the controller (transferred once per run)
+        type: str
+        required: false
+    spire_download_host_url:
+        description:
+            - base url of a file server serving spire_download_host_cache_dir of the download host
+            - targets then fetch the binary from it themselves, verified with its sha256
+        type: str
+        required: false
+    spire_download_host_cache_dir:
+        description:
+            - the cache dir used on the download host and, with spire_download_host_url, on the targets
+        type: str
+        required: false
+        default: /var/cache/io_patricecongo.spire
+    spire_install_versions_retention:
+        description:
+            - enables the versioned install layout if set
+            - each version is installed at <install_dir>/versions/<version>/bin and activated by atomically
+              switching the symlink <install_dir>/current, <install_dir>/bin becoming a symlink to current/bin
+            - the value is the number of previously activated versions kept, rolling back to one of those
+              only switches the symlink and restarts the service
+        type: int
+        required: false
+    spire_service_backend:
+        description:
+            - how the systemd service is managed on the target
+            - with systemctl, each query and each job forks systemctl
+            - with dbus, the systemd manager is called over one D-Bus connection and jobs are awaited
+              through their completion signal; it requires the python library jeepney on the target
+              and falls back to systemctl if it is missing, for the global scope or if a D-Bus call fails
+        required: false
+        default: systemctl
+        choices: [systemctl, dbus]
+    spire_state_fingerprint:
+        description:
+            - if true, a successful run records on the target the digest of its inputs (task args, templates,
+              action code) with a fingerprint of the target state (managed files and systemd unit state)
+            - a later run with the same inputs whose target state fingerprint still matches returns the recorded
+              result unchanged, with spire_state_fingerprint_fast_path set, without any further remote call
+            - data about a run itself (spire_server_cmd_queue_wait_seconds) is not recorded, the fast path
+              reports the one of its own run
+            - the fingerprint does not cover changes outside of the managed files and unit state
+              (e.g. a rotated server bundle or an evicted agent)
+        type: bool
+        required: false
+        default: false
+    spire_install_files_copy_mode:
+        description:
+            - how the service files (conf, env, systemd unit, ...) are copied to the target
+            - with bundle, all files needing a change are packed into one archive, transferred once and installed atomically
+            - with per_file, each file is copied with its own copy task
+        required: false
+        default: bundle
+        choices: [bundle, per_file]
 author:
     - Patrice Congo (@congop)
 '''
@@ -304,6 +459,42 @@ service_started:
     description: true if spire_agent service is started
     type: bool
     returned: always
+
+spire_agent_join_token_minted:
+    description:
+        - true if a join token got minted on the spire server and installed with the agent env file
+        - a token is only minted if the agent has to attest, i.e. its svid is missing or expired or it is not registered;
+          a svid failing only the local verification against the bundle does not get a new token
+    type: bool
+    returned: when state is present
+
+spire_agent_reattestation_avoided:
+    description:
+        - true if the agent got changed (binary, config, service) and kept its svid from the data dir,
+          so that no join token was minted and the agent does not attest again
+    type: bool
+    returned: when state is present
+
+spire_server_cmd_queue_wait_seconds:
+    description:
+        - time waited for a free spire server command slot (see spire_server_cmd_concurrency)
+        - count of the commands run on the spire server host, total and max seconds waited
+    type: dict
+    returned: success
+
+readiness_wait:
+    description:
+        - polling outcome of the wait for the service to become healthy
+        - with the start offset, duration and result of each readiness probe attempt
+    type: dict
+    returned: when the module waited for the service to become healthy
+
+spire_state_fingerprint_fast_path:
+    description:
+        - true if the result recorded by the last successful run was returned because neither the inputs
+          nor the target state changed since then
+    type: bool
+    returned: when spire_state_fingerprint is true and the fast path is taken
 '''
 
 def _module_args() -> Dict[str, Dict[str,Any]]:
@@ -318,12 +509,18 @@ def _module_args() -> Dict[str, Dict[str,Any]]:
         substate_agent_registered=dict(
             type="str", required=False, default="healthy",
             choices=SubStateAgentRegistered.names()),
+        spire_agent_registration_verification=dict(
+            type="str", required=False, default="server", choices=["server", "local"]),
+        spire_agent_registration_local_min_validity_seconds=dict(
+            type="int", required=False, default=600),
 
         spire_server_install_dir=dict(type="str", required=True),
         spire_server_registration_uds_path=dict(
             type="str", required=False,
             defaults="/tmp/spire-registration.sock"),
         spire_server_host=dict(type="str", required=True, ),
+        spire_server_cmd_concurrency=dict(type="int", required=False, default=4),
+        spire_server_cmd_queue_timeout_seconds=dict(type="float", required=False, default=300),
         spire_server_address=dict(type="str", required=True),
         spire_server_port=dict(type="int", required=True),
 
@@ -366,6 +563,27 @@ def _module_args() -> Dict[str, Dict[str,Any]]:
             type="int", required=True, defaults=5),
 
         spire_download_url=dict(type="str", required=True),
+        spire_download_sha256=dict(type="str", required=False),
+        spire_download_sha256_url=dict(type="str", required=False),
+        spire_download_cache_max_size_mb=dict(type="int", required=False),
+        spire_download_validate_certs=dict(type="bool", required=False),
+        spire_download_use_proxy=dict(type="bool", required=False),
+        spire_download_client_cert=dict(type="path", required=False),
+        spire_download_client_key=dict(type="path", required=False),
+        spire_download_headers=dict(type="dict", required=False),
+        spire_binary_transfer_mode=dict(
+            type="str", required=False, choices=["compressed", "copy"]),
+        spire_upgrade_mode=dict(
+            type="str", required=False, choices=["in_place", "staged"]),
+        spire_download_host=dict(type="str", required=False),
+        spire_download_host_url=dict(type="str", required=False),
+        spire_download_host_cache_dir=dict(type="str", required=False),
+        spire_install_versions_retention=dict(type="int", required=False),
+        spire_install_files_copy_mode=dict(
+            type="str", required=False, choices=["bundle", "per_file"]),
+        spire_state_fingerprint=dict(type="bool", required=False, default=False),
+        spire_service_backend=dict(
+            type="str", required=False, default="systemctl", choices=["systemctl", "dbus"]),
     )
     return module_args
 
@@ -382,6 +600,7 @@ def run_module() -> None:
     params: Params = Params(copy.deepcopy(module.params))
     func_run_command = RunCommand(module)
     func_log = logging.CachingLogger(module.log)
+    readiness_wait: Optional[polling.PollOutcome] = None
 
     try:
         assert_not_handling_check_mode_since_action_reponsibility(module)
@@ -400,6 +619,7 @@ def run_module() -> None:
             dirs=dirs,
             socket_path=module.params["spire_agent_socket_path"],
             service_scope=module.params["spire_agent_service_scope"],
+            service_backend=module.params["spire_service_backend"],
         )
         state_snapshot = spire_agent_info_cmd.AgentStateSnapshot(agent_info)
         current_state: StateOfAgent = state_snapshot.get_state_of_agent()
@@ -410,8 +630,15 @@ def run_module() -> None:
                 service_name=module.params["spire_agent_service_name"],
                 scope=systemd.Scope.by_name(module.params["spire_agent_service_scope"]),
                 run_command=func_run_command,
-                log_func=func_log
+                log_func=func_log,
+                service_backend=module.params["spire_service_backend"],
             )
+
+            def new_startup_watch() -> startup_watch.StartupFailureWatch:
+                return startup_watch.StartupFailureWatch(
+                    unit_state_func=service.unit_state,
+                    log_file=startup_watch.configured_log_file(dirs.path_conf_file))
+
             if expected_state.state == State.absent:
                 service.teardown_service()
                 dir_keys = [
@@ -447,17 +674,20 @@ def run_module() -> None:
                                 #   - starts the agent
                                 #   - wait for its healthiness
                                 #   - and and stop it
+                                watch = new_startup_watch()
                                 service.start()
                                 timeout = module.params["spire_agent_healthiness_probe_timeout_seconds"]
                                 healthcheck = healthchecks.CheckAgent(
                                     run_command=func_run_command,
                                     file_spire_agent_bin=dirs.path_executable,
                                     readiness_probe_timeout_seconds=timeout,
-                                    socket_path=module.params["spire_agent_socket_path"]
+                                    socket_path=module.params["spire_agent_socket_path"],
+                                    startup_watch=watch,
                                 )
-                                healthcheck.wait_for_readiness()
+                                readiness_wait = healthcheck.wait_for_readiness()
                             service.stop()
                         else:  # started or healthy
+                            watch = new_startup_watch()
                             service.start()
                             if expected_state.substate_service_status == SubStateServiceStatus.healthy:
                                 timeout = module.params["spire_agent_healthiness_probe_timeout_seconds"]
@@ -465,12 +695,13 @@ def run_module() -> None:
                                     run_command=func_run_command,
                                     file_spire_agent_bin=dirs.path_executable,
                                     readiness_probe_timeout_seconds=timeout,
-                                    socket_path=module.params["spire_agent_socket_path"]
+                                    socket_path=module.params["spire_agent_socket_path"],
+                                    startup_watch=watch,
                                 )
-                                healthcheck.wait_for_readiness()
+                                readiness_wait = healthcheck.wait_for_readiness()
 
-        agent_info.reset_computed_base_state()
-        state_snapshot = spire_agent_info_cmd.AgentStateSnapshot(agent_info)
+            agent_info.reset_computed_base_state()
+            state_snapshot = spire_agent_info_cmd.AgentStateSnapshot(agent_info)
         current_state = state_snapshot.get_state_of_agent()
         func_log(f"issues = {state_snapshot.get_issues_issues()}")
         result = {
@@ -478,8 +709,14 @@ def run_module() -> None:
             **current_state.to_ansible_return_data(),
             "debug_msg": func_log.messages,
         }
+        if readiness_wait is not None:
+            result["readiness_wait"] = readiness_wait.to_ansible_result_value()
+        probes.wait_for_straggling_probes()
+        digests.flush_digest_caches()
         module.exit_json(**result)
     except Exception as e:
+        probes.wait_for_straggling_probes()
+        digests.flush_digest_caches()
         module.fail_json(
             msg=f"Exception while running module:{str(e)}",
             exception=e,
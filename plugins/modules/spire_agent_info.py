@@ -27,7 +27,9 @@ from typing import Any, Dict
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    digests,
     logging,
+    probes,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.ansible_module_cmd import (
     RunCommand,
@@ -168,6 +170,17 @@ spire_agent_executable_path:
         - agent binary executable path
     type: str
 
+spire_agent_executable_sha256:
+    description:
+        - sha256 of the agent binary executable
+        - cached on the target by inode, mtime and size
+    type: str
+
+spire_agent_executable_sha256_issue:
+    description:
+        - any issue which prevented the computation of the agent binary sha256
+    type: str
+
 spire_agent_trust_domain_id:
     description:
         - the trust domain id of the agent
@@ -178,6 +191,26 @@ spire_agent_trust_domain_id_issue:
         - any issue which prevented the detection of the agent trust domain id
     type: str
 
+spire_agent_svid_verified:
+    description:
+        - True if the agent svid (agent_svid.der) is currently valid and chains up to a root of the agent bundle (bundle.der)
+    type: bool
+
+spire_agent_svid_verified_issue:
+    description:
+        - why the agent svid could not be verified
+    type: str
+
+spire_agent_svid_not_after:
+    description:
+        - expiry of the agent svid, iso 8601
+    type: str
+
+spire_agent_svid_validity_remaining_seconds:
+    description:
+        - seconds until the agent svid expires, according to the agent host clock
+    type: float
+
 spire_agent_is_healthy:
     description:
         - True if the agent is healty, False  otherwise
@@ -229,6 +262,28 @@ spire_agent_service_enabled_issue:
         - any issue which prevented the detection of the agent systemd service enabled state
     type: str
 
+spire_agent_hexdigest_env_file:
+    description:
+        - the digest of the normalized agent env file, the join token value being masked
+        - cached on the target by inode, mtime and size
+    type: str
+
+spire_agent_hexdigest_env_file_issue:
+    description:
+        - any issue which prevented the computation of the agent env file digest
+    type: str
+
+spire_agent_hexdigest_trust_bundle_file:
+    description:
+        - the digest of the certificates of the agent trust bundle file, independent of their order
+        - cached on the target by inode, mtime and size
+    type: str
+
+spire_agent_hexdigest_trust_bundle_file_issue:
+    description:
+        - any issue which prevented the computation of the agent trust bundle file digest
+    type: str
+
 '''
 
 def _module_args() -> Dict[str, Dict[str,Any]]:
@@ -281,8 +336,12 @@ def run_module() -> None:
             **state_snapshot.to_ansible_result(),
             "debug_msg": str(func_log.messages)
         }
+        probes.wait_for_straggling_probes()
+        digests.flush_digest_caches()
         module.exit_json(**result)
     except Exception as e:
+        probes.wait_for_straggling_probes()
+        digests.flush_digest_caches()
         module.fail_json(msg=f"Exception while running module:{func_log.messages}", exception=e)
 
 
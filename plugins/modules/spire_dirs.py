@@ -0,0 +1,140 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, Dict, List
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    logging,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_batch import (
+    DirOutcome,
+    DirSpec,
+    ensure_dirs,
+)
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: spire_dirs
+
+short_description: Ensures a list of directories with their mode and owner in one go
+
+version_added: "0.0.1"
+
+description:
+    - Creates the given directories if they do not exist yet and fixes their mode and ownership
+    - Allows the spire_server and spire_agent actions to provision all their directories with one module execution
+
+options:
+    spire_dirs:
+        description:
+            - the directories to ensure
+            - each entry is a dict with path, mode, owner and group
+            - mode can be symbolic (e.g. "u=rwx,g=rx,o=") or octal (e.g. "0750")
+            - owner and group are not changed if not given
+        type: list
+        elements: dict
+        required: true
+author:
+    - Patrice Congo (@congop)
+'''
+
+EXAMPLES = '''
+- name: Ensure spire agent directories
+  io_patricecongo.spire.spire_dirs:
+    spire_dirs:
+      - path: /etc/spire-agent
+        mode: "u=rwx,g=rx,o="
+        owner: root
+      - path: /opt/spire-agent/bin
+        mode: "0750"
+'''
+
+RETURN = '''
+spire_dirs:
+    description:
+        - outcome by directory path
+    type: dict
+    returned: success
+    contains:
+        changed:
+            description:
+                - True if the directory has been created or its attributes changed
+            type: bool
+        created:
+            description:
+                - True if the directory has been created
+            type: bool
+        file_stat:
+            description:
+                - the file stat of the directory after the change
+            type: dict
+'''
+
+
+def _module_args() -> Dict[str, Dict[str, Any]]:
+    module_args = dict(
+        spire_dirs=dict(type="list", elements="dict", required=True),
+    )
+    return module_args
+
+
+def run_module() -> None:
+    module_args = _module_args()
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False
+    )
+    func_log = logging.CachingLogger(module.log)
+
+    try:
+        specs: List[DirSpec] = [
+            DirSpec.from_ansible_param(param)
+            for param in module.params["spire_dirs"]
+        ]
+        outcomes: Dict[str, DirOutcome] = ensure_dirs(module=module, specs=specs)
+        result = {
+            "changed": any(outcome.changed for outcome in outcomes.values()),
+            "spire_dirs": {
+                path: outcome.to_ansible_result_value()
+                for path, outcome in outcomes.items()
+            },
+            "debug_msg": str(func_log.messages)
+        }
+        module.exit_json(**result)
+    except Exception as e:
+        module.fail_json(msg=f"Exception while running module:{str(e)}", exception=e)
+
+
+def main() -> None:
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
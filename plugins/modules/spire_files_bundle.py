@@ -0,0 +1,185 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, Dict, List
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    logging,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_batch import (
+    FileOutcome,
+    FileSpec,
+    commit_staged_files,
+    install_files_bundle,
+    stage_files_bundle,
+)
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: spire_files_bundle
+
+short_description: Installs a set of files from a single tar.gz bundle
+
+version_added: "0.0.1"
+
+description:
+    - Installs the members of a tar.gz bundle already transferred to the target to their destinations
+    - All members are staged next to their destination before being moved in place
+    - Allows the spire_server and spire_agent actions to transfer all their service files at once
+
+options:
+    spire_bundle_src:
+        description:
+            - path of the tar.gz bundle on the target
+            - only required if at least one file has a member
+        type: str
+        required: false
+    spire_bundle_files:
+        description:
+            - the files to install
+            - each entry is a dict with dest, member, mode, owner, group and sha256
+            - an entry without member only gets the attributes of dest fixed
+            - mode can be symbolic (e.g. "u=rw,g=r,o=") or octal (e.g. "0640")
+            - owner and group are not changed if not given
+            - the member content is checked against sha256 if given
+        type: list
+        elements: dict
+        required: true
+    spire_bundle_phase:
+        description:
+            - install stages the files next to their destination and moves them in place right away
+            - stage only leaves the changed files at <dest>.spire-staged
+            - commit moves files staged by a previous stage phase in place
+        type: str
+        required: false
+        default: install
+        choices: [install, stage, commit]
+author:
+    - Patrice Congo (@congop)
+'''
+
+EXAMPLES = '''
+- name: Install spire agent service files
+  io_patricecongo.spire.spire_files_bundle:
+    spire_bundle_src: /tmp/ansible-tmp/spire-files-bundle.tar.gz
+    spire_bundle_files:
+      - dest: /etc/spire-agent/agent.conf
+        member: 00-agent.conf
+        mode: "u=rw,g=r,o="
+        owner: root
+      - dest: /etc/spire-agent/agent.env
+        mode: "0640"
+
+- name: Move the files staged while the service was running in place
+  io_patricecongo.spire.spire_files_bundle:
+    spire_bundle_phase: commit
+    spire_bundle_files:
+      - dest: /etc/spire-agent/agent.conf
+'''
+
+RETURN = '''
+spire_bundle_files:
+    description:
+        - outcome by destination path
+    type: dict
+    returned: success
+    contains:
+        changed:
+            description:
+                - True if the file content or attributes changed
+            type: bool
+        content_changed:
+            description:
+                - True if the file content has been replaced (or staged in the stage phase)
+            type: bool
+        file_stat:
+            description:
+                - the file stat of the file after the change
+            type: dict
+'''
+
+
+def _module_args() -> Dict[str, Dict[str, Any]]:
+    module_args = dict(
+        spire_bundle_src=dict(type="str", required=False),
+        spire_bundle_files=dict(type="list", elements="dict", required=True),
+        spire_bundle_phase=dict(
+            type="str", required=False, default="install",
+            choices=["install", "stage", "commit"]),
+    )
+    return module_args
+
+
+def run_module() -> None:
+    module_args = _module_args()
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False
+    )
+    func_log = logging.CachingLogger(module.log)
+
+    try:
+        specs: List[FileSpec] = [
+            FileSpec.from_ansible_param(param)
+            for param in module.params["spire_bundle_files"]
+        ]
+        phase = module.params["spire_bundle_phase"]
+        outcomes: Dict[str, FileOutcome]
+        if "commit" == phase:
+            outcomes = commit_staged_files(specs=specs)
+        elif "stage" == phase:
+            outcomes = stage_files_bundle(
+                module=module,
+                bundle_path=module.params["spire_bundle_src"],
+                specs=specs)
+        else:
+            outcomes = install_files_bundle(
+                module=module,
+                bundle_path=module.params["spire_bundle_src"],
+                specs=specs)
+        result = {
+            "changed": any(outcome.changed for outcome in outcomes.values()),
+            "spire_bundle_files": {
+                dest: outcome.to_ansible_result_value()
+                for dest, outcome in outcomes.items()
+            },
+            "debug_msg": str(func_log.messages)
+        }
+        module.exit_json(**result)
+    except Exception as e:
+        module.fail_json(msg=f"Exception while running module:{str(e)}", exception=e)
+
+
+def main() -> None:
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, Dict
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    healthchecks,
+    logging,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.ansible_module_cmd import (
+    RunCommand,
+)
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: spire_healthcheck
+
+short_description: Waits on the target for a spire agent or server to become healthy
+
+version_added: "0.0.1"
+
+description:
+    - Checks the component health until it is healthy or the timeout elapses
+    - The gRPC health service is called in-process over the component socket, <spire-agent|spire-server healthcheck>
+      being run only if no socket path is set, with spire_healthcheck_native false, or if the in-process check is not conclusive
+    - The whole wait loop runs on the target, so waiting costs a single module execution
+      instead of one info collection per attempt
+    - Attempts are spaced with an exponential backoff starting at 50ms
+    - An unhealthy component does not fail the module, the result tells whether it became healthy
+
+options:
+    spire_healthcheck_component:
+        description:
+            - the spire component to check
+        type: str
+        required: true
+        choices: [agent, server]
+    spire_healthcheck_bin:
+        description:
+            - path of the spire-agent or spire-server executable
+        type: str
+        required: true
+    spire_healthcheck_socket_path:
+        description:
+            - the agent socket path or the server registration uds path, the component default if not set
+        type: str
+        required: false
+    spire_healthcheck_timeout_seconds:
+        description:
+            - how long to wait for the component to become healthy
+            - with 0 the component is checked once
+        type: float
+        required: false
+        default: 0
+    spire_healthcheck_native:
+        description:
+            - if true and a socket path is set, the gRPC health check is performed in-process over the socket,
+              the healthcheck command only being run if the in-process check is not conclusive
+        type: bool
+        required: false
+        default: true
+    spire_healthcheck_connect_retry_budget_seconds:
+        description:
+            - how long each in-process check may retry connecting to a socket which is not there yet
+        type: float
+        required: false
+        default: 0
+author:
+    - Patrice Congo (@congop)
+'''
+
+EXAMPLES = '''
+- name: Wait up to 30s for the spire agent to be healthy
+  io_patricecongo.spire.spire_healthcheck:
+    spire_healthcheck_component: agent
+    spire_healthcheck_bin: /opt/spire-agent/bin/spire-agent
+    spire_healthcheck_socket_path: /tmp/agent.sock
+    spire_healthcheck_timeout_seconds: 30
+'''
+
+RETURN = '''
+spire_healthcheck_healthy:
+    description:
+        - True if the component was found healthy before the timeout
+    type: bool
+    returned: success
+spire_healthcheck_issue:
+    description:
+        - the outcome of the last failed health check
+    type: str
+    returned: when not healthy
+spire_healthcheck_polling:
+    description:
+        - the polling outcome with the start offset, duration and result of each attempt
+    type: dict
+    returned: success
+'''
+
+
+def _module_args() -> Dict[str, Dict[str, Any]]:
+    module_args = dict(
+        spire_healthcheck_component=dict(type="str", required=True, choices=["agent", "server"]),
+        spire_healthcheck_bin=dict(type="str", required=True),
+        spire_healthcheck_socket_path=dict(type="str", required=False),
+        spire_healthcheck_timeout_seconds=dict(type="float", required=False, default=0),
+        spire_healthcheck_native=dict(type="bool", required=False, default=True),
+        spire_healthcheck_connect_retry_budget_seconds=dict(type="float", required=False, default=0),
+    )
+    return module_args
+
+
+def run_module() -> None:
+    module_args = _module_args()
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+    func_run_command = RunCommand(module)
+    func_log = logging.CachingLogger(module.log)
+
+    try:
+        params = module.params
+        check: healthchecks.Check
+        if "agent" == params["spire_healthcheck_component"]:
+            check = healthchecks.CheckAgent(
+                run_command=func_run_command,
+                file_spire_agent_bin=params["spire_healthcheck_bin"],
+                socket_path=params.get("spire_healthcheck_socket_path"),
+                readiness_probe_timeout_seconds=params["spire_healthcheck_timeout_seconds"],
+                native=params["spire_healthcheck_native"],
+                connect_retry_budget_seconds=params["spire_healthcheck_connect_retry_budget_seconds"],
+            )
+        else:
+            check = healthchecks.CheckServer(
+                run_command=func_run_command,
+                file_spire_server_bin=params["spire_healthcheck_bin"],
+                registration_uds_path=params.get("spire_healthcheck_socket_path"),
+                readiness_probe_timeout_seconds=params["spire_healthcheck_timeout_seconds"],
+                native=params["spire_healthcheck_native"],
+                connect_retry_budget_seconds=params["spire_healthcheck_connect_retry_budget_seconds"],
+            )
+        outcome = check.poll_readiness()
+        result = {
+            "changed": False,
+            "spire_healthcheck_healthy": outcome.succeeded,
+            "spire_healthcheck_polling": outcome.to_ansible_result_value(),
+            "debug_msg": str(func_log.messages)
+        }
+        if not outcome.succeeded:
+            result["spire_healthcheck_issue"] = str(outcome.last_value.issue)
+        module.exit_json(**result)
+    except Exception as e:
+        module.fail_json(msg=f"Exception while running module:{str(e)}", exception=e)
+
+
+def main() -> None:
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
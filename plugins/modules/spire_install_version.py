@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, Dict
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    logging,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.install_versions import (
+    activate_version,
+)
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: spire_install_version
+
+short_description: Activates a spire version of a versioned install directory
+
+version_added: "0.0.1"
+
+description:
+    - A versioned install directory keeps each version at <install_dir>/versions/<version>/bin
+    - The symlink <install_dir>/current is atomically switched to the activated version
+    - <install_dir>/bin is a stable symlink to current/bin, so executable path and service files do not change
+    - The bin directory of a former unversioned install is kept as version unversioned
+    - Rolling back to a retained version only takes switching the symlink and restarting the service
+
+options:
+    spire_install_dir:
+        description:
+            - the install directory
+        type: str
+        required: true
+    spire_install_version:
+        description:
+            - the version to activate
+        type: str
+        required: true
+    spire_install_exec_file_name:
+        description:
+            - the file name of the executable e.g. spire-agent
+        type: str
+        required: true
+    spire_install_versions_retention:
+        description:
+            - number of previously activated versions to keep
+        type: int
+        required: false
+        default: 2
+    spire_install_version_sha256:
+        description:
+            - only activate the version if its executable has this sha256
+            - the result has activated false if the version is not installed with that digest
+        type: str
+        required: false
+author:
+    - Patrice Congo (@congop)
+'''
+
+EXAMPLES = '''
+- name: Activate spire agent 0.12.0
+  io_patricecongo.spire.spire_install_version:
+    spire_install_dir: /opt/spire-agent
+    spire_install_version: "0.12.0"
+    spire_install_exec_file_name: spire-agent
+    spire_install_versions_retention: 2
+'''
+
+RETURN = '''
+spire_install_version:
+    description:
+        - the activation outcome
+    type: dict
+    returned: success
+    contains:
+        activated:
+            description:
+                - True if the version is the current one
+            type: bool
+        previous_version:
+            description:
+                - the version current was pointing at before
+            type: str
+        removed_versions:
+            description:
+                - the versions removed because of the retention
+            type: list
+            elements: str
+'''
+
+
+def _module_args() -> Dict[str, Dict[str, Any]]:
+    module_args = dict(
+        spire_install_dir=dict(type="str", required=True),
+        spire_install_version=dict(type="str", required=True),
+        spire_install_exec_file_name=dict(type="str", required=True),
+        spire_install_versions_retention=dict(type="int", required=False, default=2),
+        spire_install_version_sha256=dict(type="str", required=False),
+    )
+    return module_args
+
+
+def run_module() -> None:
+    module_args = _module_args()
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False
+    )
+    func_log = logging.CachingLogger(module.log)
+
+    try:
+        params = module.params
+        outcome = activate_version(
+            install_dir=params["spire_install_dir"],
+            version=params["spire_install_version"],
+            exec_file_name=params["spire_install_exec_file_name"],
+            retention=params["spire_install_versions_retention"],
+            only_if_sha256=params.get("spire_install_version_sha256"),
+        )
+        result = {
+            "changed": outcome.changed,
+            "spire_install_version": outcome.to_ansible_result_value(),
+            "debug_msg": str(func_log.messages)
+        }
+        module.exit_json(**result)
+    except Exception as e:
+        module.fail_json(msg=f"Exception while running module:{str(e)}", exception=e)
+
+
+def main() -> None:
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, Dict
+
+from ansible.module_utils.basic import AnsibleModule
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: spire_prestage
+
+short_description: Pre-stages the spire binary of a release on agent and server hosts
+
+version_added: "0.0.1"
+
+description:
+    - Downloads, verifies and extracts the release once on the controller and pushes the binary to
+      <install_dir>/versions/<version>/bin of the target, in parallel for all hosts using ansible forks
+    - Neither the running service nor its configuration is touched and the version is not activated
+    - A later spire_agent or spire_server run with spire_install_versions_retention set and the same version
+      finds the binary in place and only switches the current symlink and restarts the service
+    - The work is done by the action plugin on the controller, this module only carries the documentation
+      and the argument spec and fails if run on its own
+
+options:
+    spire_prestage_component:
+        description:
+            - the spire component whose binary is pre-staged
+        type: str
+        required: true
+        choices: [agent, server]
+    spire_prestage_version:
+        description:
+            - the spire version, must match spire_agent_version or spire_server_version of the later upgrade
+        type: str
+        required: true
+    spire_prestage_install_dir:
+        description:
+            - the install dir of the component, i.e. spire_agent_install_dir or spire_server_install_dir
+        type: str
+        required: true
+    spire_download_url:
+        description:
+            - url of the spire release
+        type: str
+        required: true
+    spire_download_sha256:
+        description:
+            - expected sha256 of the downloaded release
+        type: str
+        required: false
+    spire_download_sha256_url:
+        description:
+            - url of a sha256 sidecar file used to verify the release if spire_download_sha256 is not given
+        type: str
+        required: false
+    spire_download_cache_max_size_mb:
+        description:
+            - maximum size of the controller download cache
+        type: int
+        required: false
+        default: 1024
+    spire_download_validate_certs:
+        description:
+            - if false, the ssl certificates of spire_download_url and of its sha256 sidecar are not validated
+        type: bool
+        required: false
+        default: true
+    spire_download_use_proxy:
+        description:
+            - if false, the proxy environment variables (http_proxy, https_proxy, no_proxy)
+              of the downloading host (controller or spire_download_host) are ignored
+        type: bool
+        required: false
+        default: true
+    spire_download_client_cert:
+        description:
+            - PEM client certificate (path on the downloading host) used to authenticate the download
+            - may also hold the private key, see spire_download_client_key
+        type: path
+        required: false
+    spire_download_client_key:
+        description:
+            - PEM private key (path on the downloading host) of spire_download_client_cert
+        type: path
+        required: false
+    spire_download_headers:
+        description:
+            - additional http headers of the download requests
+        type: dict
+        required: false
+    spire_download_host:
+        description:
+            - inventory host downloading the release once for all targets instead of the controller
+            - the release is fetched and the binary extracted into spire_download_host_cache_dir of that host
+            - targets get the binary from spire_download_host_url if given, otherwise it is relayed
+              over the existing connections through the controller (transferred once per run)
+        type: str
+        required: false
+    spire_download_host_url:
+        description:
+            - base url of a file server serving spire_download_host_cache_dir of the download host
+            - targets then fetch the binary from it themselves, verified with its sha256
+        type: str
+        required: false
+    spire_download_host_cache_dir:
+        description:
+            - the cache dir used on the download host and, with spire_download_host_url, on the targets
+        type: str
+        required: false
+        default: /var/cache/io_patricecongo.spire
+    spire_binary_transfer_mode:
+        description:
+            - with compressed, the binary is transferred gzip compressed and verified on the target
+            - with copy, the binary is copied as is
+        type: str
+        required: false
+        default: compressed
+        choices: [compressed, copy]
+    spire_prestage_file_owner:
+        description:
+            - owner of the pre-staged binary and its directory
+            - the effective ansible user, if omitted
+        type: str
+        required: false
+    spire_prestage_dir_mode:
+        description:
+            - mode of the version bin directory
+        type: str
+        required: false
+        default: "u=rwx,g=rx,o=rx"
+    spire_prestage_file_mode_exe:
+        description:
+            - mode of the pre-staged binary
+        type: str
+        required: false
+        default: "u=rwx,g=rx,o=rx"
+author:
+    - Patrice Congo (@congop)
+'''
+
+EXAMPLES = '''
+- name: Pre-stage spire agent 0.12.0 ahead of the maintenance window
+  io_patricecongo.spire.spire_prestage:
+    spire_prestage_component: agent
+    spire_prestage_version: "0.12.0"
+    spire_prestage_install_dir: /opt/spire-agent
+    spire_download_url: https://github.com/spiffe/spire/releases/download/v0.12.0/spire-0.12.0-linux-x86_64-glibc.tar.gz
+    spire_download_sha256_url: https://github.com/spiffe/spire/releases/download/v0.12.0/spire-0.12.0-linux-x86_64-glibc.tar.gz.sha256
+'''
+
+RETURN = '''
+spire_prestage_path:
+    description:
+        - path of the pre-staged binary on the target
+    type: str
+    returned: success
+spire_prestage_sha256:
+    description:
+        - sha256 of the pre-staged binary
+    type: str
+    returned: success
+'''
+
+
+def _module_args() -> Dict[str, Dict[str, Any]]:
+    module_args = dict(
+        spire_prestage_component=dict(type="str", required=True, choices=["agent", "server"]),
+        spire_prestage_version=dict(type="str", required=True),
+        spire_prestage_install_dir=dict(type="str", required=True),
+        spire_download_url=dict(type="str", required=True),
+        spire_download_sha256=dict(type="str", required=False),
+        spire_download_sha256_url=dict(type="str", required=False),
+        spire_download_cache_max_size_mb=dict(type="int", required=False),
+        spire_download_validate_certs=dict(type="bool", required=False),
+        spire_download_use_proxy=dict(type="bool", required=False),
+        spire_download_client_cert=dict(type="path", required=False),
+        spire_download_client_key=dict(type="path", required=False),
+        spire_download_headers=dict(type="dict", required=False),
+        spire_download_host=dict(type="str", required=False),
+        spire_download_host_url=dict(type="str", required=False),
+        spire_download_host_cache_dir=dict(type="str", required=False),
+        spire_binary_transfer_mode=dict(
+            type="str", required=False, choices=["compressed", "copy"]),
+        spire_prestage_file_owner=dict(type="str", required=False),
+        spire_prestage_dir_mode=dict(type="str", required=False),
+        spire_prestage_file_mode_exe=dict(type="str", required=False),
+    )
+    return module_args
+
+
+def run_module() -> None:
+    # doc-only module: the action plugin (plugins/action/spire_prestage.py) never executes it on the target
+    module = AnsibleModule(
+        argument_spec=_module_args(),
+        supports_check_mode=True
+    )
+    module.fail_json(msg="spire_prestage is implemented by its action plugin and cannot run as module")
+
+
+def main() -> None:
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, Dict
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    logging,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.download_cache import (
+    UrlFetchOptions,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_batch import (
+    FileSpec,
+    install_local_file,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.release_fetch import (
+    fetch_release,
+)
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: spire_release_fetch
+
+short_description: Fetches a spire release into the download cache of the host
+
+version_added: "0.0.1"
+
+description:
+    - Downloads a spire release (or a file of it) once into the cache dir of the host and verifies its sha256
+    - Optionally extracts the binary from the release and installs the fetched file to a destination
+    - Used by the spire_agent, spire_server and spire_prestage actions on a distribution host
+      (spire_download_host) and, when the distribution host serves its cache dir (spire_download_host_url),
+      on the targets to get the binary from it
+
+options:
+    spire_fetch_url:
+        description:
+            - url of the file to fetch
+        type: str
+        required: true
+    spire_fetch_sha256:
+        description:
+            - expected sha256 of the fetched file
+        type: str
+        required: false
+    spire_fetch_sha256_url:
+        description:
+            - url of a sha256 sidecar file, only used if spire_fetch_sha256 is not given
+        type: str
+        required: false
+    spire_fetch_filename:
+        description:
+            - name of the cached file, default to the url file name
+        type: str
+        required: false
+    spire_fetch_cache_dir:
+        description:
+            - the cache dir of this host
+        type: str
+        required: true
+    spire_fetch_cache_max_size_mb:
+        description:
+            - maximum size of the downloads kept in the cache dir
+        type: int
+        required: false
+    spire_fetch_url_options:
+        description:
+            - get_url like options of the download (validate_certs, use_proxy, client_cert, client_key, headers)
+        type: dict
+        required: false
+    spire_fetch_member_suffix:
+        description:
+            - suffix of the tar member to extract from the fetched release, e.g. /bin/spire-agent
+        type: str
+        required: false
+    spire_fetch_dest:
+        description:
+            - where to install the extracted member, or the fetched file if no member is extracted
+        type: str
+        required: false
+    spire_fetch_mode:
+        description:
+            - mode of the installed file
+        type: str
+        required: false
+    spire_fetch_owner:
+        description:
+            - owner of the installed file
+        type: str
+        required: false
+author:
+    - Patrice Congo (@congop)
+'''
+
+EXAMPLES = '''
+- name: Fetch the release on the distribution host and extract the agent binary
+  io_patricecongo.spire.spire_release_fetch:
+    spire_fetch_url: https://github.com/spiffe/spire/releases/download/v0.12.0/spire-0.12.0-linux-x86_64-glibc.tar.gz
+    spire_fetch_sha256_url: https://github.com/spiffe/spire/releases/download/v0.12.0/spire-0.12.0-linux-x86_64-glibc.tar.gz.sha256
+    spire_fetch_cache_dir: /var/cache/io_patricecongo.spire
+    spire_fetch_member_suffix: /bin/spire-agent
+'''
+
+RETURN = '''
+spire_release_fetch:
+    description:
+        - the fetched release
+    type: dict
+    returned: success
+    contains:
+        path:
+            description:
+                - path of the fetched file
+            type: str
+        relpath:
+            description:
+                - path of the fetched file relative to the cache dir
+            type: str
+        sha256:
+            description:
+                - sha256 of the fetched file
+            type: str
+        downloaded:
+            description:
+                - False if the file was already in the cache
+            type: bool
+        member_path:
+            description:
+                - path of the extracted member
+            type: str
+        member_relpath:
+            description:
+                - path of the extracted member relative to the cache dir
+            type: str
+        member_sha256:
+            description:
+                - sha256 of the extracted member
+            type: str
+spire_release_fetch_dest:
+    description:
+        - outcome of the installation to spire_fetch_dest
+    type: dict
+    returned: when spire_fetch_dest is given
+'''
+
+
+def _module_args() -> Dict[str, Dict[str, Any]]:
+    module_args = dict(
+        spire_fetch_url=dict(type="str", required=True),
+        spire_fetch_sha256=dict(type="str", required=False),
+        spire_fetch_sha256_url=dict(type="str", required=False),
+        spire_fetch_filename=dict(type="str", required=False),
+        spire_fetch_cache_dir=dict(type="str", required=True),
+        spire_fetch_cache_max_size_mb=dict(type="int", required=False),
+        spire_fetch_url_options=dict(type="dict", required=False),
+        spire_fetch_member_suffix=dict(type="str", required=False),
+        spire_fetch_dest=dict(type="str", required=False),
+        spire_fetch_mode=dict(type="str", required=False),
+        spire_fetch_owner=dict(type="str", required=False),
+    )
+    return module_args
+
+
+def run_module() -> None:
+    module_args = _module_args()
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False
+    )
+    func_log = logging.CachingLogger(module.log)
+
+    try:
+        params = module.params
+        max_size_mb = params.get("spire_fetch_cache_max_size_mb")
+        fetched = fetch_release(
+            cache_dir=params["spire_fetch_cache_dir"],
+            url=params["spire_fetch_url"],
+            sha256=params.get("spire_fetch_sha256"),
+            sidecar_url=params.get("spire_fetch_sha256_url"),
+            filename=params.get("spire_fetch_filename"),
+            max_total_size=None if max_size_mb is None else max_size_mb * 1024 * 1024,
+            member_suffix=params.get("spire_fetch_member_suffix"),
+            url_options=UrlFetchOptions.from_ansible_param(params.get("spire_fetch_url_options")),
+        )
+        result: Dict[str, Any] = {
+            "changed": fetched.downloaded,
+            "spire_release_fetch": fetched.to_ansible_result_value(),
+            "debug_msg": str(func_log.messages)
+        }
+        dest = params.get("spire_fetch_dest")
+        if dest:
+            extracted = bool(params.get("spire_fetch_member_suffix"))
+            outcome = install_local_file(
+                module=module,
+                src=fetched.member_path if extracted else fetched.path,
+                spec=FileSpec(
+                    dest=dest, member=None,
+                    mode=params.get("spire_fetch_mode"),
+                    owner=params.get("spire_fetch_owner"),
+                    group=None,
+                    sha256=fetched.member_sha256 if extracted else fetched.sha256))
+            result["changed"] = result["changed"] or outcome.changed
+            result["spire_release_fetch_dest"] = outcome.to_ansible_result_value()
+        module.exit_json(**result)
+    except Exception as e:
+        module.fail_json(msg=f"Exception while running module:{str(e)}", exception=e)
+
+
+def main() -> None:
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
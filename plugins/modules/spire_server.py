@@ -24,7 +24,7 @@ import copy
 import pathlib
 
 import shutil
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_server_info_cmd import(
@@ -33,9 +33,13 @@ from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_server
     ServerStateSnapshot
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    digests,
     healthchecks,
     logging,
+    polling,
+    probes,
     spire_server_info_cmd,
+    startup_watch,
     systemd,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.ansible_module_cmd import (
@@ -219,6 +223,120 @@ options:
             - e.g. "file:///tmp/download/docker-spire-server/.download/spire-0.10.0-linux-x86_64-glibc.tar.gz"
             - e.g. "https://github.com/spiffe/spire/releases/download/v0.10.0/spire-0.10.0-linux-x86_64-glibc.tar.gz"
         required: true
+    spire_download_sha256:
+        description:
+            - expected sha256 hex digest of the spire distribution downloaded from spire_download_url
+        required: false
+    spire_download_sha256_url:
+        description:
+            - url of a sha256sum like file holding the digest of the spire distribution
+            - only used if spire_download_sha256 is not given
+            - the download is not verified if neither is given
+        required: false
+    spire_download_cache_max_size_mb:
+        description:
+            - size limit of the controller download cache; least recently used downloads are evicted first
+        required: false
+        default: 1024
+    spire_download_validate_certs:
+        description:
+            - if false, the ssl certificates of spire_download_url and of its sha256 sidecar are not validated
+        required: false
+        default: true
+    spire_download_use_proxy:
+        description:
+            - if false, the proxy environment variables (http_proxy, https_proxy, no_proxy)
+              of the downloading host (controller or spire_download_host) are ignored
+        required: false
+        default: true
+    spire_download_client_cert:
+        description:
+            - PEM client certificate (path on the downloading host) used to authenticate the download
+            - may also hold the private key, see spire_download_client_key
+        required: false
+    spire_download_client_key:
+        description:
+            - PEM private key (path on the downloading host) of spire_download_client_cert
+        required: false
+    spire_download_headers:
+        description:
+            - additional http headers of the download requests
+        required: false
+    spire_binary_transfer_mode:
+        description:
+            - how the spire binary is pushed to the target
+            - with compressed, a gzip compressed copy is transferred, decompressed on the target, checked against its sha256 and renamed into place
+            - with copy, the uncompressed binary is copied with the copy module
+        required: false
+        default: compressed
+        choices: [compressed, copy]
+    spire_upgrade_mode:
+        description:
+            - with in_place, files and binary are installed directly at their destination
+            - with staged, files and binary are uploaded next to their destination while the service keeps running,
+              then the service is stopped if needed, the staged files are renamed into place and the service is started
+            - staged always uses the bundle copy and the compressed binary transfer
+        required: false
+        default: in_place
+        choices: [in_place, staged]
+    spire_download_host:
+        description:
+            - inventory host downloading the release once for all targets instead of the controller
+            - the release is fetched and the binary extracted into spire_download_host_cache_dir of that host
+            - targets get the binary from spire_download_host_url if given, otherwise it is relayed
+              over the existing connections through the controller (transferred once per run)
+        type: str
+        required: false
+    spire_download_host_url:
+        description:
+            - base url of a file server serving spire_download_host_cache_dir of the download host
+            - targets then fetch the binary from it themselves, verified with its sha256
+        type: str
+        required: false
+    spire_download_host_cache_dir:
+        description:
+            - the cache dir used on the download host and, with spire_download_host_url, on the targets
+        type: str
+        required: false
+        default: /var/cache/io_patricecongo.spire
+    spire_install_versions_retention:
+        description:
+            - enables the versioned install layout if set
+            - each version is installed at <install_dir>/versions/<version>/bin and activated by atomically
+              switching the symlink <install_dir>/current, <install_dir>/bin becoming a symlink to current/bin
+            - the value is the number of previously activated versions kept, rolling back to one of those
+              only switches the symlink and restarts the service
+        type: int
+        required: false
+    spire_service_backend:
+        description:
+            - how the systemd service is managed on the target
+            - with systemctl, each query and each job forks systemctl
+            - with dbus, the systemd manager is called over one D-Bus connection and jobs are awaited
+              through their completion signal; it requires the python library jeepney on the target
+              and falls back to systemctl if it is missing, for the global scope or if a D-Bus call fails
+        required: false
+        default: systemctl
+        choices: [systemctl, dbus]
+    spire_state_fingerprint:
+        description:
+            - if true, a successful run records on the target the digest of its inputs (task args, templates,
+              action code) with a fingerprint of the target state (managed files and systemd unit state)
+            - a later run with the same inputs whose target state fingerprint still matches returns the recorded
+              result unchanged, with spire_state_fingerprint_fast_path set, without any further remote call
+            - the fingerprint does not cover changes outside of the managed files and unit state
+              (e.g. a rotated server bundle or an evicted agent)
+        type: bool
+        required: false
+        default: false
+    spire_install_files_copy_mode:
+        description:
+            - how the service files (conf, env, systemd unit, ...) are copied to the target
+            - with bundle, all files needing a change are packed into one archive, transferred once and installed atomically
+            - with per_file, each file is copied with its own copy task
+        required: false
+        default: bundle
+        choices: [bundle, per_file]
 
     spire_server_plugins:
         description:
@@ -378,6 +496,16 @@ info:
                 - the spire server executable  path
             returned: success
             type: str
+        spire_server_executable_sha256:
+            description:
+                - sha256 of the spire server executable
+            returned: success
+            type: str
+        spire_server_executable_sha256_issue:
+            description:
+                - Any issue which prevented the computation of the spire server executable sha256
+            returned: success
+            type: str
         spire_server_trust_domain_id:
             description:
                 - the spire server trust domain id
@@ -459,6 +587,16 @@ info:
                 - Any issue which prevented the computation of the spire server configuration file
             returned: success
             type: str
+        spire_server_hexdigest_env_file:
+            description:
+                - the digest of the normalized spire server env file
+            returned: success
+            type: str
+        spire_server_hexdigest_env_file_issue:
+            description:
+                - Any issue which prevented the computation of the spire server env file digest
+            returned: success
+            type: str
         spire_server_file_stats:
             description:
                 - holds file state about file and directories of interest
@@ -466,6 +604,20 @@ info:
                 - e.g. for install dir, config dir, data dir,
             returned: success
             type: complex
+
+readiness_wait:
+    description:
+        - polling outcome of the wait for the service to become healthy
+        - with the start offset, duration and result of each readiness probe attempt
+    type: dict
+    returned: when the module waited for the service to become healthy
+
+spire_state_fingerprint_fast_path:
+    description:
+        - true if the result recorded by the last successful run was returned because neither the inputs
+          nor the target state changed since then
+    type: bool
+    returned: when spire_state_fingerprint is true and the fast path is taken
 '''
 
 def _module_args() -> Dict[str, Dict[str,Any]]:
@@ -525,6 +677,27 @@ def _module_args() -> Dict[str, Dict[str,Any]]:
             type="list", elements="json", required=True, defaults=5),
 
         spire_download_url=dict(type="str", required=True),
+        spire_download_sha256=dict(type="str", required=False),
+        spire_download_sha256_url=dict(type="str", required=False),
+        spire_download_cache_max_size_mb=dict(type="int", required=False),
+        spire_download_validate_certs=dict(type="bool", required=False),
+        spire_download_use_proxy=dict(type="bool", required=False),
+        spire_download_client_cert=dict(type="path", required=False),
+        spire_download_client_key=dict(type="path", required=False),
+        spire_download_headers=dict(type="dict", required=False),
+        spire_binary_transfer_mode=dict(
+            type="str", required=False, choices=["compressed", "copy"]),
+        spire_upgrade_mode=dict(
+            type="str", required=False, choices=["in_place", "staged"]),
+        spire_download_host=dict(type="str", required=False),
+        spire_download_host_url=dict(type="str", required=False),
+        spire_download_host_cache_dir=dict(type="str", required=False),
+        spire_install_versions_retention=dict(type="int", required=False),
+        spire_install_files_copy_mode=dict(
+            type="str", required=False, choices=["bundle", "per_file"]),
+        spire_state_fingerprint=dict(type="bool", required=False, default=False),
+        spire_service_backend=dict(
+            type="str", required=False, default="systemctl", choices=["systemctl", "dbus"]),
 
         spire_server_ca_key_type=dict(
             type="str", required=True,
@@ -561,7 +734,8 @@ def _server_info_from_module_params(
             registration_uds_path=params["spire_server_registration_uds_path"],
             service_name=params["spire_server_service_name"],
             service_scope=params["spire_server_service_scope"],
-            expected_version=params["spire_server_version"]
+            expected_version=params["spire_server_version"],
+            service_backend=params["spire_service_backend"],
         )
     return server_info
 
@@ -576,6 +750,7 @@ def run_module() -> None:
     params: Params = Params(copy.deepcopy(module.params))
     func_run_command = RunCommand(module)
     func_log = logging.CachingLogger(module.log)
+    readiness_wait: Optional[polling.PollOutcome] = None
 
     try:
         assert_not_handling_check_mode_since_action_reponsibility(module)
@@ -598,7 +773,8 @@ def run_module() -> None:
                 service_name=module.params["spire_server_service_name"],
                 scope=systemd.Scope.by_name(module.params["spire_server_service_scope"]),
                 run_command=func_run_command,
-                log_func=func_log
+                log_func=func_log,
+                service_backend=module.params["spire_service_backend"],
             )
             if expected_state.state == State.absent:
                 service.teardown_service()
@@ -629,6 +805,9 @@ def run_module() -> None:
                         if expected_state.substate_service_status == SubStateServiceStatus.stopped:
                             service.stop()
                         else:  # started or healthy
+                            watch = startup_watch.StartupFailureWatch(
+                                unit_state_func=service.unit_state,
+                                log_file=startup_watch.configured_log_file(server_dirs.path_conf_file))
                             service.start()
                             if expected_state.substate_service_status == SubStateServiceStatus.healthy:
                                 timeout = module.params["spire_server_healthiness_probe_timeout_seconds"]
@@ -636,16 +815,12 @@ def run_module() -> None:
                                     run_command=func_run_command,
                                     file_spire_server_bin=server_info.get_executable_path(),
                                     readiness_probe_timeout_seconds=timeout,
-                                    registration_uds_path=module.params["spire_server_registration_uds_path"]
+                                    registration_uds_path=module.params["spire_server_registration_uds_path"],
+                                    startup_watch=watch,
                                 )
-                                healthcheck.wait_for_readiness()
+                                readiness_wait = healthcheck.wait_for_readiness()
 
-            server_info = _server_info_from_module_params(
-                run_command=func_run_command,
-                log_func=func_log,
-                server_dirs=server_dirs,
-                params=params
-            )
+            server_info.reset_computed_base_state()
             state_snapshot = spire_server_info_cmd.ServerStateSnapshot(server_info)
         current_state = state_snapshot.get_state_of_server()
         func_log(f"issues = {state_snapshot.get_all_issues()}")
@@ -655,9 +830,15 @@ def run_module() -> None:
             "info": state_snapshot.to_ansible_result(),
             "debug_msg": func_log.messages,
         }
+        if readiness_wait is not None:
+            result["readiness_wait"] = readiness_wait.to_ansible_result_value()
+        probes.wait_for_straggling_probes()
+        digests.flush_digest_caches()
         module.exit_json(**result)
     except Exception as e:
         print(func_log.messages)
+        probes.wait_for_straggling_probes()
+        digests.flush_digest_caches()
         module.fail_json(
             msg=f"Exception while running module:{str(e)}",
             exception=e,
@@ -27,7 +27,9 @@ from typing import Any, Dict
 from ansible.module_utils.basic import AnsibleModule
 
 from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    digests,
     logging,
+    probes,
 )
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.ansible_module_cmd import RunCommand
 from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_server_info_cmd import (
@@ -145,6 +147,17 @@ spire_server_executable_path:
         - the spire server executable  path
     returned: success
     type: str
+spire_server_executable_sha256:
+    description:
+        - sha256 of the spire server executable
+        - cached on the target by inode, mtime and size
+    returned: success
+    type: str
+spire_server_executable_sha256_issue:
+    description:
+        - Any issue which prevented the computation of the spire server executable sha256
+    returned: success
+    type: str
 spire_server_trust_domain_id:
     description:
         - the spire server trust domain id
@@ -226,6 +239,16 @@ spire_server_hexdigest_config_file_issue:
         - Any issue which prevented the computation of the spire server configuration file
     returned: success
     type: str
+spire_server_hexdigest_env_file:
+    description:
+        - the digest of the normalized spire server env file
+    returned: success
+    type: str
+spire_server_hexdigest_env_file_issue:
+    description:
+        - Any issue which prevented the computation of the spire server env file digest
+    returned: success
+    type: str
 spire_server_file_stats:
     description:
         - holds file state about file and directories of interest
@@ -281,8 +304,12 @@ def run_module() -> None:
             "debug_msg": str(func_log.messages)
         }
 
+        probes.wait_for_straggling_probes()
+        digests.flush_digest_caches()
         module.exit_json(**result)
     except Exception as e:
+        probes.wait_for_straggling_probes()
+        digests.flush_digest_caches()
         module.fail_json(
             f"Exception while running module:{func_log.messages}",
             exception=e,
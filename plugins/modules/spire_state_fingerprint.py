@@ -0,0 +1,216 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, Dict
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.io_patricecongo.spire.plugins.module_utils import (
+    logging,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.ansible_module_cmd import (
+    RunCommand,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.digests import (
+    FileDigestCache,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.state_fingerprint import (
+    FingerprintRecord,
+    compute_state_fingerprint,
+    read_record,
+    write_record,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.systemd import (
+    Scope,
+    query_unit_state,
+)
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: spire_state_fingerprint
+
+short_description: Computes and records the fingerprint of the state of a spire component on the target
+
+version_added: "0.0.1"
+
+description:
+    - The fingerprint covers stat data (mode, owner) and sha256 of the managed files and the systemd unit state
+    - It is computed in a single module execution with one systemctl call, unchanged files not being read again
+      thanks to the digest cache
+    - Used by the spire_agent and spire_server actions to return early when neither their inputs
+      nor the target state changed since the last successful run
+
+options:
+    spire_fingerprint_files:
+        description:
+            - the managed files
+        type: list
+        elements: str
+        required: true
+    spire_fingerprint_service_name:
+        description:
+            - the systemd service name
+        type: str
+        required: true
+    spire_fingerprint_service_scope:
+        description:
+            - the scope of the systemd service
+        type: str
+        required: false
+        default: system
+        choices: [user, system, global]
+    spire_fingerprint_record_path:
+        description:
+            - the file the fingerprint record is read from and written to
+        type: str
+        required: true
+    spire_fingerprint_digest_cache_path:
+        description:
+            - the digest cache file, used to avoid reading again files unchanged since the previous run
+        type: str
+        required: true
+    spire_fingerprint_record:
+        description:
+            - if true the current fingerprint is recorded with spire_fingerprint_inputs_digest and spire_fingerprint_result
+        type: bool
+        required: false
+        default: false
+    spire_fingerprint_inputs_digest:
+        description:
+            - digest of the inputs of the run which produced the current state, required to record
+        type: str
+        required: false
+    spire_fingerprint_result:
+        description:
+            - the result of the run which produced the current state, returned again by runs taking the fast path
+        type: dict
+        required: false
+author:
+    - Patrice Congo (@congop)
+'''
+
+EXAMPLES = '''
+- name: Record the state fingerprint of the spire agent
+  io_patricecongo.spire.spire_state_fingerprint:
+    spire_fingerprint_files:
+        - /etc/spire-agent/agent.conf
+        - /opt/spire-agent/bin/spire-agent
+    spire_fingerprint_service_name: spire_agent.service
+    spire_fingerprint_record_path: /var/lib/spire-agent/.spire-ansible-state-fingerprint.json
+    spire_fingerprint_digest_cache_path: /var/lib/spire-agent/.spire-ansible-digests.json
+    spire_fingerprint_record: true
+    spire_fingerprint_inputs_digest: 3f2a...
+'''
+
+RETURN = '''
+spire_state_fingerprint:
+    description:
+        - the fingerprint of the current state
+    type: str
+    returned: success
+spire_state_fingerprint_record:
+    description:
+        - the record found before this execution, with inputs_digest, state_fingerprint and result
+    type: dict
+    returned: when a record exists
+'''
+
+
+def _module_args() -> Dict[str, Dict[str, Any]]:
+    module_args = dict(
+        spire_fingerprint_files=dict(type="list", elements="str", required=True),
+        spire_fingerprint_service_name=dict(type="str", required=True),
+        spire_fingerprint_service_scope=dict(
+            type="str", required=False, default="system", choices=["user", "system", "global"]),
+        spire_fingerprint_record_path=dict(type="str", required=True),
+        spire_fingerprint_digest_cache_path=dict(type="str", required=True),
+        spire_fingerprint_record=dict(type="bool", required=False, default=False),
+        spire_fingerprint_inputs_digest=dict(type="str", required=False),
+        spire_fingerprint_result=dict(type="dict", required=False),
+    )
+    return module_args
+
+
+def run_module() -> None:
+    module_args = _module_args()
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+        required_if=[("spire_fingerprint_record", True, ["spire_fingerprint_inputs_digest"])],
+    )
+    func_run_command = RunCommand(module)
+    func_log = logging.CachingLogger(module.log)
+
+    try:
+        params = module.params
+        service_name: str = params["spire_fingerprint_service_name"]
+        if not service_name.endswith(".service"):
+            service_name = f"{service_name}.service"
+        unit_state, issue = query_unit_state(
+            run_command=func_run_command,
+            service_fullname=service_name,
+            service_scope=Scope.by_name(params["spire_fingerprint_service_scope"]))
+        if unit_state is None:
+            func_log(f"unit state not available: {issue}")
+        digest_cache = FileDigestCache(params["spire_fingerprint_digest_cache_path"])
+        fingerprint = compute_state_fingerprint(
+            files=params["spire_fingerprint_files"],
+            unit_state=unit_state,
+            digest_cache=digest_cache)
+        digest_cache.flush()
+        record_path: str = params["spire_fingerprint_record_path"]
+        previous_record = read_record(record_path)
+
+        changed = False
+        if params["spire_fingerprint_record"] and not module.check_mode:
+            new_record = FingerprintRecord(
+                inputs_digest=params["spire_fingerprint_inputs_digest"],
+                state_fingerprint=fingerprint,
+                result=params.get("spire_fingerprint_result") or {})
+            changed = new_record != previous_record
+            if changed:
+                write_record(record_path, new_record)
+
+        result = {
+            "changed": changed,
+            "spire_state_fingerprint": fingerprint,
+            "debug_msg": str(func_log.messages)
+        }
+        if previous_record is not None:
+            result["spire_state_fingerprint_record"] = previous_record.to_ansible_result_value()
+        module.exit_json(**result)
+    except Exception as e:
+        module.fail_json(msg=f"Exception while running module:{str(e)}", exception=e)
+
+
+def main() -> None:
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
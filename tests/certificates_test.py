@@ -0,0 +1,131 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from datetime import datetime, timedelta, timezone
+import pathlib
+from typing import Tuple
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509 import Certificate
+from cryptography.x509.oid import NameOID
+import pytest
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.certificates import (
+    split_der_certificates,
+    verify_svid,
+)
+
+NOW = datetime(2021, 6, 1, tzinfo=timezone.utc)
+
+
+def _make_cert(
+        common_name: str,
+        issuer: Tuple[Certificate, ec.EllipticCurvePrivateKey] = None,
+        not_after: datetime = NOW + timedelta(hours=1),
+) -> Tuple[Certificate, ec.EllipticCurvePrivateKey]:
+    key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    issuer_name, signing_key = (subject, key) if issuer is None else (issuer[0].subject, issuer[1])
+    cert = x509.CertificateBuilder() \
+        .subject_name(subject) \
+        .issuer_name(issuer_name) \
+        .public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(NOW - timedelta(hours=1)) \
+        .not_valid_after(not_after) \
+        .add_extension(
+            x509.SubjectAlternativeName([x509.UniformResourceIdentifier(f"spiffe://example.org/{common_name}")]),
+            critical=False) \
+        .sign(signing_key, hashes.SHA256(), default_backend())
+    return cert, key
+
+
+def _write_der(path: pathlib.Path, *certs: Certificate) -> str:
+    path.write_bytes(b"".join(cert.public_bytes(serialization.Encoding.DER) for cert in certs))
+    return str(path)
+
+
+def test_split_der_certificates() -> None:
+    root, _ = _make_cert("root")
+    other, _ = _make_cert("other")
+    ders = [c.public_bytes(serialization.Encoding.DER) for c in [root, other]]
+
+    assert ders == split_der_certificates(b"".join(ders))
+    with pytest.raises(ValueError):
+        split_der_certificates(ders[0][:-1])
+
+
+def test_verify_svid_signed_by_bundle_root(tmp_path: pathlib.Path) -> None:
+    root = _make_cert("root")
+    svid, _ = _make_cert("agent", issuer=root, not_after=NOW + timedelta(minutes=30))
+    svid_path = _write_der(tmp_path / "agent_svid.der", svid)
+    bundle_path = _write_der(tmp_path / "bundle.der", _make_cert("old-root")[0], root[0])
+
+    not_after, issue = verify_svid(svid_path, bundle_path, NOW)
+
+    assert issue is None
+    assert NOW + timedelta(minutes=30) == not_after
+
+
+def test_verify_svid_through_intermediate(tmp_path: pathlib.Path) -> None:
+    root = _make_cert("root")
+    intermediate = _make_cert("intermediate", issuer=root)
+    svid, _ = _make_cert("agent", issuer=intermediate)
+    svid_path = _write_der(tmp_path / "agent_svid.der", svid, intermediate[0])
+    bundle_path = _write_der(tmp_path / "bundle.der", root[0])
+
+    assert verify_svid(svid_path, bundle_path, NOW)[1] is None
+
+
+def test_verify_svid_of_other_trust_chain_fails(tmp_path: pathlib.Path) -> None:
+    svid, _ = _make_cert("agent", issuer=_make_cert("root"))
+    svid_path = _write_der(tmp_path / "agent_svid.der", svid)
+    bundle_path = _write_der(tmp_path / "bundle.der", _make_cert("root")[0])
+
+    not_after, issue = verify_svid(svid_path, bundle_path, NOW)
+
+    assert not_after is not None
+    assert "does not chain up" in issue
+
+
+def test_verify_expired_svid_fails(tmp_path: pathlib.Path) -> None:
+    root = _make_cert("root")
+    svid, _ = _make_cert("agent", issuer=root, not_after=NOW - timedelta(minutes=1))
+    svid_path = _write_der(tmp_path / "agent_svid.der", svid)
+    bundle_path = _write_der(tmp_path / "bundle.der", root[0])
+
+    _, issue = verify_svid(svid_path, bundle_path, NOW)
+
+    assert "not valid at" in issue
+
+
+def test_verify_missing_svid_fails(tmp_path: pathlib.Path) -> None:
+    bundle_path = _write_der(tmp_path / "bundle.der", _make_cert("root")[0])
+
+    not_after, issue = verify_svid(str(tmp_path / "agent_svid.der"), bundle_path, NOW)
+
+    assert not_after is None
+    assert "does not exists" in issue
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,120 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+from typing import List
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.change_plan import (
+    ChangeKind,
+    Disruption,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.diffs import (
+    DigestDiff,
+    StrResourceDiff,
+    VersionDiff,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_stat import FileStatDiff
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_action_base import (
+    DiffSpireCmptActualExpected,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing import (
+    State,
+    StateOfAgent,
+    StateOfAgentDiff,
+    SubStateAgentRegistered,
+    SubStateServiceInstallation,
+    SubStateServiceStatus,
+)
+import pytest
+
+EXE = "/opt/spire-agent/bin/spire-agent"
+CONF = "/etc/spire-agent/agent.conf"
+SERVICE = "/etc/systemd/system/spire_agent.service"
+
+
+def _state(status: SubStateServiceStatus) -> StateOfAgent:
+    return StateOfAgent(
+        state=State.present,
+        substate_service_installation=SubStateServiceInstallation.enabled,
+        substate_service_status=status,
+        substate_agent_registered=SubStateAgentRegistered.yes)
+
+
+def _diff(
+        file_attrs: List[FileStatDiff] = None,
+        file_contents: List[DigestDiff] = None,
+        exe_version_expected: str = "1.0.0",
+        scope_expected: str = "system",
+        status_expected: SubStateServiceStatus = SubStateServiceStatus.healthy,
+) -> DiffSpireCmptActualExpected:
+    return DiffSpireCmptActualExpected(
+        file_attrs=file_attrs or [],
+        file_contents=file_contents or [],
+        exe_versions=[VersionDiff(EXE, "1.0.0", exe_version_expected)],
+        state_diff=StateOfAgentDiff(
+            actual=_state(SubStateServiceStatus.healthy), expected=_state(status_expected)),
+        scope_diff=StrResourceDiff("spire-agent-service-scope", "system", scope_expected),
+    )
+
+
+def _plan(diff: DiffSpireCmptActualExpected, binary_swap_is_atomic: bool = True):
+    return diff.plan(path_executable=EXE, path_service_file=SERVICE, binary_swap_is_atomic=binary_swap_is_atomic)
+
+
+def test_plan_attrs_only_change_needs_no_interruption() -> None:
+    plan = _plan(_diff(file_attrs=[FileStatDiff("/var/log/spire", False, {("mode", 0o755)}, {("mode", 0o750)})]))
+
+    assert Disruption.none == plan.disruption
+    assert [ChangeKind.file_attrs] == [change.kind for change in plan.changes]
+    assert (False, False) == (plan.need_stop_before_change(), plan.need_restart_after_change())
+
+
+def test_plan_state_only_change_needs_no_interruption() -> None:
+    plan = _plan(_diff(status_expected=SubStateServiceStatus.stopped))
+
+    assert Disruption.none == plan.disruption
+    assert [ChangeKind.state] == [change.kind for change in plan.changes]
+
+
+def test_plan_config_and_atomic_binary_change_need_restart() -> None:
+    plan = _plan(_diff(
+        file_contents=[DigestDiff(CONF, "a", "b"), DigestDiff(SERVICE, "c", "c")],
+        exe_version_expected="1.1.0"))
+
+    assert Disruption.restart == plan.disruption
+    assert plan.need_restart_after_change()
+    assert {CONF: ChangeKind.file_content, EXE: ChangeKind.binary} == {
+        change.resource_id: change.kind for change in plan.changes}
+
+
+@pytest.mark.parametrize(
+    "diff,binary_swap_is_atomic",
+    [
+        (_diff(exe_version_expected="1.1.0"), False),
+        (_diff(file_contents=[DigestDiff(SERVICE, "c", "d")]), True),
+        (_diff(scope_expected="user"), True),
+    ]
+)
+def test_plan_stop_before_change(diff: DiffSpireCmptActualExpected, binary_swap_is_atomic: bool) -> None:
+    plan = _plan(diff, binary_swap_is_atomic=binary_swap_is_atomic)
+
+    assert Disruption.stop == plan.disruption
+    assert plan.need_stop_before_change()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,187 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import hashlib
+import json
+import os
+import pathlib
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.digests import (
+    FileDigestCache,
+    digest_env_file,
+    flush_digest_caches,
+    digest_hcl_file,
+    digest_pem_bundle_file,
+)
+import pytest
+
+
+def test_file_digest_cache_reuses_digest_of_unchanged_file(tmp_path: pathlib.Path) -> None:
+    binary = tmp_path / "spire-agent"
+    binary.write_bytes(b"agent-binary")
+    cache_file = str(tmp_path / "digests.json")
+    calls = []
+
+    def counting_digest(path: str) -> str:
+        calls.append(path)
+        return hashlib.sha256(pathlib.Path(path).read_bytes()).hexdigest()
+
+    first = FileDigestCache(cache_file).digest(str(binary), "sha256", counting_digest)
+    flush_digest_caches()
+    second = FileDigestCache(cache_file).digest(str(binary), "sha256", counting_digest)
+
+    assert hashlib.sha256(b"agent-binary").hexdigest() == first == second
+    assert [str(binary)] == calls
+    assert str(binary) in json.loads(pathlib.Path(cache_file).read_text())
+
+
+def test_file_digest_cache_recomputes_digest_of_replaced_file(tmp_path: pathlib.Path) -> None:
+    binary = tmp_path / "spire-agent"
+    binary.write_bytes(b"agent-binary")
+    cache = FileDigestCache(str(tmp_path / "digests.json"))
+    before, _ = cache.sha256(str(binary))
+
+    replacement = tmp_path / "spire-agent.new"
+    replacement.write_bytes(b"agent-binary-v2")
+    os.replace(replacement, binary)
+    after, _ = cache.sha256(str(binary))
+
+    assert hashlib.sha256(b"agent-binary-v2").hexdigest() == after != before
+
+
+def test_file_digest_cache_reports_missing_file(tmp_path: pathlib.Path) -> None:
+    cache = FileDigestCache(str(tmp_path / "not-existing-dir" / "digests.json"))
+
+    assert (None, f"file does not exists: {tmp_path / 'nope'}") == cache.sha256(str(tmp_path / "nope"))
+
+
+def test_file_digest_cache_keeps_parsed_facts_of_unchanged_file(tmp_path: pathlib.Path) -> None:
+    cert = tmp_path / "bundle.der"
+    cert.write_bytes(b"der-bytes")
+    cache_file = str(tmp_path / "digests.json")
+    calls = []
+
+    def counting_parse(path: str) -> list:
+        calls.append(path)
+        return ["spiffe://example.org", 42, None]
+
+    first = FileDigestCache(cache_file).fact(str(cert), "cert_san", counting_parse)
+    flush_digest_caches()
+    second = FileDigestCache(cache_file).fact(str(cert), "cert_san", counting_parse)
+
+    assert ["spiffe://example.org", 42, None] == first == second
+    assert [str(cert)] == calls
+
+
+def test_file_digest_cache_keeps_facts_of_several_kinds(tmp_path: pathlib.Path) -> None:
+    conf = tmp_path / "agent.conf"
+    conf.write_text('agent {\n  trust_domain = "example.org"\n}\n')
+    cache_file = str(tmp_path / "digests.json")
+    cache = FileDigestCache(cache_file)
+
+    hcl_digest = cache.hcl_digest(str(conf))
+    sha256, _ = cache.sha256(str(conf))
+    cache.flush()
+
+    assert digest_hcl_file(str(conf)) == hcl_digest
+    facts = json.loads(pathlib.Path(cache_file).read_text())[str(conf)]["facts"]
+    assert {"hcl": hcl_digest, "sha256": sha256} == facts
+    assert hcl_digest == FileDigestCache(cache_file).hcl_digest(str(conf))
+
+
+def test_file_digest_cache_written_once_and_only_if_changed(tmp_path: pathlib.Path) -> None:
+    files = [tmp_path / name for name in ["spire-agent", "agent.conf", "bundle.der"]]
+    for f in files:
+        f.write_bytes(f.name.encode())
+    cache_file = tmp_path / "digests.json"
+    cache = FileDigestCache(str(cache_file))
+
+    for f in files:
+        cache.sha256(str(f))
+    assert not cache_file.exists(), "facts are only written by flush"
+    flush_digest_caches()
+    written = os.stat(str(cache_file)).st_mtime_ns
+
+    cache = FileDigestCache(str(cache_file))
+    for f in files:
+        cache.sha256(str(f))
+    cache.flush()
+
+    assert 3 == len(json.loads(cache_file.read_text()))
+    assert written == os.stat(str(cache_file)).st_mtime_ns, "nothing changed, nothing written"
+
+
+def test_file_digest_cache_ignores_entries_of_previous_format(tmp_path: pathlib.Path) -> None:
+    binary = tmp_path / "spire-agent"
+    binary.write_bytes(b"agent-binary")
+    st = os.stat(str(binary))
+    cache_file = tmp_path / "digests.json"
+    cache_file.write_text(json.dumps({
+        str(binary): {"key": [st.st_ino, st.st_mtime_ns, st.st_size], "digests": {"sha256": "stale"}}
+    }))
+
+    digest, _ = FileDigestCache(str(cache_file)).sha256(str(binary))
+
+    assert hashlib.sha256(b"agent-binary").hexdigest() == digest
+
+
+def test_digest_env_file_masks_join_token(tmp_path: pathlib.Path) -> None:
+    env_a = tmp_path / "a.env"
+    env_a.write_text("spire_agent_join_token='token-a'\n")
+    env_b = tmp_path / "b.env"
+    env_b.write_text("# minted on a later run\n\n  spire_agent_join_token='token-b'  \n")
+    env_c = tmp_path / "c.env"
+    env_c.write_text("spire_agent_join_token='token-a'\nOTHER=1\n")
+
+    assert digest_env_file(str(env_a)) == digest_env_file(str(env_b))
+    assert digest_env_file(str(env_a)) != digest_env_file(str(env_c))
+
+
+def test_digest_env_file_digests_unmasked_values(tmp_path: pathlib.Path) -> None:
+    env_a = tmp_path / "a.env"
+    env_a.write_text("OTHER=1\n")
+    env_b = tmp_path / "b.env"
+    env_b.write_text("OTHER=2\n")
+
+    assert digest_env_file(str(env_a)) != digest_env_file(str(env_b))
+
+
+_PEM_A = "-----BEGIN CERTIFICATE-----\nMIIBAAAA\nBBBBCCCC\n-----END CERTIFICATE-----\n"
+_PEM_B = "-----BEGIN CERTIFICATE-----\nMIIBDDDD\n-----END CERTIFICATE-----\n"
+
+
+def test_digest_pem_bundle_file_ignores_order_and_wrapping(tmp_path: pathlib.Path) -> None:
+    bundle = tmp_path / "bundle.pem"
+    bundle.write_text(_PEM_A + _PEM_B)
+    reordered = tmp_path / "reordered.pem"
+    reordered.write_text("bundle show output\n" + _PEM_B + _PEM_A.replace("MIIBAAAA\nBBBB", "MIIBAAAABBBB"))
+
+    assert digest_pem_bundle_file(str(bundle)) == digest_pem_bundle_file(str(reordered))
+
+
+def test_digest_pem_bundle_file_detects_rotated_certificate(tmp_path: pathlib.Path) -> None:
+    bundle = tmp_path / "bundle.pem"
+    bundle.write_text(_PEM_A)
+    rotated = tmp_path / "rotated.pem"
+    rotated.write_text(_PEM_A + _PEM_B)
+
+    assert digest_pem_bundle_file(str(bundle)) != digest_pem_bundle_file(str(rotated))
+
+
+if __name__ == '__main__':
+    pytest.main()
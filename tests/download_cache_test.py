@@ -0,0 +1,188 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import hashlib
+import http.server
+import os
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Generator, List
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.download_cache import (
+    DownloadCache,
+    UrlFetchOptions,
+    fetch_with_open_url,
+    parse_sha256_sidecar,
+    release_entries_in_use,
+)
+import pytest
+
+DIST = b"spire-dist-content" * 1024
+DIST_SHA256 = hashlib.sha256(DIST).hexdigest()
+
+
+class _StandInServer:
+    def __init__(self, files: Dict[str, bytes]) -> None:
+        self.files = files
+        self.requests: List[str] = []
+        self.headers: List[Dict[str, str]] = []
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                stand_in.requests.append(self.path)
+                stand_in.headers.append(dict(self.headers))
+                data = stand_in.files.get(self.path)
+                if data is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+
+@pytest.fixture(autouse=True)
+def entries_released() -> Generator[None, None, None]:
+    yield
+    release_entries_in_use()
+
+
+@pytest.fixture
+def server() -> Generator[_StandInServer, None, None]:
+    stand_in = _StandInServer({
+        "/spire.tar.gz": DIST,
+        "/spire.tar.gz.sha256": f"{DIST_SHA256}  spire.tar.gz\n".encode(),
+        "/other.tar.gz": b"other" * 1024,
+    })
+    yield stand_in
+    stand_in.httpd.shutdown()
+    stand_in.httpd.server_close()
+
+
+def test_get_downloads_once_and_verifies_sidecar(server: _StandInServer, tmp_path: pathlib.Path) -> None:
+    cache = DownloadCache(cache_dir=str(tmp_path))
+
+    first = cache.get(server.url("/spire.tar.gz"), sidecar_url=server.url("/spire.tar.gz.sha256"))
+    second = cache.get(server.url("/spire.tar.gz"), sha256=DIST_SHA256)
+
+    assert (True, False) == (first.downloaded, second.downloaded)
+    assert first.path == second.path
+    assert (DIST_SHA256, DIST) == (second.sha256, pathlib.Path(second.path).read_bytes())
+    assert ["/spire.tar.gz.sha256", "/spire.tar.gz"] == server.requests
+
+
+def test_lookup_never_downloads(server: _StandInServer, tmp_path: pathlib.Path) -> None:
+    cache = DownloadCache(cache_dir=str(tmp_path))
+
+    assert cache.lookup(server.url("/spire.tar.gz")) is None
+    cache.get(server.url("/spire.tar.gz"), sha256=DIST_SHA256)
+    cached = cache.lookup(server.url("/spire.tar.gz"))
+
+    assert cached is not None and (DIST_SHA256, False) == (cached.sha256, cached.downloaded)
+    assert cache.lookup(server.url("/spire.tar.gz"), sha256="00" * 32) is None
+    assert ["/spire.tar.gz"] == server.requests
+
+
+def test_get_rejects_digest_mismatch(server: _StandInServer, tmp_path: pathlib.Path) -> None:
+    cache = DownloadCache(cache_dir=str(tmp_path))
+
+    with pytest.raises(RuntimeError, match="sha256 mismatch"):
+        cache.get(server.url("/spire.tar.gz"), sha256="0" * 64)
+
+    assert [] == [f for _, _, files in os.walk(tmp_path) for f in files if f.startswith("spire")]
+
+
+def test_get_is_single_flight_across_concurrent_callers(server: _StandInServer, tmp_path: pathlib.Path) -> None:
+    def get_dist(_: int) -> str:
+        return DownloadCache(cache_dir=str(tmp_path)).get(server.url("/spire.tar.gz")).path
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = set(executor.map(get_dist, range(16)))
+
+    assert 1 == len(paths)
+    assert ["/spire.tar.gz"] == server.requests
+
+
+def test_get_evicts_least_recently_used(server: _StandInServer, tmp_path: pathlib.Path) -> None:
+    cache = DownloadCache(cache_dir=str(tmp_path), max_total_size=len(DIST) + 1024)
+
+    dist = cache.get(server.url("/spire.tar.gz"))
+    os.utime(os.path.dirname(dist.path), (0, 0))
+    release_entries_in_use()
+    other = cache.get(server.url("/other.tar.gz"))
+
+    assert not os.path.exists(dist.path)
+    assert os.path.exists(other.path)
+    other_entry = os.path.dirname(other.path)
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        os.path.basename(path) for path in [other_entry, f"{other_entry}.lock", f"{other_entry}.use"])
+
+
+def test_get_does_not_evict_entries_in_use(server: _StandInServer, tmp_path: pathlib.Path) -> None:
+    cache = DownloadCache(cache_dir=str(tmp_path), max_total_size=len(DIST) + 1024)
+
+    dist = cache.get(server.url("/spire.tar.gz"))
+    os.utime(os.path.dirname(dist.path), (0, 0))
+    other = DownloadCache(cache_dir=str(tmp_path), max_total_size=len(DIST) + 1024).get(
+        server.url("/other.tar.gz"))
+
+    assert os.path.exists(dist.path)
+    assert os.path.exists(other.path)
+    release_entries_in_use()
+    assert [os.path.dirname(dist.path)] == cache.evict()
+
+
+def test_fetch_with_open_url_sends_headers(server: _StandInServer, tmp_path: pathlib.Path) -> None:
+    dest = str(tmp_path / "spire.tar.gz")
+
+    fetch_with_open_url(
+        server.url("/spire.tar.gz"), dest,
+        options=UrlFetchOptions(use_proxy=False, headers={"X-Mirror-Token": "t0k3n"}))
+
+    assert DIST == pathlib.Path(dest).read_bytes()
+    assert "t0k3n" == server.headers[0].get("X-Mirror-Token")
+
+
+def test_url_fetch_options_round_trip_as_ansible_param() -> None:
+    options = UrlFetchOptions(validate_certs=False, client_cert="/etc/pki/c.pem", headers={"a": "b"})
+
+    assert options == UrlFetchOptions.from_ansible_param(options.to_ansible_param())
+    assert UrlFetchOptions() == UrlFetchOptions.from_ansible_param({"validate_certs": None})
+
+
+def test_parse_sha256_sidecar() -> None:
+    assert "ab" == parse_sha256_sidecar("AB\n", "spire.tar.gz")
+    assert "cd" == parse_sha256_sidecar("ab  other.tar.gz\ncd *spire.tar.gz\n", "spire.tar.gz")
+    with pytest.raises(RuntimeError):
+        parse_sha256_sidecar("ab  other.tar.gz\n", "spire.tar.gz")
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,130 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+import os
+import re
+import socket
+import threading
+import time
+from typing import Any, Iterator, List
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils import grpc_health, spire_cmd
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing import (
+    CmdExecOutcome,
+)
+import pytest
+
+
+class StandInHealthServer:
+    """Minimal HTTP/2 server answering grpc.health.v1.Health/Check on a unix domain socket."""
+
+    def __init__(self, socket_path: str, status: int = 1, goaway: bool = False, listen_delay: float = 0.0) -> None:
+        self.socket_path = socket_path
+        self.status = status
+        self.goaway = goaway
+        self.listen_delay = listen_delay
+        self.requests: List[bytes] = []
+        self.listening = threading.Event()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self) -> None:
+        time.sleep(self.listen_delay)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(1)
+        self.listening.set()
+        conn, _ = server.accept()
+        with conn, server:
+            grpc_health._read_exact(conn, len(grpc_health.HTTP2_CLIENT_PREFACE))
+            conn.sendall(grpc_health.frame(grpc_health.FRAME_SETTINGS, 0, 0, b""))
+            if self.goaway:
+                conn.sendall(grpc_health.frame(grpc_health.FRAME_GOAWAY, 0, 0, b"\x00" * 8))
+                return
+            while True:
+                frame_type, flags, stream_id, payload = grpc_health.read_frame(conn)
+                if frame_type == grpc_health.FRAME_DATA:
+                    self.requests.append(payload)
+                if frame_type == grpc_health.FRAME_DATA and flags & grpc_health.FLAG_END_STREAM:
+                    break
+            conn.sendall(
+                grpc_health.frame(
+                    grpc_health.FRAME_HEADERS, grpc_health.FLAG_END_HEADERS, stream_id,
+                    grpc_health.hpack_literal(":status", "200"))
+                + grpc_health.frame(
+                    grpc_health.FRAME_DATA, 0, stream_id,
+                    grpc_health.grpc_message(bytes([0x08, self.status])))
+                + grpc_health.frame(
+                    grpc_health.FRAME_HEADERS, grpc_health.FLAG_END_HEADERS | grpc_health.FLAG_END_STREAM,
+                    stream_id, grpc_health.hpack_literal("grpc-status", "0")))
+            # waiting for the client to close, as a real server would keep the connection
+            while conn.recv(1024):
+                pass
+
+
+@pytest.fixture
+def socket_path() -> Iterator[str]:
+    # unix socket paths are limited to about 100 characters
+    path = f"/tmp/health-{os.getpid()}-{threading.get_ident()}.sock"
+    yield path
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def test_check_health_serving(socket_path: str) -> None:
+    server = StandInHealthServer(socket_path, status=1)
+    server.listening.wait(5)
+    res = grpc_health.check_health(socket_path)
+    assert res == grpc_health.GrpcHealthResult(status="SERVING", issue=None, conclusive=True)
+    assert server.requests == [b"\x00\x00\x00\x00\x00"]
+
+
+def test_check_health_not_serving(socket_path: str) -> None:
+    StandInHealthServer(socket_path, status=2).listening.wait(5)
+    res = grpc_health.check_health(socket_path)
+    assert not res.is_serving() and res.conclusive
+    assert res.status == "NOT_SERVING"
+
+
+def test_check_health_retries_connecting_within_budget(socket_path: str) -> None:
+    StandInHealthServer(socket_path, listen_delay=0.3)
+    assert not grpc_health.check_health(socket_path).is_serving()
+    assert grpc_health.check_health(socket_path, connect_retry_budget=5.0).is_serving()
+
+
+def test_inconclusive_native_check_falls_back_to_healthcheck_command(socket_path: str) -> None:
+    StandInHealthServer(socket_path, goaway=True).listening.wait(5)
+    calls: List[Any] = []
+
+    def run_command(args: Any) -> CmdExecOutcome:
+        calls.append(args)
+        return CmdExecOutcome(0, "Agent is healthy.", "")
+
+    res = spire_cmd.is_spire_component_healthy(
+        run_command=run_command,
+        spire_component_bin="spire-agent",
+        ipc_socket_path_args=spire_cmd.ipc_socket_path_args_agent(socket_path),
+        healthcheck_cmd_output_regex=re.compile(r".*Agent\sis\shealthy.*"),
+        socket_path=socket_path)
+    assert res.res
+    assert calls == [["spire-agent", "healthcheck", "-socketPath", socket_path]]
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,63 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, List
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.healthchecks import (
+    CheckAgent,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing import (
+    CmdExecOutcome,
+)
+import pytest
+
+
+def test_poll_readiness_returns_as_soon_as_the_agent_is_healthy() -> None:
+    calls: List[Any] = []
+
+    def run_command(args: Any) -> CmdExecOutcome:
+        calls.append(args)
+        if len(calls) < 3:
+            return CmdExecOutcome(1, "", "Agent is unavailable.")
+        return CmdExecOutcome(0, "Agent is healthy.", "")
+
+    check = CheckAgent(
+        run_command=run_command, file_spire_agent_bin="/opt/spire-agent/bin/spire-agent",
+        socket_path="/tmp/agent.sock", readiness_probe_timeout_seconds=10.0, native=False)
+    outcome = check.poll_readiness()
+    assert outcome.succeeded
+    assert len(outcome.attempts) == 3
+    assert outcome.elapsed < 1.0
+    assert calls[0] == ["/opt/spire-agent/bin/spire-agent", "healthcheck", "-socketPath", "/tmp/agent.sock"]
+
+
+def test_poll_readiness_reports_the_last_issue_on_timeout() -> None:
+    check = CheckAgent(
+        run_command=lambda args: CmdExecOutcome(1, "", "Agent is unavailable."),
+        file_spire_agent_bin="/opt/spire-agent/bin/spire-agent",
+        socket_path=None, readiness_probe_timeout_seconds=0.2)
+    outcome = check.poll_readiness()
+    assert outcome.timed_out
+    assert "Agent is unavailable." in outcome.last_value.issue
+    with pytest.raises(RuntimeError, match="readiness probe failed"):
+        check.wait_for_readiness()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,75 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+import pathlib
+import threading
+import time
+
+import pytest
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.host_semaphore import (
+    FileLockSemaphore,
+)
+
+
+def test_semaphore_limits_holders_to_slots(tmp_path: pathlib.Path) -> None:
+    semaphore = FileLockSemaphore(lock_dir=str(tmp_path), name="spire-server-cmd-server", slots=2)
+
+    with semaphore.slot(timeout=0) as first_wait, semaphore.slot(timeout=0) as second_wait:
+        assert first_wait < 1.0 and second_wait < 1.0
+        with pytest.raises(RuntimeError, match="no free slot out of 2"):
+            with semaphore.slot(timeout=0.1):
+                pass
+
+    with semaphore.slot(timeout=0):
+        pass
+
+
+def test_semaphore_slots_are_per_name(tmp_path: pathlib.Path) -> None:
+    server_a = FileLockSemaphore(lock_dir=str(tmp_path), name="spire-server-cmd-a", slots=1)
+    server_b = FileLockSemaphore(lock_dir=str(tmp_path), name="spire-server-cmd-b", slots=1)
+
+    with server_a.slot(timeout=0), server_b.slot(timeout=0):
+        pass
+
+
+def test_semaphore_reports_time_waited_for_slot(tmp_path: pathlib.Path) -> None:
+    semaphore = FileLockSemaphore(lock_dir=str(tmp_path), name="spire-server-cmd-server", slots=1)
+    holding = threading.Event()
+
+    def hold_slot() -> None:
+        with semaphore.slot(timeout=0):
+            holding.set()
+            time.sleep(0.3)
+
+    holder = threading.Thread(target=hold_slot)
+    holder.start()
+    holding.wait(timeout=5)
+    with semaphore.slot(timeout=5) as waited:
+        assert waited >= 0.1
+    holder.join()
+
+
+def test_semaphore_needs_a_slot(tmp_path: pathlib.Path) -> None:
+    with pytest.raises(ValueError):
+        FileLockSemaphore(lock_dir=str(tmp_path), name="spire-server-cmd-server", slots=0)
+
+
+if __name__ == '__main__':
+    pytest.main()
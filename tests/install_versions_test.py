@@ -0,0 +1,90 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import hashlib
+import os
+import pathlib
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.install_versions import (
+    activate_version,
+    versioned_bin_dir,
+)
+import pytest
+
+
+def _install(install_dir: pathlib.Path, version: str, content: bytes) -> None:
+    bin_dir = pathlib.Path(versioned_bin_dir(str(install_dir), version))
+    bin_dir.mkdir(parents=True)
+    (bin_dir / "spire-agent").write_bytes(content)
+
+
+def test_activate_version_switches_current_and_keeps_bin_path_stable(tmp_path: pathlib.Path) -> None:
+    legacy_bin = tmp_path / "bin"
+    legacy_bin.mkdir()
+    (legacy_bin / "spire-agent").write_bytes(b"v0")
+    _install(tmp_path, "1.0.0", b"v1")
+
+    outcome = activate_version(str(tmp_path), "1.0.0", "spire-agent", retention=2)
+
+    assert outcome.activated and outcome.changed
+    assert outcome.previous_version is None
+    assert b"v1" == (tmp_path / "bin" / "spire-agent").read_bytes()
+    assert os.path.join("versions", "1.0.0") == os.readlink(tmp_path / "current")
+    assert b"v0" == (tmp_path / "versions" / "unversioned" / "bin" / "spire-agent").read_bytes()
+
+    again = activate_version(str(tmp_path), "1.0.0", "spire-agent", retention=2)
+    assert again.activated and not again.changed
+
+
+def test_activate_version_rolls_back_to_retained_version_with_expected_digest(tmp_path: pathlib.Path) -> None:
+    _install(tmp_path, "1.0.0", b"v1")
+    activate_version(str(tmp_path), "1.0.0", "spire-agent", retention=1)
+    _install(tmp_path, "1.1.0", b"v1.1")
+    activate_version(str(tmp_path), "1.1.0", "spire-agent", retention=1)
+
+    not_matching = activate_version(
+        str(tmp_path), "1.0.0", "spire-agent", retention=1, only_if_sha256="0" * 64)
+    assert not not_matching.activated
+    assert b"v1.1" == (tmp_path / "bin" / "spire-agent").read_bytes()
+
+    rollback = activate_version(
+        str(tmp_path), "1.0.0", "spire-agent", retention=1,
+        only_if_sha256=hashlib.sha256(b"v1").hexdigest())
+    assert rollback.activated and "1.1.0" == rollback.previous_version
+    assert b"v1" == (tmp_path / "bin" / "spire-agent").read_bytes()
+
+
+def test_activate_version_removes_versions_beyond_retention(tmp_path: pathlib.Path) -> None:
+    for i, version in enumerate(["1.0.0", "1.1.0", "1.2.0"]):
+        _install(tmp_path, version, version.encode())
+        version_dir = tmp_path / "versions" / version
+        os.utime(version_dir, (1000 + i, 1000 + i))
+        outcome = activate_version(str(tmp_path), version, "spire-agent", retention=1)
+        os.utime(version_dir, (1000 + i, 1000 + i))
+
+    assert ["1.0.0"] == outcome.removed_versions
+    assert ["1.1.0", "1.2.0"] == sorted(os.listdir(tmp_path / "versions"))
+
+
+def test_activate_version_fails_for_version_not_installed(tmp_path: pathlib.Path) -> None:
+    with pytest.raises(RuntimeError, match="not installed"):
+        activate_version(str(tmp_path), "9.9.9", "spire-agent", retention=1)
+
+
+if __name__ == '__main__':
+    pytest.main()
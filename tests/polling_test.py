@@ -0,0 +1,78 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import List
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.polling import (
+    Backoff,
+    poll_until,
+)
+import pytest
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: List[float] = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_backoff_grows_exponentially_up_to_the_cap() -> None:
+    backoff = Backoff(initial_interval=0.05, multiplier=2.0, max_interval=0.3, jitter=0.0)
+    assert [backoff.interval(n) for n in range(5)] == pytest.approx([0.05, 0.1, 0.2, 0.3, 0.3])
+
+
+def test_backoff_jitter_stays_within_bounds() -> None:
+    backoff = Backoff(initial_interval=1.0, multiplier=2.0, max_interval=1.0, jitter=0.2)
+    assert backoff.interval(0, random_func=lambda: 0.0) == pytest.approx(0.8)
+    assert backoff.interval(0, random_func=lambda: 1.0) == pytest.approx(1.2)
+
+
+def test_poll_until_succeeds_early_without_full_second_sleeps() -> None:
+    fake = FakeClock()
+    results = iter([False, False, True])
+    outcome = poll_until(
+        attempt_func=lambda: next(results), timeout=5.0,
+        backoff=Backoff(jitter=0.0), clock=fake.clock, sleep=fake.sleep)
+    assert outcome.succeeded and not outcome.timed_out
+    assert fake.sleeps == pytest.approx([0.05, 0.1])
+    assert [a.succeeded for a in outcome.attempts] == [False, False, True]
+    assert outcome.attempts[2].started_at == pytest.approx(0.15)
+
+
+def test_poll_until_does_not_sleep_past_the_deadline() -> None:
+    fake = FakeClock()
+    outcome = poll_until(
+        attempt_func=lambda: False, timeout=1.0,
+        backoff=Backoff(initial_interval=0.4, multiplier=2.0, max_interval=2.0, jitter=0.0),
+        clock=fake.clock, sleep=fake.sleep)
+    assert not outcome.succeeded and outcome.timed_out
+    assert fake.sleeps == pytest.approx([0.4, 0.6])
+    assert outcome.attempts[-1].started_at == pytest.approx(1.0)
+    assert outcome.to_ansible_result_value()["attempts"][-1]["succeeded"] is False
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,143 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import os
+import threading
+import time
+from typing import Any, Tuple
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.ansible_module_cmd import (
+    RunCommand,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.probes import (
+    Probe,
+    ProbeMemo,
+    run_probes,
+    wait_for_straggling_probes,
+)
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_straggling_probes():
+    yield
+    assert [] == wait_for_straggling_probes(timeout=5)
+
+
+def test_run_probes_runs_probes_concurrently() -> None:
+    barrier = threading.Barrier(3, timeout=5)
+
+    def probe(value: str):
+        # only passes if all three probes run at the same time
+        barrier.wait()
+        return value, None
+
+    started = time.monotonic()
+    results = run_probes([Probe(name, lambda name=name: probe(name)) for name in ["a", "b", "c"]])
+
+    assert {"a": ("a", None), "b": ("b", None), "c": ("c", None)} == results
+    assert time.monotonic() - started < 5
+
+
+def test_run_probes_reports_timeout_result_of_slow_probe() -> None:
+    release = threading.Event()
+    results = run_probes([
+        Probe("fast", lambda: (True, None)),
+        Probe("slow", lambda: release.wait(5), timeout=0.1),
+        Probe("slow_triple", lambda: release.wait(5), timeout=0.1,
+              timeout_result=lambda issue: (None, None, issue)),
+    ])
+    release.set()
+
+    assert (True, None) == results["fast"]
+    assert (None, "probe slow timed out after 0.1s") == results["slow"]
+    assert (None, None, "probe slow_triple timed out after 0.1s") == results["slow_triple"]
+
+
+def test_run_probes_cancels_queued_probes_and_leaves_running_ones_to_wait_for() -> None:
+    release = threading.Event()
+    queued_calls = []
+    results = run_probes([
+        Probe("slow", lambda: release.wait(5), timeout=0.1),
+        Probe("queued", lambda: queued_calls.append("queued"), timeout=0.1),
+    ], max_workers=1)
+
+    assert (None, "probe queued timed out after 0.1s") == results["queued"]
+    assert ["slow"] == wait_for_straggling_probes(timeout=0.01)
+    release.set()
+    assert [] == wait_for_straggling_probes(timeout=5)
+    assert [] == queued_calls, "a probe not started before its timeout must not run anymore"
+
+
+def test_run_probes_reraises_probe_exception() -> None:
+    def failing():
+        raise ValueError("probe failure")
+
+    with pytest.raises(ValueError, match="probe failure"):
+        run_probes([Probe("ok", lambda: (1, None)), Probe("failing", failing)])
+
+
+def test_run_command_runs_probe_commands_in_parallel_without_touching_the_environment() -> None:
+    class ModuleStandIn:
+        run_command_environ_update = {"LANG": "C"}
+
+        def run_command(self, args: Any) -> Tuple[int, str, str]:
+            return 0, "main thread", ""
+
+    run_command = RunCommand(ModuleStandIn())
+    environ_before = dict(os.environ)
+    started = time.monotonic()
+    results = run_probes([
+        Probe(f"p{i}", lambda: run_command(["sh", "-c", "sleep 0.5; echo $LANG; pwd"])) for i in range(4)])
+
+    assert time.monotonic() - started < 1.5, "probe commands must not wait for each other"
+    assert [(0, f"C\n{os.getcwd()}\n")] * 4 == [(outcome.rc, outcome.stdout) for outcome in results.values()]
+    assert environ_before == dict(os.environ)
+    assert "main thread" == run_command(["true"]).stdout
+
+
+def test_run_command_times_out_probe_commands() -> None:
+    run_command = RunCommand(object(), probe_timeout=0.2)
+    outcome = run_probes([Probe("hanging", lambda: run_command(["sleep", "5"]))])["hanging"]
+    missing = run_probes([Probe("missing", lambda: run_command(["/no/such/spire-agent"]))])["missing"]
+
+    assert 124 == outcome.rc
+    assert 0 != missing.rc
+
+
+def test_probe_memo_computes_each_probe_once_per_epoch() -> None:
+    memo = ProbeMemo()
+    calls = []
+
+    def version():
+        calls.append("version")
+        return "1.0.0", None
+
+    results = run_probes([Probe(f"p{i}", lambda: memo.get("version", version)) for i in range(4)])
+    assert [("1.0.0", None)] * 4 == list(results.values())
+    assert ["version"] == calls
+
+    memo.invalidate()
+    memo.get("version", version)
+
+    assert 1 == memo.epoch
+    assert ["version", "version"] == calls
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,142 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import functools
+import hashlib
+import http.server
+import io
+import os
+import pathlib
+import tarfile
+import threading
+from typing import Dict, Generator, List
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_batch import (
+    FileSpec,
+    install_local_file,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.release_fetch import (
+    fetch_release,
+)
+from ansible_collections.io_patricecongo.spire.plugins.modules import spire_release_fetch
+import pytest
+
+from .ansible_module_test_utils import set_module_args
+
+AGENT_BINARY = b"agent-binary" * 1024
+
+
+def _make_spire_tar_gz() -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        info = tarfile.TarInfo("./spire-1.0.0/bin/spire-agent")
+        info.size = len(AGENT_BINARY)
+        info.mode = 0o755
+        tar.addfile(info, io.BytesIO(AGENT_BINARY))
+    return buffer.getvalue()
+
+
+class _Server:
+    def __init__(self, handler_class) -> None:
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def upstream() -> Generator[_Server, None, None]:
+    files: Dict[str, bytes] = {"/spire-1.0.0-linux-x86_64-glibc.tar.gz": _make_spire_tar_gz()}
+    requests: List[str] = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            requests.append(self.path)
+            data = files[self.path]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = _Server(Handler)
+    server.requests = requests
+    yield server
+    server.close()
+
+
+def _make_module(dest: str) -> AnsibleModule:
+    set_module_args({
+        "spire_fetch_url": "http://127.0.0.1/unused",
+        "spire_fetch_cache_dir": "/unused",
+        "spire_fetch_dest": dest,
+    })
+    return AnsibleModule(argument_spec=spire_release_fetch._module_args())
+
+
+def test_download_host_fetches_once_and_serves_targets(upstream: _Server, tmp_path: pathlib.Path) -> None:
+    release_url = f"{upstream.base_url}/spire-1.0.0-linux-x86_64-glibc.tar.gz"
+    download_host_cache = tmp_path / "download-host"
+    fetched = [
+        fetch_release(cache_dir=str(download_host_cache), url=release_url, member_suffix="/bin/spire-agent")
+        for _ in range(2)
+    ]
+    assert [True, False] == [f.downloaded for f in fetched]
+    assert 1 == len(upstream.requests)
+    assert hashlib.sha256(AGENT_BINARY).hexdigest() == fetched[0].member_sha256
+
+    file_server = _Server(functools.partial(
+        http.server.SimpleHTTPRequestHandler, directory=str(download_host_cache)))
+    try:
+        for target in ["agent-1", "agent-2"]:
+            target_dir = tmp_path / target
+            from_download_host = fetch_release(
+                cache_dir=str(target_dir / "cache"),
+                url=f"{file_server.base_url}/{fetched[0].member_relpath}",
+                sha256=fetched[0].member_sha256)
+            dest = target_dir / "spire-agent"
+            outcome = install_local_file(
+                module=_make_module(str(dest)),
+                src=from_download_host.path,
+                spec=FileSpec(dest=str(dest), member=None, mode="0755", owner=None, group=None,
+                              sha256=fetched[0].member_sha256))
+
+            assert outcome.content_changed
+            assert AGENT_BINARY == dest.read_bytes()
+            assert os.access(dest, os.X_OK)
+    finally:
+        file_server.close()
+    assert 1 == len(upstream.requests)
+
+
+def test_fetch_release_rejects_file_not_matching_digest(upstream: _Server, tmp_path: pathlib.Path) -> None:
+    with pytest.raises(RuntimeError, match="sha256 mismatch"):
+        fetch_release(
+            cache_dir=str(tmp_path),
+            url=f"{upstream.base_url}/spire-1.0.0-linux-x86_64-glibc.tar.gz",
+            sha256="0" * 64)
+
+
+if __name__ == '__main__':
+    pytest.main()
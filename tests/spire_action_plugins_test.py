@@ -0,0 +1,143 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import hashlib
+import io
+import os
+import tarfile
+from types import ModuleType
+from typing import Any, Dict, List
+
+from ansible.parsing.dataloader import DataLoader
+from ansible.playbook.play_context import PlayContext
+from ansible.playbook.task import Task
+from ansible.plugins.loader import connection_loader
+from ansible_collections.io_patricecongo.spire.plugins.action import (
+    spire_agent,
+    spire_prestage,
+    spire_server,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_batch import FileSpec
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.release_fetch import FetchedRelease
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_action_base import (
+    SpireActionBase,
+)
+import pytest
+
+
+@pytest.mark.parametrize(
+    "action_module",
+    [spire_agent, spire_prestage, spire_server]
+)
+def test_action_plugin_can_be_instantiated(action_module: ModuleType) -> None:
+    action = action_module.ActionModule(
+        task=Task(), connection=None, play_context=PlayContext(),
+        loader=DataLoader(), templar=None, shared_loader_obj=None)
+    assert isinstance(action, SpireActionBase)
+
+
+
+def _make_release(path: str, version: str, binary: bytes) -> None:
+    with tarfile.open(path, "w:gz") as tar:
+        info = tarfile.TarInfo(f"./spire-{version}/bin/spire-agent")
+        info.size = len(binary)
+        info.mode = 0o755
+        tar.addfile(info, io.BytesIO(binary))
+
+
+def test_prestage_action_pushes_binary_into_versioned_install_dir(tmp_path: Any) -> None:
+    binary = b"#!/bin/sh\necho spire-agent 1.0.0\n"
+    release = str(tmp_path / "spire-1.0.0-linux-x86_64-glibc.tar.gz")
+    _make_release(release, "1.0.0", binary)
+    task = Task()
+    task.args = {
+        "spire_prestage_component": "agent",
+        "spire_prestage_version": "1.0.0",
+        "spire_prestage_install_dir": "/opt/spire-agent",
+        "spire_download_url": f"file://{release}",
+    }
+    play_context = PlayContext()
+    action = spire_prestage.ActionModule(
+        task=task, connection=connection_loader.get('local', play_context, os.devnull),
+        play_context=play_context,
+        loader=DataLoader(), templar=None, shared_loader_obj=None)
+    created_dirs: List[str] = []
+    installed: List[FileSpec] = []
+
+    def cache_dir(name: str) -> str:
+        path = str(tmp_path / "cache" / name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    action._get_controller_cache_dir = cache_dir
+    action.remote_stat = lambda task_vars, file_path, checksum_algorithm: {"stat": {"exists": False}}
+    action._create_remote_dirs = (
+        lambda task_vars, expected_dirs, mode, owner=None: created_dirs.extend(expected_dirs))
+    action._install_bundle_on_target = (
+        lambda task_vars, local_bundle, file_specs: installed.extend(file_specs))
+
+    ret: Dict[str, Any] = action.run(task_vars={})
+
+    dest = "/opt/spire-agent/versions/1.0.0/bin/spire-agent"
+    assert ret == {
+        "changed": True,
+        "spire_prestage_path": dest,
+        "spire_prestage_sha256": hashlib.sha256(binary).hexdigest(),
+    }
+    assert created_dirs == [os.path.dirname(dest)]
+    assert [spec.dest for spec in installed] == [dest]
+
+
+def test_relayed_binary_is_taken_from_controller_cache_without_download_host(tmp_path: Any) -> None:
+    binary = b"#!/bin/sh\necho spire-agent 1.0.0\n"
+    task = Task()
+    task.args = {
+        "spire_download_url": "https://example.org/spire-1.0.0-linux-x86_64-glibc.tar.gz",
+        "spire_download_sha256": "AB" * 32,
+        "spire_download_host": "download-host",
+    }
+    action = spire_agent.ActionModule(
+        task=task, connection=None, play_context=PlayContext(),
+        loader=DataLoader(), templar=None, shared_loader_obj=None)
+    action._get_controller_cache_dir = lambda name: str(tmp_path / "cache" / name)
+    fetches: List[str] = []
+
+    def fetch_release_on_download_host(member_suffix: str = None) -> Any:
+        fetches.append(member_suffix)
+        return FetchedRelease(
+            path="/var/cache/release.tar.gz", relpath="release.tar.gz", sha256="ab" * 32, downloaded=True,
+            member_path="/var/cache/extracted/spire-agent", member_relpath="extracted/spire-agent",
+            member_sha256=hashlib.sha256(binary).hexdigest())
+
+    def relay(task_data: Dict[str, Any], hostname: str, action_name: str) -> Dict[str, Any]:
+        with open(task_data["fetch"]["dest"], "wb") as dest:
+            dest.write(binary)
+        return {}
+
+    action._fetch_release_on_download_host = fetch_release_on_download_host
+    action._run_sub_task = relay
+
+    first = action._extract_spire_binary("/bin/spire-agent")
+    second = action._extract_spire_binary("/bin/spire-agent")
+
+    assert first == second == (second[0], hashlib.sha256(binary).hexdigest())
+    assert fetches == ["/bin/spire-agent"], "a relay cache hit must not reach the download host"
+
+
+if __name__ == '__main__':
+    pytest.main()
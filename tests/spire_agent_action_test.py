@@ -0,0 +1,319 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import os
+from typing import Any, Dict, List, Tuple
+
+import jinja2
+from ansible.parsing.dataloader import DataLoader
+from ansible.playbook.play_context import PlayContext
+from ansible.playbook.task import Task
+from ansible_collections.io_patricecongo.spire.plugins.action import spire_agent
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.agent_templates.resources import (
+    AgentTemplates,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.change_plan import (
+    ChangeKind,
+    Disruption,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.digests import (
+    digest_env_file,
+    digest_hcl_file,
+    digest_ini_file,
+    digest_pem_bundle_file,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_stat import (
+    FileModes,
+    FileStat,
+    FileStats,
+    FileType,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_action_base import (
+    SpireTemplateRes,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_agent_info_cmd import (
+    AgentDirs,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing import (
+    State,
+    StateOfAgent,
+    SubStateAgentRegistered,
+    SubStateServiceInstallation,
+    SubStateServiceStatus,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.state_fingerprint import (
+    FingerprintRecord,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.systemd import Scope
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.users import User
+import pytest
+
+SPIRE_VERSION = "1.0.0"
+JOIN_TOKEN = "e2b4c3a2-4e8f-4c1f-9a6b-1f2d3c4b5a69"
+
+
+def _task_args(root: str) -> Dict[str, Any]:
+    return {
+        "state": "present",
+        "substate_service_installation": "enabled",
+        "substate_service_status": "healthy",
+        "substate_agent_registered": "yes",
+        "spire_agent_config_dir": f"{root}/etc/spire-agent",
+        "spire_agent_data_dir": f"{root}/var/lib/spire-agent",
+        "spire_agent_install_dir": f"{root}/opt/spire-agent",
+        "spire_agent_service_dir": f"{root}/etc/systemd/system",
+        "spire_agent_log_dir": f"{root}/var/log/spire",
+        "spire_agent_service_name": "spire_agent",
+        "spire_agent_log_level": "INFO",
+        "spire_agent_trust_domain": "example.org",
+        "spire_agent_socket_path": "/tmp/agent.sock",
+        "spire_server_address": "spire-server",
+        "spire_server_port": 8081,
+        "spire_install_files_copy_mode": "per_file",
+    }
+
+
+class TargetStandIn:
+    """Plays the agent host: keeps the files copied by the action, like spire_agent_info would find them."""
+
+    def __init__(self, dirs: AgentDirs) -> None:
+        self.dirs = dirs
+        self.files: Dict[str, str] = {}
+
+    def copy(self, task_vars: Dict[str, Any], copy_task_label: str,
+             src: str, dest: str, sec_attributes: Dict[str, Any]) -> None:
+        self.files[dest] = src
+
+    def info_result(self, svid_verified: bool, svid_validity_remaining_seconds: float = 3600.0) -> Dict[str, Any]:
+        dirs = self.dirs
+        return {
+            "spire_agent_spiffe_id": "spiffe://example.org/spire/agent/join_token/" + JOIN_TOKEN,
+            "spire_agent_svid_validity_remaining_seconds": svid_validity_remaining_seconds,
+            "spire_agent_installed": True,
+            "spire_agent_version": SPIRE_VERSION,
+            "spire_agent_is_healthy": True,
+            "spire_agent_service_scope": "scope_system",
+            "spire_agent_service_installed": True,
+            "spire_agent_service_running": True,
+            "spire_agent_service_enabled": True,
+            "spire_agent_hexdigest_service_file": digest_ini_file(self.files[dirs.path_service_file]),
+            "spire_agent_hexdigest_config_file": digest_hcl_file(self.files[dirs.path_conf_file]),
+            "spire_agent_hexdigest_env_file": digest_env_file(self.files[dirs.path_env_file]),
+            "spire_agent_hexdigest_trust_bundle_file":
+                digest_pem_bundle_file(self.files[dirs.path_trust_bundle_pem]),
+            "spire_agent_svid_verified": svid_verified,
+            "spire_agent_file_stats": _file_stats(dirs).to_ansible_result_value(),
+        }
+
+
+def _file_stats(dirs: AgentDirs, exist: bool = True) -> FileStats:
+    if not exist:
+        return FileStats({
+            f: FileStat.from_issue("not found") for f in dirs.expected_dirs_and_files()
+        })
+    return FileStats({
+        **{d: FileStat(exists=True, owner="root", group="root", mode=0o755,
+                       ftype=FileType.directory, issue=None)
+           for d in dirs.expected_dirs()},
+        **{f: FileStat(exists=True, owner="root", group="root", mode=0o644,
+                       ftype=FileType.file, issue=None)
+           for f in [*dirs.expected_files_not_exec(), *dirs.expected_files_exec()]},
+    })
+
+
+def _make_agent_action(tmp_path: Any) -> Tuple[spire_agent.ActionModule, TargetStandIn]:
+    task = Task()
+    task.args = _task_args(str(tmp_path / "target"))
+    action = spire_agent.ActionModule(
+        task=task, connection=None, play_context=PlayContext(),
+        loader=DataLoader(), templar=None, shared_loader_obj=None)
+    rendered_count = [0]
+
+    def exe_template_on_localhost(res: SpireTemplateRes) -> str:
+        with open(res.src) as f:
+            content = jinja2.Template(f.read()).render({**task.args, **res.extra_vars})
+        rendered_count[0] += 1
+        dest = str(tmp_path / f"{rendered_count[0]:02d}-{res.label}")
+        with open(dest, "w") as f:
+            f.write(content)
+        return dest
+
+    action_data = action.action_data
+    action_data.templates = AgentTemplates()
+    action_data.dirs = AgentDirs.from_ansible_src(task.args.get)
+    action_data.expected_state = StateOfAgent.from_task_args(task.args)
+    action_data.expected_user = User(name="root", uid=0, guid=0, home="/root")
+    action_data.expected_file_modes_effective = FileModes(
+        mode_dir="0755", mode_file_not_exe="0644", mode_file_exe="0755")
+    action_data.expected_file_stats = _file_stats(action_data.dirs)
+    action_data.expected_config = spire_agent.ExpectedConfig(
+        exe_template_on_localhost=exe_template_on_localhost,
+        templates=action_data.templates,
+        expected_state=State.present,
+        expected_spire_version=SPIRE_VERSION,
+        expected_service_scope=Scope.scope_system,
+        spire_server_bundle="-----BEGIN CERTIFICATE-----\nMIIB\n-----END CERTIFICATE-----\n",
+        task_args=task.args)
+
+    target = TargetStandIn(action_data.dirs)
+    action._copy_from_controller_to_target = target.copy
+    action._get_join_token = lambda task_vars=None: JOIN_TOKEN
+    return action, target
+
+
+def _absent(action: spire_agent.ActionModule) -> Dict[str, Any]:
+    return {"spire_agent_file_stats": _file_stats(action.action_data.dirs, exist=False).to_ansible_result_value()}
+
+
+def _install_and_get_diff_after_change(
+        action: spire_agent.ActionModule, target: TargetStandIn, actual_result: Dict[str, Any],
+) -> Tuple[List[str], spire_agent.AgentInfoResultAdapter]:
+    action_data = action.action_data
+    action_data.spire_agent_info = spire_agent.AgentInfoResultAdapter(actual_result)
+    action._ensure_join_token_if_attestation_needed(task_vars={})
+    action.diff_actual_expected = action_data.diff()
+    assert action._need_change()
+    action._ensure_service_files_installed(task_vars={})
+    installed = sorted(target.files)
+
+    info_after_change = spire_agent.AgentInfoResultAdapter(target.info_result(svid_verified=True))
+    info_after_change.is_registered = True
+    action_data.spire_agent_info = info_after_change
+    return installed, info_after_change
+
+
+def test_fresh_install_attests_and_ends_without_diff(tmp_path: Any) -> None:
+    action, target = _make_agent_action(tmp_path)
+    dirs = action.action_data.dirs
+
+    installed, _ = _install_and_get_diff_after_change(action, target, actual_result=_absent(action))
+
+    assert action.action_data.expected_config.join_token_required
+    assert dirs.path_env_file in installed
+    with open(target.files[dirs.path_env_file]) as f:
+        assert JOIN_TOKEN in f.read()
+    assert action.action_data.diff().ansible_failed_outcome_part_given_no_diff_expected() == {}
+
+
+@pytest.mark.parametrize(
+    "registered,svid_validity_remaining_seconds",
+    [(False, 3600.0), (True, -60.0)],
+    ids=["not-registered", "svid-expired"]
+)
+def test_attestation_forces_env_file_install_and_restart(
+        tmp_path: Any, registered: bool, svid_validity_remaining_seconds: float
+) -> None:
+    action, target = _make_agent_action(tmp_path)
+    dirs = action.action_data.dirs
+    # installed and running, the env file is unchanged modulo token
+    _install_and_get_diff_after_change(action, target, actual_result=_absent(action))
+    actual_result = target.info_result(
+        svid_verified=False, svid_validity_remaining_seconds=svid_validity_remaining_seconds)
+    action, target = _make_agent_action(tmp_path)
+    action.action_data.spire_agent_info = spire_agent.AgentInfoResultAdapter(actual_result)
+    action.action_data.spire_agent_info.is_registered = registered
+
+    action._ensure_join_token_if_attestation_needed(task_vars={})
+    action.diff_actual_expected = action.action_data.diff()
+
+    assert action.action_data.expected_config.join_token_required
+    assert action._need_change()
+    plan = action._plan_changes()
+    assert (dirs.path_env_file, ChangeKind.file_content, Disruption.restart) in plan.changes
+    assert plan.need_restart_after_change()
+    action._ensure_service_files_installed(task_vars={})
+    assert sorted(target.files) == [dirs.path_env_file]
+
+
+def test_registered_agent_failing_local_verification_gets_no_join_token(tmp_path: Any) -> None:
+    action, target = _make_agent_action(tmp_path)
+    _install_and_get_diff_after_change(action, target, actual_result=_absent(action))
+    # e.g. bundle.der missing: the local check fails, the server check says registered
+    actual_result = target.info_result(svid_verified=False, svid_validity_remaining_seconds=None)
+    action, target = _make_agent_action(tmp_path)
+    action.action_data.spire_agent_info = spire_agent.AgentInfoResultAdapter(actual_result)
+    action.action_data.spire_agent_info.is_registered = True
+
+    action._ensure_join_token_if_attestation_needed(task_vars={})
+    action.diff_actual_expected = action.action_data.diff()
+
+    assert not action.action_data.expected_config.join_token_required
+    assert not action.action_data.need_env_file_install()
+    assert not action._need_change()
+
+
+def test_agent_keeping_its_svid_gets_no_join_token(tmp_path: Any) -> None:
+    action, target = _make_agent_action(tmp_path)
+    _install_and_get_diff_after_change(action, target, actual_result=_absent(action))
+    actual_result = target.info_result(svid_verified=True)
+    action, target = _make_agent_action(tmp_path)
+    action.action_data.spire_agent_info = spire_agent.AgentInfoResultAdapter(actual_result)
+    action.action_data.spire_agent_info.is_registered = True
+
+    action._ensure_join_token_if_attestation_needed(task_vars={})
+    action.diff_actual_expected = action.action_data.diff()
+
+    assert not action.action_data.need_env_file_install()
+    assert not action._need_change()
+    assert action.action_data.join_token is None
+
+
+def test_state_fingerprint_record_leaves_out_the_run_timings(tmp_path: Any) -> None:
+    records: List[FingerprintRecord] = []
+
+    def query_state_fingerprint(
+            task_vars: Dict[str, Any], inputs_digest: str, result_to_record: Dict[str, Any] = None
+    ) -> Tuple[str, Any]:
+        if result_to_record is not None:
+            records.append(FingerprintRecord(inputs_digest, "fingerprint", result_to_record))
+        return "fingerprint", (records[-1] if records else None)
+
+    def make_fingerprinting_action() -> spire_agent.ActionModule:
+        action, _ = _make_agent_action(tmp_path)
+        action._task.args.update({"state": "present", "spire_state_fingerprint": True})
+        action._query_state_fingerprint = query_state_fingerprint
+        action._expected_inputs_digest = lambda template_files: "inputs"
+        return action
+
+    action = make_fingerprinting_action()
+    action.action_data.spire_server_cmd_queue_waits.append(1.5)
+    ret = {"changed": True, "spire_agent_version": SPIRE_VERSION, **action._run_return_data()}
+    action._record_state_fingerprint(task_vars={}, template_files=[], ret=ret)
+
+    assert [record.result for record in records] == [{"spire_agent_version": SPIRE_VERSION}]
+    fast_path_ret = make_fingerprinting_action()._state_fingerprint_fast_path(task_vars={}, template_files=[])
+    assert fast_path_ret == {
+        "changed": False,
+        "spire_agent_version": SPIRE_VERSION,
+        "spire_server_cmd_queue_wait_seconds": {"count": 0, "total": 0, "max": 0.0},
+        "spire_state_fingerprint_fast_path": True,
+    }
+
+
+def test_readiness_wait_of_the_module_is_reported_as_run_data(tmp_path: Any) -> None:
+    action, _ = _make_agent_action(tmp_path)
+    readiness_wait = {"succeeded": True, "timed_out": False, "elapsed": 0.3, "attempts": [], "abort_reason": None}
+    action._execute_module = lambda **kwargs: {"changed": True, "readiness_wait": readiness_wait}
+
+    action._execute_actual_spire_ansible_module(task_vars={})
+
+    assert action._run_return_data()["readiness_wait"] == readiness_wait
+
+
+if __name__ == '__main__':
+    pytest.main()
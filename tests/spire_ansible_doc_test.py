@@ -23,10 +23,17 @@ from yamllint.config import YamlLintConfig
 from ansible_collections.io_patricecongo.spire.plugins.modules import(
     spire_agent,
     spire_agent_registration_info,
+    spire_dirs,
+    spire_files_bundle,
+    spire_healthcheck,
+    spire_install_version,
+    spire_prestage,
+    spire_release_fetch,
     spire_server,
     spire_agent_info,
     spire_server_info,
     spire_spiffe_id,
+    spire_state_fingerprint,
 )
 
 from ansible.parsing import(
@@ -71,9 +78,16 @@ def check_attr_yaml(mod: ModuleType, attr_name: str) -> Tuple[bool, str]:
         (spire_agent),
         (spire_agent_info),
         (spire_agent_registration_info),
+        (spire_dirs),
+        (spire_files_bundle),
+        (spire_healthcheck),
+        (spire_install_version),
+        (spire_prestage),
+        (spire_release_fetch),
         (spire_server),
         (spire_server_info),
-        (spire_spiffe_id)
+        (spire_spiffe_id),
+        (spire_state_fingerprint)
     ]
 )
 def test_spire_module_doc_okay(module: ModuleType) -> None:
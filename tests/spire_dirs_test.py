@@ -0,0 +1,83 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import os
+import pathlib
+import stat
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_batch import (
+    DirSpec,
+    ensure_dirs,
+)
+from ansible_collections.io_patricecongo.spire.plugins.modules import spire_dirs
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_stat import FileType
+import pytest
+
+from .ansible_module_test_utils import set_module_args
+
+
+def _make_module(specs) -> AnsibleModule:
+    set_module_args({"spire_dirs": [spec.to_ansible_param() for spec in specs]})
+    return AnsibleModule(argument_spec=spire_dirs._module_args())
+
+
+def test_ensure_dirs_creates_missing_dirs_with_mode(tmp_path: pathlib.Path) -> None:
+    specs = [
+        DirSpec(path=str(tmp_path / "conf"), mode="u=rwx,g=rx,o=", owner=None, group=None),
+        DirSpec(path=str(tmp_path / "install" / "bin"), mode="0700", owner=None, group=None),
+    ]
+    module = _make_module(specs)
+
+    outcomes = ensure_dirs(module=module, specs=specs)
+
+    assert [spec.path for spec in specs] == list(outcomes.keys())
+    assert all(outcome.changed and outcome.created for outcome in outcomes.values())
+    assert 0o750 == stat.S_IMODE(os.stat(tmp_path / "conf").st_mode)
+    assert 0o700 == stat.S_IMODE(os.stat(tmp_path / "install").st_mode)
+    conf_stat = outcomes[str(tmp_path / "conf")].file_stat
+    assert (True, FileType.directory, 0o750) == (conf_stat.exists, conf_stat.ftype, conf_stat.mode)
+
+
+def test_ensure_dirs_only_reports_actual_changes(tmp_path: pathlib.Path) -> None:
+    ok_dir = tmp_path / "ok"
+    ok_dir.mkdir(mode=0o750)
+    ok_dir.chmod(0o750)
+    bad_mode_dir = tmp_path / "bad_mode"
+    bad_mode_dir.mkdir()
+    bad_mode_dir.chmod(0o777)
+    specs = [
+        DirSpec(path=str(ok_dir), mode="0750", owner=None, group=None),
+        DirSpec(path=str(bad_mode_dir), mode="0750", owner=None, group=None),
+    ]
+    module = _make_module(specs)
+
+    outcomes = ensure_dirs(module=module, specs=specs)
+
+    assert (False, False) == (outcomes[str(ok_dir)].changed, outcomes[str(ok_dir)].created)
+    assert (True, False) == (outcomes[str(bad_mode_dir)].changed, outcomes[str(bad_mode_dir)].created)
+    assert 0o750 == outcomes[str(bad_mode_dir)].file_stat.mode
+
+
+def test_dir_spec_rejects_root() -> None:
+    with pytest.raises(ValueError):
+        DirSpec.from_ansible_param({"path": "/"})
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,164 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import hashlib
+import os
+import pathlib
+import stat
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.file_batch import (
+    FileSpec,
+    commit_staged_files,
+    install_files_bundle,
+    make_files_bundle,
+    stage_files_bundle,
+    staged_path_of,
+)
+from ansible_collections.io_patricecongo.spire.plugins.modules import spire_files_bundle
+import pytest
+
+from .ansible_module_test_utils import set_module_args
+
+
+def _make_module(bundle_path, specs) -> AnsibleModule:
+    set_module_args({
+        "spire_bundle_src": bundle_path,
+        "spire_bundle_files": [spec.to_ansible_param() for spec in specs]
+    })
+    return AnsibleModule(argument_spec=spire_files_bundle._module_args())
+
+
+def _make_bundle(tmp_path: pathlib.Path, content_by_member) -> str:
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    member_by_src = {}
+    for member, content in content_by_member.items():
+        src = src_dir / member
+        src.write_text(content)
+        member_by_src[str(src)] = member
+    return make_files_bundle(str(tmp_path / "bundle.tar.gz"), member_by_src)
+
+
+def test_install_files_bundle_installs_members_with_mode(tmp_path: pathlib.Path) -> None:
+    bundle = _make_bundle(tmp_path, {"00-agent.conf": "conf", "01-agent.env": "env"})
+    dest_dir = tmp_path / "etc"
+    dest_dir.mkdir()
+    (dest_dir / "agent.env").write_text("env")
+    (dest_dir / "agent.env").chmod(0o600)
+    specs = [
+        FileSpec(dest=str(dest_dir / "agent.conf"), member="00-agent.conf",
+                 mode="0640", owner=None, group=None,
+                 sha256=hashlib.sha256(b"conf").hexdigest()),
+        FileSpec(dest=str(dest_dir / "agent.env"), member="01-agent.env",
+                 mode="0600", owner=None, group=None, sha256=None),
+    ]
+    module = _make_module(bundle, specs)
+
+    outcomes = install_files_bundle(module=module, bundle_path=bundle, specs=specs)
+
+    conf_outcome = outcomes[str(dest_dir / "agent.conf")]
+    assert (True, True) == (conf_outcome.changed, conf_outcome.content_changed)
+    assert "conf" == (dest_dir / "agent.conf").read_text()
+    assert 0o640 == stat.S_IMODE(os.stat(dest_dir / "agent.conf").st_mode)
+    env_outcome = outcomes[str(dest_dir / "agent.env")]
+    assert (False, False) == (env_outcome.changed, env_outcome.content_changed)
+    assert ["agent.conf", "agent.env"] == sorted(os.listdir(dest_dir))
+
+
+def test_install_files_bundle_fixes_attributes_only(tmp_path: pathlib.Path) -> None:
+    dest = tmp_path / "agent.conf"
+    dest.write_text("conf")
+    dest.chmod(0o666)
+    specs = [FileSpec(dest=str(dest), member=None, mode="0600", owner=None, group=None, sha256=None)]
+    module = _make_module(None, specs)
+
+    outcomes = install_files_bundle(module=module, bundle_path=None, specs=specs)
+
+    assert (True, False) == (outcomes[str(dest)].changed, outcomes[str(dest)].content_changed)
+    assert 0o600 == outcomes[str(dest)].file_stat.mode
+
+
+def test_install_files_bundle_leaves_destinations_untouched_on_digest_mismatch(
+        tmp_path: pathlib.Path
+) -> None:
+    bundle = _make_bundle(tmp_path, {"00-agent.conf": "new-conf", "01-agent.env": "new-env"})
+    dest_dir = tmp_path / "etc"
+    dest_dir.mkdir()
+    (dest_dir / "agent.conf").write_text("old-conf")
+    specs = [
+        FileSpec(dest=str(dest_dir / "agent.conf"), member="00-agent.conf",
+                 mode="0640", owner=None, group=None, sha256=None),
+        FileSpec(dest=str(dest_dir / "agent.env"), member="01-agent.env",
+                 mode="0640", owner=None, group=None, sha256="not-the-digest"),
+    ]
+    module = _make_module(bundle, specs)
+
+    with pytest.raises(RuntimeError, match="sha256 mismatch"):
+        install_files_bundle(module=module, bundle_path=bundle, specs=specs)
+
+    assert "old-conf" == (dest_dir / "agent.conf").read_text()
+    assert ["agent.conf"] == os.listdir(dest_dir)
+
+
+
+def test_install_files_bundle_keeps_identical_binary_in_place(tmp_path: pathlib.Path) -> None:
+    bundle = _make_bundle(tmp_path, {"spire-agent": "agent-binary"})
+    dest = tmp_path / "spire-agent"
+    dest.write_text("agent-binary")
+    dest.chmod(0o755)
+    inode_before = os.stat(dest).st_ino
+    specs = [FileSpec(dest=str(dest), member="spire-agent", mode="0755", owner=None, group=None,
+                      sha256=hashlib.sha256(b"agent-binary").hexdigest())]
+    module = _make_module(bundle, specs)
+
+    outcomes = install_files_bundle(module=module, bundle_path=bundle, specs=specs)
+
+    assert (False, False) == (outcomes[str(dest)].changed, outcomes[str(dest)].content_changed)
+    assert inode_before == os.stat(dest).st_ino
+    assert [] == [f for f in os.listdir(tmp_path) if f.endswith(".spire-tmp")]
+
+
+def test_stage_then_commit_files_bundle(tmp_path: pathlib.Path) -> None:
+    bundle = _make_bundle(tmp_path, {"spire-agent": "agent-binary-v2", "agent.conf": "conf"})
+    binary = tmp_path / "spire-agent"
+    binary.write_text("agent-binary-v1")
+    conf = tmp_path / "agent.conf"
+    conf.write_text("conf")
+    specs = [
+        FileSpec(dest=str(binary), member="spire-agent", mode="0755", owner=None, group=None, sha256=None),
+        FileSpec(dest=str(conf), member="agent.conf", mode="0640", owner=None, group=None, sha256=None),
+    ]
+    module = _make_module(bundle, specs)
+
+    staged = stage_files_bundle(module=module, bundle_path=bundle, specs=specs)
+
+    assert (True, False) == (staged[str(binary)].content_changed, staged[str(conf)].content_changed)
+    assert "agent-binary-v1" == binary.read_text()
+    assert "agent-binary-v2" == pathlib.Path(staged_path_of(str(binary))).read_text()
+    assert not os.path.exists(staged_path_of(str(conf)))
+
+    committed = commit_staged_files(specs=specs)
+
+    assert (True, False) == (committed[str(binary)].changed, committed[str(conf)].changed)
+    assert "agent-binary-v2" == binary.read_text()
+    assert 0o755 == committed[str(binary)].file_stat.mode
+    assert not os.path.exists(staged_path_of(str(binary)))
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,114 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, List, Optional, Tuple
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.healthchecks import (
+    CheckAgent,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.spire_typing import (
+    CmdExecOutcome,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.startup_watch import (
+    StartupFailureWatch,
+    configured_log_file,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.systemd import (
+    UnitState,
+)
+import pytest
+
+
+def unit_state(active_state: str = "activating", result: str = "success", main_pid: int = 0) -> UnitState:
+    return UnitState(
+        load_state="loaded", active_state=active_state, unit_file_state="enabled",
+        fragment_path="", result=result, main_pid=main_pid)
+
+
+class UnitStates:
+    def __init__(self, *states: UnitState) -> None:
+        self.states: List[UnitState] = list(states)
+
+    def __call__(self) -> Tuple[Optional[UnitState], Optional[str]]:
+        state = self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        return state, None
+
+
+def test_configured_log_file(tmp_path: Any) -> None:
+    conf = tmp_path / "agent.conf"
+    conf.write_text('agent {\n    log_level = "DEBUG"\n    log_file="/var/log/spire/spire-agent.log"\n}\n')
+    assert configured_log_file(str(conf)) == "/var/log/spire/spire-agent.log"
+    conf.write_text('agent {\n    log_level = "DEBUG"\n}\n')
+    assert configured_log_file(str(conf)) is None
+    assert configured_log_file(str(tmp_path / "missing.conf")) is None
+
+
+def test_watch_reports_fatal_log_lines_appended_after_its_creation(tmp_path: Any) -> None:
+    log_file = tmp_path / "spire-agent.log"
+    log_file.write_text('time="t0" level=fatal msg="old crash"\n')
+    watch = StartupFailureWatch(unit_state_func=UnitStates(unit_state()), log_file=str(log_file))
+    assert watch.failure_reason() is None
+
+    with open(str(log_file), "a") as log:
+        log.write('time="t1" level=info msg="Starting agent"\n')
+        log.write('time="t2" level=error msg="Agent crashed" error="could not parse agent config"\n')
+    reason = watch.failure_reason()
+    assert reason is not None
+    assert reason.startswith('fatal log line: time="t2"')
+    assert 'msg="Starting agent"' in reason
+    assert "old crash" not in reason
+
+
+def test_watch_reports_failed_unit() -> None:
+    watch = StartupFailureWatch(
+        unit_state_func=UnitStates(unit_state(main_pid=12), unit_state(result="exit-code")),
+        log_file=None)
+    assert watch.failure_reason() is None
+    assert watch.failure_reason() == "unit failed: active_state=activating, result=exit-code"
+
+
+def test_watch_reports_replaced_main_process() -> None:
+    watch = StartupFailureWatch(
+        unit_state_func=UnitStates(unit_state(main_pid=12), unit_state(main_pid=13)),
+        log_file=None)
+    assert watch.failure_reason() is None
+    assert "main process 12 exited" in watch.failure_reason()
+
+
+def test_readiness_wait_aborts_as_soon_as_the_unit_failed(tmp_path: Any) -> None:
+    log_file = tmp_path / "spire-agent.log"
+    log_file.write_text("")
+    watch = StartupFailureWatch(
+        unit_state_func=UnitStates(unit_state(main_pid=12), unit_state(active_state="failed", result="exit-code")),
+        log_file=str(log_file))
+    log_file.write_text('time="t1" level=error msg="could not parse agent config"\n')
+    check = CheckAgent(
+        run_command=lambda args: CmdExecOutcome(1, "", "Agent is unavailable."),
+        file_spire_agent_bin="/opt/spire-agent/bin/spire-agent", socket_path=None,
+        readiness_probe_timeout_seconds=30.0, native=False, startup_watch=watch)
+    outcome = check.poll_readiness()
+    assert not outcome.succeeded and not outcome.timed_out
+    assert outcome.elapsed < 5.0
+    assert "could not parse agent config" in outcome.abort_reason
+    with pytest.raises(RuntimeError, match="active_state=failed"):
+        check.wait_for_readiness()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,116 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+import os
+from typing import Any, Dict
+
+import pytest
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.digests import (
+    FileDigestCache,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.state_fingerprint import (
+    FingerprintRecord,
+    canonical_digest,
+    compute_state_fingerprint,
+    read_record,
+    write_record,
+)
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.systemd import (
+    UnitState,
+)
+
+
+def _unit_state(active_state: str = "active") -> UnitState:
+    return UnitState(
+        load_state="loaded", active_state=active_state,
+        unit_file_state="enabled", fragment_path="/etc/systemd/system/spire_agent.service")
+
+
+def _write(path: str, data: str) -> str:
+    with open(path, "w") as fp:
+        fp.write(data)
+    return path
+
+
+def _fingerprint(tmp_path: Any, files: Dict[str, str], unit_state: UnitState) -> str:
+    cache = FileDigestCache(os.path.join(str(tmp_path), ".digests.json"))
+    return compute_state_fingerprint(files=[*files.values()], unit_state=unit_state, digest_cache=cache)
+
+
+def test_canonical_digest_does_not_depend_on_key_order() -> None:
+    assert canonical_digest({"a": 1, "b": [1, 2]}) == canonical_digest({"b": [1, 2], "a": 1})
+    assert canonical_digest({"a": 1}) != canonical_digest({"a": 2})
+
+
+def test_state_fingerprint_stable_while_nothing_changes(tmp_path: Any) -> None:
+    files = {"conf": _write(os.path.join(str(tmp_path), "agent.conf"), "agent {}")}
+    assert _fingerprint(tmp_path, files, _unit_state()) == _fingerprint(tmp_path, files, _unit_state())
+
+
+def test_state_fingerprint_changes_with_content(tmp_path: Any) -> None:
+    conf = _write(os.path.join(str(tmp_path), "agent.conf"), "agent {}")
+    before = _fingerprint(tmp_path, {"conf": conf}, _unit_state())
+    _write(conf, "agent { log_level = \"DEBUG\" }")
+    assert before != _fingerprint(tmp_path, {"conf": conf}, _unit_state())
+
+
+def test_state_fingerprint_changes_with_mode(tmp_path: Any) -> None:
+    conf = _write(os.path.join(str(tmp_path), "agent.conf"), "agent {}")
+    os.chmod(conf, 0o644)
+    before = _fingerprint(tmp_path, {"conf": conf}, _unit_state())
+    os.chmod(conf, 0o600)
+    assert before != _fingerprint(tmp_path, {"conf": conf}, _unit_state())
+
+
+def test_state_fingerprint_changes_when_file_removed(tmp_path: Any) -> None:
+    conf = _write(os.path.join(str(tmp_path), "agent.conf"), "agent {}")
+    before = _fingerprint(tmp_path, {"conf": conf}, _unit_state())
+    os.remove(conf)
+    assert before != _fingerprint(tmp_path, {"conf": conf}, _unit_state())
+
+
+def test_state_fingerprint_changes_with_unit_state(tmp_path: Any) -> None:
+    files = {"conf": _write(os.path.join(str(tmp_path), "agent.conf"), "agent {}")}
+    assert _fingerprint(tmp_path, files, _unit_state("active")) != \
+        _fingerprint(tmp_path, files, _unit_state("failed"))
+    assert _fingerprint(tmp_path, files, _unit_state()) != _fingerprint(tmp_path, files, None)
+
+
+def test_record_round_trip(tmp_path: Any) -> None:
+    record_path = os.path.join(str(tmp_path), "fingerprint.json")
+    assert read_record(record_path) is None
+    record = FingerprintRecord(
+        inputs_digest="in-1", state_fingerprint="fp-1", result={"actual_state": "present"})
+    write_record(record_path, record)
+    read = read_record(record_path)
+    assert read == record
+    assert read.matches("in-1", "fp-1")
+    assert not read.matches("in-2", "fp-1")
+    assert not read.matches("in-1", "fp-2")
+    assert os.listdir(str(tmp_path)) == ["fingerprint.json"]
+
+
+def test_read_record_of_corrupted_file_is_none(tmp_path: Any) -> None:
+    record_path = _write(os.path.join(str(tmp_path), "fingerprint.json"), "{not json")
+    assert read_record(record_path) is None
+
+
+if __name__ == '__main__':
+    pytest.main()
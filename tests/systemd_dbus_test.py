@@ -0,0 +1,203 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+import os
+import shutil
+import subprocess
+import threading
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pytest
+
+jeepney = pytest.importorskip("jeepney")
+
+from jeepney import DBusAddress, HeaderFields, MessageType, new_error, new_method_return, new_signal
+from jeepney.bus_messages import message_bus
+from jeepney.io.blocking import open_dbus_connection
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils import systemd_dbus
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.systemd import (
+    Scope,
+    SpireComponentService,
+)
+
+
+class StandInSystemdManager:
+    """Answers the org.freedesktop.systemd1 Manager and Unit calls used by the D-Bus backend."""
+
+    def __init__(self, bus_address: str) -> None:
+        self.conn = open_dbus_connection(bus=bus_address)
+        self.conn.send_and_get_reply(message_bus.RequestName(systemd_dbus.SYSTEMD_BUS_NAME))
+        self.units: Dict[str, Dict[str, str]] = {}
+        self.unit_paths: Dict[str, str] = {}
+        self.calls: List[str] = []
+        self.failing_methods: List[str] = []
+        self.job_id = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def add_unit(self, name: str) -> None:
+        self.units[name] = {
+            "LoadState": "loaded", "ActiveState": "inactive",
+            "UnitFileState": "disabled", "FragmentPath": f"/etc/systemd/system/{name}",
+        }
+
+    def serve(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                msg = self.conn.receive(timeout=0.1)
+            except TimeoutError:
+                continue
+            if msg.header.message_type == MessageType.method_call:
+                self.conn.send(self.handle(msg))
+                if msg.header.fields[HeaderFields.member] in ["StartUnit", "StopUnit"] \
+                        and msg.header.fields[HeaderFields.member] not in self.failing_methods:
+                    self.conn.send(self.job_removed)
+
+    def unit_path(self, name: str) -> str:
+        return self.unit_paths.setdefault(name, f"/org/freedesktop/systemd1/unit/u{len(self.unit_paths)}")
+
+    def handle(self, msg: Any) -> Any:
+        member = msg.header.fields[HeaderFields.member]
+        self.calls.append(member)
+        if member in self.failing_methods:
+            return new_error(msg, "org.freedesktop.systemd1.StandInError", "s", (f"{member} failing",))
+        if member == "GetAll":
+            name = next(n for n, p in self.unit_paths.items() if p == msg.header.fields[HeaderFields.path])
+            state = self.units.get(name, {"LoadState": "not-found", "ActiveState": "inactive"})
+            return new_method_return(msg, "a{sv}", ({k: ("s", v) for k, v in state.items()},))
+        if member == "GetUnitFileState":
+            if msg.body[0] not in self.units:
+                # what systemd sends for ENOENT
+                return new_error(msg, "org.freedesktop.DBus.Error.FileNotFound", "s", ("No such file or directory",))
+            return new_method_return(msg, "s", (self.units[msg.body[0]]["UnitFileState"],))
+        if member == "LoadUnit":
+            return new_method_return(msg, "o", (self.unit_path(msg.body[0]),))
+        if member in ["StartUnit", "StopUnit"]:
+            unit = msg.body[0]
+            self.units[unit]["ActiveState"] = "active" if member == "StartUnit" else "inactive"
+            self.job_id += 1
+            job_path = f"/org/freedesktop/systemd1/job/{self.job_id}"
+            self.job_removed = new_signal(
+                DBusAddress(systemd_dbus.SYSTEMD_OBJECT_PATH, interface=systemd_dbus.MANAGER_INTERFACE),
+                "JobRemoved", "uoss", (self.job_id, job_path, unit, "done"))
+            return new_method_return(msg, "o", (job_path,))
+        if member == "EnableUnitFiles":
+            self.units[msg.body[0][0]]["UnitFileState"] = "enabled"
+            return new_method_return(msg, "ba(sss)", (False, []))
+        if member == "DisableUnitFiles":
+            self.units[msg.body[0][0]]["UnitFileState"] = "disabled"
+            return new_method_return(msg, "a(sss)", ([],))
+        return new_method_return(msg)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.conn.close()
+
+
+@pytest.fixture
+def bus_address(tmp_path: Any) -> Iterator[str]:
+    dbus_daemon = shutil.which("dbus-daemon")
+    if dbus_daemon is None:
+        pytest.skip("dbus-daemon not available")
+    address = f"unix:path={tmp_path}/bus"
+    daemon = subprocess.Popen(
+        [dbus_daemon, "--session", "--nofork", "--print-address=1", f"--address={address}"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    daemon.stdout.readline()
+    yield address
+    daemon.terminate()
+    daemon.wait()
+
+
+@pytest.fixture
+def manager(bus_address: str, monkeypatch: Any) -> Iterator[StandInSystemdManager]:
+    monkeypatch.setenv("DBUS_SESSION_BUS_ADDRESS", bus_address)
+    stand_in = StandInSystemdManager(bus_address)
+    stand_in.add_unit("spire_agent.service")
+    yield stand_in
+    stand_in.stop()
+
+
+def systemctl_forbidden(args: Any) -> Tuple[int, str, str]:
+    raise AssertionError(f"systemctl must not be forked: {args}")
+
+
+def test_dbus_backend_manages_service_without_systemctl(manager: StandInSystemdManager) -> None:
+    service = SpireComponentService(
+        service_name="spire_agent", run_command=systemctl_forbidden,
+        scope=Scope.scope_user, service_backend="dbus")
+
+    service.enable()
+    service.start()
+    assert service.is_enabled()[0]
+    assert service.is_active()[0]
+    service.stop()
+    assert not service.is_active()[0]
+    assert manager.calls.count("Subscribe") == 1, "subscription must be kept on the shared connection"
+
+
+def test_dbus_backend_installed_from_unit_file_state(manager: StandInSystemdManager) -> None:
+    installed = SpireComponentService(
+        service_name="spire_agent", run_command=systemctl_forbidden,
+        scope=Scope.scope_user, service_backend="dbus")
+    unit_state, issue = installed.unit_state()
+    assert unit_state is not None and unit_state.is_installed(), issue
+
+    missing = SpireComponentService(
+        service_name="spire_server", run_command=systemctl_forbidden,
+        scope=Scope.scope_user, service_backend="dbus")
+    unit_state, issue = missing.unit_state()
+    assert unit_state is not None and not unit_state.is_installed(), issue
+    assert missing.dbus_backend is not None, "a missing unit file is not a backend failure"
+
+
+def test_dbus_backend_is_shared_per_bus_address(manager: StandInSystemdManager, bus_address: str) -> None:
+    backend, issue = systemd_dbus.get_dbus_backend(bus_address)
+    assert issue is None
+    assert systemd_dbus.get_dbus_backend(bus_address)[0] is backend
+
+
+def test_dbus_backend_falls_back_to_systemctl(manager: StandInSystemdManager) -> None:
+    manager.failing_methods.append("StartUnit")
+    calls: List[List[str]] = []
+
+    def run_command(args: Any) -> Tuple[int, str, str]:
+        calls.append(args)
+        return 0, "", ""
+
+    service = SpireComponentService(
+        service_name="spire_agent", run_command=run_command,
+        scope=Scope.scope_user, service_backend="dbus")
+    service.start()
+    assert calls == [["systemctl", "--user", "start", "spire_agent.service"]]
+
+
+def test_dbus_backend_not_used_without_bus(tmp_path: Any, monkeypatch: Any) -> None:
+    monkeypatch.setenv("DBUS_SESSION_BUS_ADDRESS", f"unix:path={tmp_path}/no-bus")
+    service = SpireComponentService(
+        service_name="spire_agent", run_command=lambda args: (0, "", ""),
+        scope=Scope.scope_user, service_backend="dbus")
+    assert service.dbus_backend is None
+
+
+if __name__ == '__main__':
+    pytest.main()
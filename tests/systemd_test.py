@@ -0,0 +1,127 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+
+from typing import Any, List, Tuple
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.systemd import (
+    Scope,
+    SpireComponentService,
+    UnitState,
+    detect_spire_service_unit_state,
+    query_unit_state,
+)
+import pytest
+
+
+SHOW_OUTPUT = """LoadState=loaded
+ActiveState=active
+UnitFileState=enabled
+FragmentPath=/etc/systemd/system/spire_agent.service
+"""
+
+NOT_FOUND_OUTPUT = "LoadState=not-found\nActiveState=inactive\nUnitFileState=\nFragmentPath=\n"
+
+
+def test_parse_systemctl_show() -> None:
+    unit_state = UnitState.parse_systemctl_show(SHOW_OUTPUT)
+    assert unit_state == UnitState(
+        load_state="loaded", active_state="active", unit_file_state="enabled",
+        fragment_path="/etc/systemd/system/spire_agent.service")
+    assert unit_state.is_installed()
+    assert unit_state.is_active()[0]
+    assert unit_state.is_enabled()[0]
+
+
+def test_query_unit_state_uses_a_single_show_call() -> None:
+    calls: List[List[str]] = []
+
+    def run_command(args: Any) -> Tuple[int, str, str]:
+        calls.append(args)
+        return 0, SHOW_OUTPUT, ""
+
+    unit_state, issue = query_unit_state(run_command, "spire_agent.service", Scope.scope_user)
+    assert issue is None
+    assert unit_state is not None and unit_state.is_installed()
+    assert calls == [[
+        "systemctl", "--user", "show", "spire_agent.service", "--no-pager",
+        "--property=LoadState,ActiveState,UnitFileState,FragmentPath,Result,MainPID"]]
+
+
+@pytest.mark.parametrize(
+    "show_output,installed",
+    [
+        # the service file has just been copied, the daemon not reloaded yet: the unit file state is read on disk
+        ("LoadState=not-found\nActiveState=inactive\nUnitFileState=disabled\nFragmentPath=\n", True),
+        ("LoadState=masked\nActiveState=inactive\nUnitFileState=masked\nFragmentPath=/dev/null\n", True),
+        (NOT_FOUND_OUTPUT, False),
+    ]
+)
+def test_query_unit_state_installation_from_show_properties(show_output: str, installed: bool) -> None:
+    unit_state, issue = query_unit_state(
+        lambda args: (0, show_output, ""), "spire_agent.service", Scope.scope_system)
+    assert issue is None
+    assert unit_state is not None and installed == unit_state.is_installed()
+
+
+def test_query_unit_state_global_scope_not_installed_when_no_unit_file_matches() -> None:
+    unit_state, issue = query_unit_state(
+        lambda args: (1, "0 unit files listed.\n", ""), "spire_agent.service", Scope.scope_global)
+    assert issue is None
+    assert unit_state is not None and not unit_state.is_installed()
+
+
+def test_detect_spire_service_unit_state_stops_at_the_first_installed_scope() -> None:
+    calls: List[List[str]] = []
+
+    def run_command(args: Any) -> Tuple[int, str, str]:
+        calls.append(args)
+        return 0, SHOW_OUTPUT, ""
+
+    scope, unit_state, issue = detect_spire_service_unit_state(run_command, "spire_agent.service")
+    assert scope == list(Scope)[0], issue
+    assert unit_state is not None and unit_state.is_active()[0]
+    assert 1 == len(calls)
+
+
+def test_detect_spire_service_unit_state_picks_the_installed_scope() -> None:
+    def run_command(args: Any) -> Tuple[int, str, str]:
+        if "--system" in args:
+            return 0, SHOW_OUTPUT, ""
+        if "--global" in args:
+            return 1, "0 unit files listed.\n", ""
+        return 0, NOT_FOUND_OUTPUT, ""
+
+    scope, unit_state, issue = detect_spire_service_unit_state(run_command, "spire_agent.service")
+    assert scope == Scope.scope_system, issue
+    assert unit_state is not None and unit_state.is_active()[0]
+
+
+def test_teardown_skips_service_not_installed() -> None:
+    calls: List[List[str]] = []
+
+    def run_command(args: Any) -> Tuple[int, str, str]:
+        calls.append(args)
+        return 0, NOT_FOUND_OUTPUT, ""
+
+    SpireComponentService(service_name="spire_agent", run_command=run_command).teardown_service()
+    assert [args[2] for args in calls] == ["show"]
+
+
+if __name__ == '__main__':
+    pytest.main()
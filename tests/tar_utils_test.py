@@ -0,0 +1,96 @@
+#
+# Copyright (c) 2021 Patrice Congo <@congop>.
+#
+# This file is part of io_patricecongo.spire
+# (see https://github.com/congop/io_patricecongo.spire).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import io
+import os
+import pathlib
+import tarfile
+from typing import List, Tuple
+
+from ansible_collections.io_patricecongo.spire.plugins.module_utils.tar_utils import (
+    extract_tar_member,
+    extract_tar_member_cached,
+)
+import pytest
+
+
+def _make_spire_tar_gz(tmp_path: pathlib.Path, extra_members: List[Tuple[str, bytes]] = None) -> str:
+    archive = tmp_path / "spire-1.0.0-linux-x86_64-glibc.tar.gz"
+    with tarfile.open(archive, mode="w:gz") as tar:
+        for name, data in [
+            ("./spire-1.0.0/conf/agent/agent.conf", b"conf"),
+            ("./spire-1.0.0/bin/spire-agent", b"agent-binary"),
+            ("./spire-1.0.0/bin/spire-server", b"server-binary"),
+            *(extra_members or []),
+        ]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o755
+            tar.addfile(info, io.BytesIO(data))
+    return str(archive)
+
+
+def test_extract_tar_member_next_to_archive(tmp_path: pathlib.Path) -> None:
+    archive = _make_spire_tar_gz(tmp_path)
+
+    extracted = extract_tar_member(archive, "/bin/spire-agent")
+
+    assert str(tmp_path / "spire-1.0.0" / "bin" / "spire-agent") == extracted
+    assert b"agent-binary" == pathlib.Path(extracted).read_bytes()
+    assert not (tmp_path / "spire-1.0.0" / "bin" / "spire-server").exists()
+
+
+def test_extract_tar_member_cached_extracts_once(tmp_path: pathlib.Path) -> None:
+    archive = _make_spire_tar_gz(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+
+    extracted = extract_tar_member_cached(archive, "/bin/spire-server", cache_dir=cache_dir)
+    os.remove(archive)
+    extracted_again = extract_tar_member_cached(
+        archive, "/bin/spire-server", cache_dir=cache_dir,
+        tar_gz_archive_sha256=pathlib.Path(extracted).parent.parent.name)
+
+    assert extracted == extracted_again
+    assert "spire-server" == os.path.basename(extracted)
+    assert b"server-binary" == pathlib.Path(extracted).read_bytes()
+    assert os.access(extracted, os.X_OK)
+
+
+def test_extract_tar_member_cached_reports_content_when_not_found(tmp_path: pathlib.Path) -> None:
+    archive = _make_spire_tar_gz(tmp_path)
+
+    with pytest.raises(RuntimeError, match="spire-1.0.0/bin/spire-agent"):
+        extract_tar_member_cached(archive, "/bin/oidc-discovery-provider", cache_dir=str(tmp_path / "cache"))
+
+    assert not (tmp_path / "cache").exists()
+
+
+
+def test_extract_tar_member_cached_rejects_several_matching_members(tmp_path: pathlib.Path) -> None:
+    archive = _make_spire_tar_gz(
+        tmp_path, extra_members=[("./spire-1.0.0/extras/bin/spire-agent", b"other-binary")])
+    cache_dir = tmp_path / "cache"
+
+    with pytest.raises(RuntimeError, match="extras/bin/spire-agent"):
+        extract_tar_member_cached(archive, "/bin/spire-agent", cache_dir=str(cache_dir))
+
+    assert [] == [p for p in cache_dir.rglob("*") if p.is_file()]
+
+
+if __name__ == '__main__':
+    pytest.main()